@@ -0,0 +1,298 @@
+# -----------------------------------------------------------------------------
+# File: admission_control.py
+# Description: Admission control for ReqEngine - priority classes with
+#              concurrency and queue limits in front of LLM work.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Admission Control
+Requests that use the LLM are admitted per priority class (interactive,
+extraction, bulk). Each class has its own concurrency limit and bounded
+queue, so a long document upload cannot occupy the slots that queries and
+refinements need. Within a class, waiting sessions take turns.
+
+The class of the running request is kept in a context variable; the
+batching scheduler reads it to generate interactive prompts first.
+"""
+
+import contextvars
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from token_budget import percentile
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "extraction", "bulk")
+DEFAULT_PRIORITY = "extraction"
+
+# (max concurrent requests, max queued requests) per class
+DEFAULT_LIMITS = {
+    "interactive": (4, 32),
+    "extraction": (2, 16),
+    "bulk": (1, 4),
+}
+
+# Sessions remembered per class for round-robin ordering
+MAX_TRACKED_SESSIONS = 4096
+
+_current_priority = contextvars.ContextVar("llm_priority", default=DEFAULT_PRIORITY)
+
+
+def current_priority() -> str:
+    """Priority class of the code running now"""
+    return _current_priority.get()
+
+
+def priority_rank(priority: Optional[str] = None) -> int:
+    """0 for the highest priority class; the current class by default"""
+    return PRIORITY_CLASSES.index(priority or current_priority())
+
+
+@contextmanager
+def priority_scope(priority: str):
+    """Run LLM calls in this block with the given priority class"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class '{priority}'")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse "interactive=4/32,bulk=1/4" into limits, starting from the defaults
+
+    Each entry is class=max_concurrent/max_queued.
+    """
+    limits = dict(DEFAULT_LIMITS)
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = entry.partition("=")
+        concurrent, _, queued = values.partition("/")
+        name = name.strip()
+        if name not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class '{name}'")
+        limits[name] = (int(concurrent), int(queued or limits[name][1]))
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """The class queue is full (or the wait timed out); retry later"""
+
+    def __init__(self, priority: str, reason: str, retry_after: int):
+        super().__init__(f"{priority} queue {reason}")
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    """Slots, waiters and counters of one priority class"""
+
+    def __init__(self, max_concurrent: int, max_queued: int, window: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+
+        # Waiting requests in arrival order: sequence -> session
+        self.waiting: Dict[int, str] = {}
+        self.active = 0
+        self.active_by_session: Dict[str, int] = {}
+        # Admission order per session, for round-robin between sessions
+        self.last_admitted: "OrderedDict[str, int]" = OrderedDict()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=window)
+        self.durations = deque(maxlen=window)
+
+
+class AdmissionController:
+    """Admit LLM requests by priority class with per-session fairness"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        max_wait_s: float = 600.0,
+        window: int = 200,
+    ):
+        """
+        Initialize controller
+
+        Args:
+            limits: (max concurrent, max queued) per class
+            max_wait_s: Longest a request may wait for a slot
+            window: Recent waits and durations kept for stats and Retry-After
+        """
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_wait_s = max_wait_s
+        self._classes = {
+            name: _ClassState(*limits[name], window=window) for name in PRIORITY_CLASSES
+        }
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+
+    def check(self, priority: str):
+        """Raise AdmissionRejected now if the class queue is already full"""
+        with self._condition:
+            state = self._classes[priority]
+            if self._must_queue(state) and len(state.waiting) >= state.max_queued:
+                state.rejected += 1
+                raise AdmissionRejected(priority, "is full", self._retry_after(state))
+
+    def acquire(self, priority: str, session_id: Optional[str] = None) -> "Slot":
+        """
+        Wait for a slot of the class; release() it when the work is done
+
+        Raises:
+            AdmissionRejected: Queue full, or no slot within max_wait_s
+        """
+        state = self._classes[priority]
+        session = session_id or ""
+        start = time.monotonic()
+
+        with self._condition:
+            if self._must_queue(state):
+                if len(state.waiting) >= state.max_queued:
+                    state.rejected += 1
+                    raise AdmissionRejected(
+                        priority, "is full", self._retry_after(state)
+                    )
+                self._wait_for_turn(state, priority, session, start)
+
+            state.active += 1
+            state.active_by_session[session] = (
+                state.active_by_session.get(session, 0) + 1
+            )
+            state.admitted += 1
+            state.waits.append(time.monotonic() - start)
+            state.last_admitted[session] = state.admitted
+            state.last_admitted.move_to_end(session)
+            while len(state.last_admitted) > MAX_TRACKED_SESSIONS:
+                state.last_admitted.popitem(last=False)
+
+        return Slot(self, state, session)
+
+    @contextmanager
+    def admit(self, priority: str, session_id: Optional[str] = None):
+        """Hold a slot of the class for the duration of the block"""
+        slot = self.acquire(priority, session_id)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    def _release(self, state: _ClassState, session: str, duration: float):
+        with self._condition:
+            state.active -= 1
+            state.active_by_session[session] -= 1
+            if not state.active_by_session[session]:
+                del state.active_by_session[session]
+            state.durations.append(duration)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        """Queue depth, concurrency and wait times per class"""
+        with self._condition:
+            classes = {}
+            for name, state in self._classes.items():
+                waits = [w * 1000 for w in state.waits]
+                classes[name] = {
+                    "active": state.active,
+                    "queued": len(state.waiting),
+                    "max_concurrent": state.max_concurrent,
+                    "max_queued": state.max_queued,
+                    "admitted": state.admitted,
+                    "rejected": state.rejected,
+                    "timed_out": state.timed_out,
+                    "wait_ms_p50": round(percentile(waits, 50), 1) if waits else 0.0,
+                    "wait_ms_p95": round(percentile(waits, 95), 1) if waits else 0.0,
+                    "sessions_active": len(state.active_by_session),
+                }
+        return {"max_wait_s": self.max_wait_s, "classes": classes}
+
+    # ------------------------------------------------------------------
+    # Internals (condition lock held)
+    # ------------------------------------------------------------------
+
+    def _must_queue(self, state: _ClassState) -> bool:
+        return state.active >= state.max_concurrent or bool(state.waiting)
+
+    def _wait_for_turn(
+        self, state: _ClassState, priority: str, session: str, start: float
+    ):
+        sequence = next(self._sequence)
+        state.waiting[sequence] = session
+        deadline = start + self.max_wait_s
+        try:
+            while not (
+                state.active < state.max_concurrent
+                and self._next_waiter(state) == sequence
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    state.timed_out += 1
+                    raise AdmissionRejected(
+                        priority, "wait timed out", self._retry_after(state)
+                    )
+                self._condition.wait(remaining)
+        finally:
+            del state.waiting[sequence]
+            # The next waiter may now be first in line
+            self._condition.notify_all()
+
+    @staticmethod
+    def _next_waiter(state: _ClassState) -> int:
+        """
+        Oldest waiter of the session with the fewest requests running,
+        preferring sessions that were admitted least recently
+        """
+
+        def turn(seq: int):
+            session = state.waiting[seq]
+            return (
+                state.active_by_session.get(session, 0),
+                state.last_admitted.get(session, 0),
+                seq,
+            )
+
+        return min(state.waiting, key=turn)
+
+    @staticmethod
+    def _retry_after(state: _ClassState) -> int:
+        """Seconds until a queued request would likely be admitted"""
+        if not state.durations:
+            return 1
+        typical = sum(state.durations) / len(state.durations)
+        turns = (len(state.waiting) + 1) / state.max_concurrent
+        return max(1, int(round(typical * turns)))
+
+
+class Slot:
+    """An admitted request; release() frees its slot (idempotent)"""
+
+    def __init__(
+        self, controller: AdmissionController, state: _ClassState, session: str
+    ):
+        self._controller = controller
+        self._state = state
+        self._session = session
+        self._admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(
+            self._state, self._session, time.monotonic() - self._admitted_at
+        )
@@ -0,0 +1,560 @@
+# -----------------------------------------------------------------------------
+# File: ann_index.py
+# Description: Approximate nearest-neighbour index for ReqEngine - finds use
+#              cases similar to a vector across sessions without a full scan.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+ANN Index
+Inverted-file (IVF) index over numpy, stored in its own SQLite file.
+Normalized vectors are grouped into lists around k-means centroids; a search
+only scores the lists whose centroids are closest to the query.
+
+Entries are added, replaced and removed one use case at a time. Until
+train_min vectors are stored there is a single list (exact search). The
+centroids are trained then and again whenever the index has grown fourfold,
+with about sqrt(n) lists.
+
+Training runs on a background thread. New centroids get new list IDs, and
+entries are moved to them a batch at a time; until every entry has moved,
+searches probe the old and the new lists, so nothing is missed meanwhile.
+
+The index is tagged with the embedding model; opening it with another
+model empties it, so it can be filled again with matching vectors.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ("float16", "float32")
+
+# Entries moved to retrained lists per hold of the index lock
+REASSIGN_BATCH = 1000
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Vectors (one per row) scaled to unit length, as float32"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix = matrix.reshape(-1, matrix.shape[-1]) if matrix.size else matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Unit-length centroids of normalized vectors (cosine k-means)"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # Empty lists keep their old centroid
+        filled = np.bincount(assignment, minlength=n_lists) > 0
+        centroids[filled] = normalize_rows(sums[filled])
+    return centroids
+
+
+class ANNIndex:
+    """IVF index of use case vectors with session filters"""
+
+    def __init__(
+        self,
+        path: str,
+        model: str,
+        dtype: str = "float32",
+        n_probe: int = 8,
+        train_min: int = 4096,
+        train_sample_per_list: int = 64,
+        background_training: bool = True,
+    ):
+        """
+        Open (or create) the index file
+
+        Args:
+            path: SQLite database file
+            model: Embedding model (and version) the vectors come from
+            dtype: Storage type of the vectors (float16 halves the file)
+            n_probe: Lists scored per search (more is slower, fewer misses)
+            train_min: Vectors stored before centroids are trained
+            train_sample_per_list: Vectors per list used for training
+            background_training: Train on a thread of its own instead of in
+                the add() call that makes training due
+        """
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'")
+        self.path = path
+        self.model = model
+        self.dtype = dtype
+        self.n_probe = max(1, n_probe)
+        self.train_min = max(1, train_min)
+        self.train_sample_per_list = max(1, train_sample_per_list)
+        self.background_training = background_training
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ann_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ann_centroids (
+                list_id INTEGER PRIMARY KEY,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ann_entries (
+                use_case_id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                list_id INTEGER NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ann_entries_list ON ann_entries(list_id)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ann_entries_session "
+            "ON ann_entries(session_id)"
+        )
+
+        # Lists are (centroids, list IDs); None is the single untrained list 0.
+        # While entries move to retrained lists both generations are kept.
+        self._generations: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None]
+        self._training = False
+        self._training_thread: Optional[threading.Thread] = None
+        # Use cases added while training, so stale snapshot rows don't move them
+        self._changed: Set[int] = set()
+        # Bumped by clear(), so a training started before it is dropped
+        self._epoch = 0
+
+        meta = dict(self._conn.execute("SELECT key, value FROM ann_meta"))
+        if meta and (meta.get("model"), meta.get("dtype")) != (model, dtype):
+            print(f"🗂️  ANN index built for {meta.get('model')}, emptying it")
+            self._reset()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO ann_meta (key, value) VALUES (?, ?)",
+            [("model", model), ("dtype", dtype)],
+        )
+
+        meta = dict(self._conn.execute("SELECT key, value FROM ann_meta"))
+        self._dim = int(meta["dim"]) if "dim" in meta else None
+        self._trained_size = int(meta.get("trained_size", 0))
+        self._load_lists(meta)
+        self._conn.commit()
+        self._count = self._count_entries()
+
+        self.searches = 0
+        self.scanned = 0
+        self.trainings = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, session_id: str, vectors: Dict[int, object]):
+        """
+        Add (or replace) the vectors of use cases of one session
+
+        Args:
+            session_id: Session the use cases belong to
+            vectors: Use case ID -> vector (numpy array, tensor or list)
+        """
+        if not vectors:
+            return
+        ids = list(vectors)
+        matrix = normalize_rows([np.asarray(vectors[i]) for i in ids])
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self._set_meta("dim", self._dim)
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Vectors have {matrix.shape[1]} values, index has {self._dim}"
+                )
+
+            lists = self._assign(matrix, self._generations[-1])
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO ann_entries
+                    (use_case_id, session_id, list_id, vector)
+                VALUES (?, ?, ?, ?)
+            """,
+                [
+                    (use_case_id, session_id, int(lists[i]), self._to_blob(matrix[i]))
+                    for i, use_case_id in enumerate(ids)
+                ],
+            )
+            self._conn.commit()
+            self._count = self._count_entries()
+            if self._training:
+                self._changed.update(ids)
+            due = self._claim_training()
+
+        if due:
+            self._start_training()
+
+    def remove(self, use_case_ids: Iterable[int]) -> int:
+        """Drop use cases from the index; returns how many were in it"""
+        with self._lock:
+            removed = self._conn.executemany(
+                "DELETE FROM ann_entries WHERE use_case_id = ?",
+                [(use_case_id,) for use_case_id in use_case_ids],
+            ).rowcount
+            self._conn.commit()
+            self._count -= removed
+        return removed
+
+    def remove_session(self, session_id: str) -> int:
+        """Drop every use case of a session; returns how many were removed"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM ann_entries WHERE session_id = ?", (session_id,)
+            ).rowcount
+            self._conn.commit()
+            self._count -= removed
+        return removed
+
+    def ids(self) -> Set[int]:
+        """IDs of every use case in the index"""
+        with self._lock:
+            return {
+                row[0]
+                for row in self._conn.execute("SELECT use_case_id FROM ann_entries")
+            }
+
+    def search(
+        self,
+        vector,
+        threshold: float,
+        limit: int = 10,
+        session_ids: Optional[Iterable[str]] = None,
+        exclude_session_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Stored use cases at least `threshold` similar to a vector
+
+        Only the n_probe lists closest to the vector are scored, so a
+        match in another list can be missed.
+
+        Args:
+            vector: Query vector
+            threshold: Least cosine similarity of a match
+            limit: Most matches returned
+            session_ids: Only match use cases of these sessions
+            exclude_session_id: Never match use cases of this session
+
+        Returns:
+            Dicts with use_case_id, session_id and score, most similar first
+        """
+        query = normalize_rows(vector)[0]
+        allowed = set(session_ids) if session_ids is not None else None
+        if allowed is not None and not allowed:
+            return []
+
+        with self._lock:
+            if self._dim is None or query.shape[0] != self._dim:
+                return []
+            sql = "SELECT use_case_id, session_id, vector FROM ann_entries"
+            params: list = []
+            if self._generations != [None]:
+                lists = set()
+                for generation in self._generations:
+                    if generation is None:
+                        lists.add(0)
+                        continue
+                    centroids, list_ids = generation
+                    closest = np.argsort(-(centroids @ query))[: self.n_probe]
+                    lists.update(int(list_ids[i]) for i in closest)
+                sql += f" WHERE list_id IN ({', '.join('?' * len(lists))})"
+                params = sorted(lists)
+            rows = self._conn.execute(sql, params).fetchall()
+            self.searches += 1
+            self.scanned += len(rows)
+
+        rows = [
+            row
+            for row in rows
+            if (allowed is None or row[1] in allowed) and row[1] != exclude_session_id
+        ]
+        if not rows:
+            return []
+
+        scores = self._from_blobs([row[2] for row in rows]) @ query
+        order = np.argsort(-scores)[: max(0, limit)]
+        return [
+            {
+                "use_case_id": rows[i][0],
+                "session_id": rows[i][1],
+                "score": float(scores[i]),
+            }
+            for i in order
+            if scores[i] >= threshold
+        ]
+
+    def train(self):
+        """
+        Fit new centroids now (e.g. from a maintenance job), or wait for the
+        training that is already running
+        """
+        with self._lock:
+            thread = self._training_thread if self._training else None
+            if thread is None:
+                if self._training or not self._count:
+                    return
+                self._training = True
+        if thread is not None:
+            thread.join()
+            return
+        self._train()
+
+    def join_training(self, timeout: Optional[float] = None):
+        """Wait for a background training to finish"""
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def clear(self) -> int:
+        """Drop every vector and the centroids; returns how many were removed"""
+        with self._lock:
+            removed = self._count
+            self._reset()
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            newest = self._generations[-1]
+            return {
+                "enabled": True,
+                "path": self.path,
+                "model": self.model,
+                "vectors": self._count,
+                "lists": len(newest[1]) if newest is not None else 1,
+                "n_probe": self.n_probe,
+                "trained_size": self._trained_size,
+                "training": self._training,
+                "trainings": self.trainings,
+                "searches": self.searches,
+                "avg_scanned": (
+                    round(self.scanned / self.searches, 1) if self.searches else 0
+                ),
+            }
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    def _claim_training(self) -> bool:
+        """Whether training is due; marks it as running if so (lock held)"""
+        if self._training or self._count < self.train_min:
+            return False
+        if self._generations[-1] is not None and self._count < 4 * self._trained_size:
+            return False
+        self._training = True
+        return True
+
+    def _start_training(self):
+        if not self.background_training:
+            self._train()
+            return
+        self._training_thread = threading.Thread(
+            target=self._train, name="ann-index-training", daemon=True
+        )
+        self._training_thread.start()
+
+    def _train(self):
+        """
+        Fit about sqrt(n) centroids on a sample, then move every entry to
+        its new list a batch at a time. Only short steps hold the lock.
+        """
+        try:
+            with self._lock:
+                epoch = self._epoch
+                self._changed = set()
+
+            # Snapshot through a connection of its own, so adds can go on
+            conn = sqlite3.connect(self.path)
+            try:
+                rows = conn.execute(
+                    "SELECT use_case_id, vector FROM ann_entries"
+                ).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                return
+            matrix = self._from_blobs([row[1] for row in rows])
+
+            n_lists = max(1, int(math.sqrt(len(rows))))
+            sample_size = min(len(rows), n_lists * self.train_sample_per_list)
+            rng = np.random.default_rng(len(rows))
+            sample = matrix[rng.choice(len(rows), sample_size, replace=False)]
+            centroids = spherical_kmeans(sample, n_lists)
+
+            # New lists get new IDs; adds go to them from now on and searches
+            # probe old and new lists until every entry has moved
+            with self._lock:
+                if self._epoch != epoch:
+                    return
+                first = self._next_list_id()
+                generation = (centroids, np.arange(first, first + n_lists))
+                self._conn.executemany(
+                    "INSERT INTO ann_centroids (list_id, vector) VALUES (?, ?)",
+                    [
+                        (int(list_id), centroid.astype(np.float32).tobytes())
+                        for list_id, centroid in zip(generation[1], centroids)
+                    ],
+                )
+                self._conn.commit()
+                self._generations.append(generation)
+
+            lists = self._assign(matrix, generation)
+            for start in range(0, len(rows), REASSIGN_BATCH):
+                with self._lock:
+                    if self._epoch != epoch:
+                        return
+                    self._conn.executemany(
+                        "UPDATE ann_entries SET list_id = ? "
+                        "WHERE use_case_id = ? AND list_id < ?",
+                        [
+                            (int(lists[i]), rows[i][0], first)
+                            for i in range(
+                                start, min(start + REASSIGN_BATCH, len(rows))
+                            )
+                            if rows[i][0] not in self._changed
+                        ],
+                    )
+                    self._conn.commit()
+
+            with self._lock:
+                if self._epoch != epoch:
+                    return
+                # Entries added or replaced after the snapshot
+                leftovers = self._conn.execute(
+                    "SELECT use_case_id, vector FROM ann_entries WHERE list_id < ?",
+                    (first,),
+                ).fetchall()
+                self._move(leftovers, generation)
+                self._conn.execute(
+                    "DELETE FROM ann_centroids WHERE list_id < ?", (first,)
+                )
+                self._set_meta("lists_from", first)
+                self._set_meta("lists_to", first + n_lists)
+                self._set_meta("trained_size", len(rows))
+                self._conn.commit()
+
+                self._generations = [generation]
+                self._trained_size = len(rows)
+                self.trainings += 1
+            print(f"🗂️  ANN index trained: {n_lists} lists over {len(rows)} vectors")
+        finally:
+            with self._lock:
+                self._training = False
+                self._changed = set()
+
+    # ------------------------------------------------------------------
+    # Internals (called with the lock held)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _assign(
+        matrix: np.ndarray, generation: Optional[Tuple[np.ndarray, np.ndarray]]
+    ) -> np.ndarray:
+        if generation is None:
+            return np.zeros(len(matrix), dtype=np.int64)
+        centroids, list_ids = generation
+        return list_ids[np.argmax(matrix @ centroids.T, axis=1)]
+
+    def _move(self, rows: List[tuple], generation):
+        """Put (use_case_id, vector) rows into the lists of a generation"""
+        if not rows:
+            return
+        lists = self._assign(self._from_blobs([row[1] for row in rows]), generation)
+        self._conn.executemany(
+            "UPDATE ann_entries SET list_id = ? WHERE use_case_id = ?",
+            [(int(lists[i]), row[0]) for i, row in enumerate(rows)],
+        )
+
+    def _next_list_id(self) -> int:
+        newest = self._generations[-1]
+        return int(newest[1][-1]) + 1 if newest is not None else 1
+
+    def _load_lists(self, meta: Dict[str, str]):
+        """
+        Load the current centroids; centroids and list IDs left by a training
+        that was interrupted are dropped and their entries moved back
+        """
+        rows = self._conn.execute(
+            "SELECT list_id, vector FROM ann_centroids ORDER BY list_id"
+        ).fetchall()
+        lists_from = int(meta.get("lists_from", 0))
+        lists_to = int(meta.get("lists_to", lists_from + len(rows)))
+        current = [row for row in rows if lists_from <= row[0] < lists_to]
+
+        if len(current) != len(rows):
+            self._conn.execute(
+                "DELETE FROM ann_centroids WHERE list_id < ? OR list_id >= ?",
+                (lists_from, lists_to),
+            )
+        if current:
+            centroids = np.frombuffer(
+                b"".join(row[1] for row in current), dtype=np.float32
+            ).reshape(len(current), -1)
+            generation = (centroids, np.array([row[0] for row in current]))
+            stray = self._conn.execute(
+                "SELECT use_case_id, vector FROM ann_entries "
+                "WHERE list_id < ? OR list_id >= ?",
+                (lists_from, lists_to),
+            ).fetchall()
+            self._move(stray, generation)
+            self._generations = [generation]
+        else:
+            self._conn.execute("UPDATE ann_entries SET list_id = 0 WHERE list_id != 0")
+            self._generations = [None]
+
+    def _count_entries(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM ann_entries").fetchone()[0]
+
+    def _reset(self):
+        self._conn.execute("DELETE FROM ann_entries")
+        self._conn.execute("DELETE FROM ann_centroids")
+        self._conn.execute(
+            "DELETE FROM ann_meta WHERE key IN "
+            "('dim', 'trained_size', 'lists_from', 'lists_to')"
+        )
+        self._dim = None
+        self._trained_size = 0
+        self._generations = [None]
+        self._count = 0
+        self._epoch += 1
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ann_meta (key, value) VALUES (?, ?)",
+            (key, str(value)),
+        )
+
+    def _to_blob(self, vector: np.ndarray) -> bytes:
+        return vector.astype(self.dtype).tobytes()
+
+    def _from_blobs(self, blobs: List[bytes]) -> np.ndarray:
+        matrix = np.frombuffer(b"".join(blobs), dtype=self.dtype)
+        return matrix.reshape(len(blobs), -1).astype(np.float32)
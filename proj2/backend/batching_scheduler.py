@@ -0,0 +1,303 @@
+# -----------------------------------------------------------------------------
+# File: batching_scheduler.py
+# Description: Dynamic request batching for ReqEngine - collects concurrent
+#              prompts over a short window and runs them as one padded batch.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Dynamic Batching Scheduler
+Sits in front of a text-generation pipeline and merges concurrent calls
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from transformers import StoppingCriteriaList
+
+from cancellation import (CancelledRowsCriteria, CancelToken,
+                          GenerationCancelled)
+
+
+def freeze_kwargs(value: Any) -> Any:
+    """
+    Turn generation kwargs into a hashable grouping key.
+
+    Lists, tuples and dicts are frozen recursively, hashable values are used
+    as-is and anything else (streamers, stateful processors) is keyed by
+    identity so it never shares a batch with another call.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze_kwargs(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(freeze_kwargs(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("id", id(value))
+
+
+class _PendingRequest:
+    """A single prompt waiting to be batched"""
+
+    __slots__ = (
+        "prompt",
+        "kwargs",
+        "key",
+        "future",
+        "enqueued_at",
+        "priority",
+        "cancel_token",
+    )
+
+    def __init__(
+        self,
+        prompt: str,
+        kwargs: Dict[str, Any],
+        priority: int = 0,
+        cancel_token: Optional[CancelToken] = None,
+    ):
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.key = freeze_kwargs(kwargs)
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.priority = priority
+        self.cancel_token = cancel_token
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def order(self):
+        # Lower priority value first, then oldest
+        return (self.priority, self.enqueued_at)
+
+
+class BatchingScheduler:
+    """Collect pending prompts and run them through the pipeline in batches"""
+
+    def __init__(
+        self,
+        pipe,
+        max_batch_size: int = 4,
+        max_wait_ms: float = 20.0,
+        priority: Optional[Callable[[], int]] = None,
+        cancel_token: Optional[Callable[[], Optional[CancelToken]]] = None,
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            pipe: Callable with the HF text-generation pipeline signature
+            max_batch_size: Maximum number of prompts generated together
+            max_wait_ms: How long the oldest request may wait for companions
+            priority: Called in the submitting thread; requests with a lower
+                value are batched first (e.g. admission_control.priority_rank)
+            cancel_token: Called in the submitting thread; a cancelled token
+                drops the request from the queue or stops its row at the
+                next token (e.g. cancellation.current_cancel_token)
+        """
+        self.pipe = pipe
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.priority = priority
+        self.cancel_token = cancel_token
+
+        self._pending: List[_PendingRequest] = []
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._shutdown = False
+
+        self.batches_run = 0
+        self.requests_served = 0
+        self.largest_batch = 0
+        self.requests_cancelled = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, prompt: str, **generate_kwargs) -> Future:
+        """
+        Queue a prompt for generation
+
+        Args:
+            prompt: Prompt text
+            **generate_kwargs: Per-call generation kwargs (max_new_tokens, ...)
+
+        Returns:
+            Future resolving to the pipeline output for this prompt
+
+        Raises:
+            GenerationCancelled: The caller's request is already cancelled
+        """
+        rank = self.priority() if self.priority else 0
+        token = self.cancel_token() if self.cancel_token else None
+        if token is not None:
+            token.raise_if_cancelled()
+        request = _PendingRequest(prompt, generate_kwargs, rank, token)
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("BatchingScheduler has been shut down")
+            self._ensure_worker()
+            self._pending.append(request)
+            self._condition.notify_all()
+
+        if token is not None:
+            token.on_cancel(lambda: self._drop_pending(request))
+        return request.future
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        """Drop-in replacement for calling the pipeline directly"""
+        if isinstance(text_inputs, (list, tuple)):
+            futures = [self.submit(p, **generate_kwargs) for p in text_inputs]
+            return [f.result() for f in futures]
+
+        return self.submit(text_inputs, **generate_kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching counters"""
+        with self._condition:
+            queued = len(self._pending)
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "queued": queued,
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "largest_batch": self.largest_batch,
+            "requests_cancelled": self.requests_cancelled,
+            "average_batch_size": (
+                round(self.requests_served / self.batches_run, 2)
+                if self.batches_run
+                else 0.0
+            ),
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker once the queue has drained"""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            worker = self._worker
+
+        if wait and worker is not None:
+            worker.join()
+
+    def __getattr__(self, name):
+        # Expose wrapped pipeline attributes (tokenizer, model, ...)
+        if name == "pipe":
+            raise AttributeError(name)
+        return getattr(self.pipe, name)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="llm-batching-scheduler", daemon=True
+            )
+            self._worker.start()
+
+    def _collect_batch(self) -> Optional[List[_PendingRequest]]:
+        """
+        Wait for the head request's window to close and take its batch.
+        The head is the oldest request of the highest priority, so a newly
+        queued higher-priority request takes over the next batch.
+        """
+        with self._condition:
+            while not self._pending:
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+            while True:
+                head = min(self._pending, key=_PendingRequest.order)
+                deadline = head.enqueued_at + self.max_wait
+                compatible = sorted(
+                    (r for r in self._pending if r.key == head.key),
+                    key=_PendingRequest.order,
+                )
+                if len(compatible) >= self.max_batch_size or self._shutdown:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = compatible[: self.max_batch_size]
+            taken = set(id(r) for r in batch)
+            self._pending = [r for r in self._pending if id(r) not in taken]
+            return batch
+
+    def _drop_pending(self, request: _PendingRequest):
+        """A request cancelled before its batch started never runs"""
+        with self._condition:
+            if request not in self._pending:
+                return
+            self._pending.remove(request)
+            self.requests_cancelled += 1
+            self._condition.notify_all()
+        request.future.set_exception(GenerationCancelled())
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            self._execute(batch)
+
+    def _execute(self, batch: List[_PendingRequest]):
+        kwargs = batch[0].kwargs
+        if any(r.cancel_token is not None for r in batch):
+            # Rows of cancelled requests stop at the next token
+            kwargs = dict(kwargs)
+            kwargs["stopping_criteria"] = StoppingCriteriaList(
+                list(kwargs.get("stopping_criteria") or [])
+                + [
+                    CancelledRowsCriteria(
+                        [r.prompt for r in batch], [r.cancel_token for r in batch]
+                    )
+                ]
+            )
+
+        try:
+            if len(batch) == 1:
+                outputs = [self.pipe(batch[0].prompt, **kwargs)]
+            else:
+                outputs = self.pipe(
+                    [r.prompt for r in batch], batch_size=len(batch), **kwargs
+                )
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # A padded batch can fail where single prompts succeed (OOM) -
+            # retry one at a time so callers still get their own results
+            print(f"⚠️  Batch of {len(batch)} failed ({e}), retrying individually")
+            for request in batch:
+                self._execute([request])
+            return
+
+        self.batches_run += 1
+        self.requests_served += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        for request, output in zip(batch, outputs):
+            if request.cancelled:
+                # Output was cut short; the caller is gone
+                self.requests_cancelled += 1
+                request.future.set_exception(GenerationCancelled())
+            else:
+                request.future.set_result(output)
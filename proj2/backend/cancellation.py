@@ -0,0 +1,118 @@
+# -----------------------------------------------------------------------------
+# File: cancellation.py
+# Description: Request cancellation for ReqEngine - stops generation for
+#              requests whose client has disconnected.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Generation Cancellation
+A CancelToken belongs to one API request. The endpoint cancels it when the
+client disconnects; queued prompts of the request are dropped and running
+ones stop at the next token.
+
+The token of the running request is kept in a context variable, so the
+batching scheduler picks it up without threading it through every call.
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+_current_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+class GenerationCancelled(Exception):
+    """The request that asked for this generation was cancelled"""
+
+    def __init__(self, message: str = "Generation cancelled"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """Cancellation flag shared by every LLM call of one request"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Set the flag and run the registered callbacks (once)"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run callback on cancel(), or right away if already cancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise GenerationCancelled()
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Token of the request running now, if any"""
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """Run LLM calls in this block under the given token"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+class CancelledRowsCriteria(StoppingCriteria):
+    """
+    Stop the rows of a generated batch whose request was cancelled.
+
+    Row i belongs to prompts[i]. When the backend generates a different
+    number of rows (the prefix cache splits batches by prefix) the rows
+    cannot be told apart, so they stop only once every request is cancelled.
+    """
+
+    def __init__(self, prompts: List[str], tokens: List[Optional[CancelToken]]):
+        self.prompts = list(prompts)
+        self.tokens = list(tokens)
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores, **kwargs
+    ) -> torch.BoolTensor:
+        cancelled = [token is not None and token.cancelled for token in self.tokens]
+        if len(cancelled) != input_ids.shape[0]:
+            cancelled = [all(cancelled)] * input_ids.shape[0]
+        return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+    def prompt_cancelled(self, prompt: str) -> bool:
+        """
+        Check one prompt, for backends that decode text one prompt at a
+        time; they call this before every token
+        """
+        return any(
+            token is not None and token.cancelled and p == prompt
+            for p, token in zip(self.prompts, self.tokens)
+        )
@@ -14,58 +14,152 @@ Handles documents of any size by splitting into processable chunks
 """
 
 import re
-from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> float:
+    """Rough token estimate: 1 token ≈ 4 characters"""
+    return len(text) / 4
+
+
+class TokenCounter:
+    """
+    Tokenizer-backed length function for DocumentChunker
+
+    Counts are cached per text, and uncached texts are tokenized together in
+    one batch call (fast tokenizers encode batches in parallel)
+    """
+
+    def __init__(self, tokenizer, cache_size: int = 8192):
+        """
+        Initialize counter
+
+        Args:
+            tokenizer: HF tokenizer (or anything with encode())
+            cache_size: Number of texts whose counts are kept
+        """
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """Token counts for several texts, tokenizing only uncached ones"""
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, text in enumerate(texts):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    counts[i] = self._cache[text]
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(i)
+
+        if missing:
+            unique = list(missing)
+            lengths = self._tokenize(unique)
+            with self._lock:
+                self.misses += len(unique)
+                for text, length in zip(unique, lengths):
+                    self._cache[text] = length
+                    for i in missing[text]:
+                        counts[i] = length
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return counts
+
+    def _tokenize(self, texts: List[str]) -> List[int]:
+        if callable(self.tokenizer):
+            encoded = self.tokenizer(
+                texts, add_special_tokens=False, return_attention_mask=False
+            )
+            return [len(ids) for ids in encoded["input_ids"]]
+        return [len(self.tokenizer.encode(t, add_special_tokens=False)) for t in texts]
 
 
 class DocumentChunker:
     """Intelligent document chunking for LLM processing"""
 
-    def __init__(self, max_tokens: int = 3000):
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        length_function: Optional[Callable[[str], float]] = None,
+    ):
         """
         Initialize chunker
 
         Args:
-            max_tokens: Maximum tokens per chunk (conservative estimate)
+            max_tokens: Maximum tokens per chunk, including any tokens
+                reserved per call for the prompt around the chunk
+            length_function: Token count of a text (e.g. a TokenCounter);
+                defaults to the 4-characters-per-token estimate
         """
         self.max_tokens = max_tokens
         # Rough estimate: 1 token ≈ 4 characters
         self.max_chars_per_chunk = max_tokens * 4
-
-    def chunk_document(self, text: str, strategy: str = "auto") -> List[Dict]:
+        self.length_function = length_function or estimate_tokens
+
+    def count_tokens(self, texts: List[str]) -> List[float]:
+        """Token counts via the length function, batched when it supports it"""
+        count_many = getattr(self.length_function, "count_many", None)
+        if count_many is not None:
+            return count_many(texts)
+        return [self.length_function(text) for text in texts]
+
+    def chunk_document(
+        self, text: str, strategy: str = "auto", reserved_tokens: int = 0
+    ) -> List[Dict]:
         """
         Split document into processable chunks
 
         Args:
             text: Full document text
             strategy: Chunking strategy - "auto", "sentence", "paragraph", "section"
+            reserved_tokens: Tokens of prompt template and memory context that
+                are sent with every chunk
 
         Returns:
             List of chunks with metadata
         """
         char_count = len(text)
+        budget = max(1, self.max_tokens - reserved_tokens)
+        total_tokens = self.count_tokens([text])[0]
 
         print(f"\n{'='*80}")
         print(f"📄 DOCUMENT CHUNKING")
         print(f"{'='*80}")
         print(f"Total characters: {char_count:,}")
-        print(f"Estimated tokens: {int(char_count / 4):,}")
-        print(f"Max tokens per chunk: {self.max_tokens:,}")
+        print(f"Estimated tokens: {int(total_tokens):,}")
+        print(
+            f"Max tokens per chunk: {budget:,} ({reserved_tokens:,} reserved for prompt)"
+        )
 
         # If text is small enough and strategy is auto, return as single chunk
-        if char_count <= self.max_chars_per_chunk and strategy == "auto":
+        if total_tokens <= budget and strategy == "auto":
             print(f"✅ Document fits in single chunk - no splitting needed\n")
             return [
                 {
                     "chunk_id": 0,
                     "text": text,
                     "char_count": char_count,
-                    "estimated_tokens": int(char_count / 4),
+                    "estimated_tokens": int(total_tokens),
                     "strategy": "single",
                 }
             ]
 
         # Force chunking for non-auto strategies or large texts
-        if char_count > self.max_chars_per_chunk:
+        if total_tokens > budget:
             print(f"⚠️ Document exceeds chunk size - splitting required")
 
         # Auto-detect best strategy
@@ -76,11 +170,19 @@ class DocumentChunker:
 
         # Apply chunking strategy
         if strategy == "section":
-            chunks = self._chunk_by_sections(text)
+            texts = self._chunk_by_sections(text, budget)
         elif strategy == "paragraph":
-            chunks = self._chunk_by_paragraphs(text)
+            texts = self._chunk_by_paragraphs(text, budget)
         else:
-            chunks = self._chunk_by_sentences(text)
+            texts = self._chunk_by_sentences(text, budget)
+
+        texts = [t.strip() for t in texts if t.strip()] or [text]
+        chunks = [
+            self._create_chunk_dict(i, chunk_text, tokens)
+            for i, (chunk_text, tokens) in enumerate(
+                zip(texts, self.count_tokens(texts))
+            )
+        ]
 
         print(f"✅ Created {len(chunks)} chunks")
         for i, chunk in enumerate(chunks):
@@ -115,110 +217,152 @@ class DocumentChunker:
 
         return "sentence"
 
-    def _chunk_by_sections(self, text: str) -> List[Dict]:
+    def _chunk_by_sections(self, text: str, budget: float) -> List[str]:
         """Chunk by detecting sections/headers"""
 
         # Split by common section patterns
         section_pattern = r"(^#{1,3}\s+.+$|^\d+\.\s+[A-Z].+$|^[A-Z][A-Z\s]+:)"
 
         parts = re.split(section_pattern, text, flags=re.MULTILINE)
+        parts = [part for part in parts if part.strip()]
 
-        chunks = []
-        current_chunk = ""
-        chunk_id = 0
-
-        for i, part in enumerate(parts):
-            if not part.strip():
-                continue
+        return self._pack(parts, "\n\n", budget)
 
-            potential_chunk = current_chunk + "\n\n" + part if current_chunk else part
+    def _chunk_by_paragraphs(self, text: str, budget: float) -> List[str]:
+        """Chunk by paragraphs"""
 
-            # If adding this part exceeds limit, save current and start new
-            if len(potential_chunk) > self.max_chars_per_chunk and current_chunk:
-                chunks.append(self._create_chunk_dict(chunk_id, current_chunk))
-                chunk_id += 1
-                current_chunk = part
-            else:
-                current_chunk = potential_chunk
+        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
 
-        # Add final chunk
-        if current_chunk.strip():
-            chunks.append(self._create_chunk_dict(chunk_id, current_chunk))
+        return self._pack(paragraphs, "\n\n", budget)
 
-        return chunks if chunks else [self._create_chunk_dict(0, text)]
+    def _chunk_by_sentences(self, text: str, budget: float) -> List[str]:
+        """Chunk by sentences with overlap"""
 
-    def _chunk_by_paragraphs(self, text: str) -> List[Dict]:
-        """Chunk by paragraphs"""
+        # Simple sentence splitting
+        sentences = self._split_sentences(text)
+        sentences = self._fit_units(sentences, " ", budget)
+        if not sentences:
+            return [text]
 
-        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+        counts = self.count_tokens(sentences)
+        separator = self.count_tokens([" "])[0]
 
         chunks = []
-        current_chunk = ""
-        chunk_id = 0
+        current: List[int] = []
+        current_tokens = 0.0
 
-        for para in paragraphs:
-            potential_chunk = current_chunk + "\n\n" + para if current_chunk else para
+        for i, tokens in enumerate(counts):
+            # If current chunk would exceed the limit
+            if current and current_tokens + separator + tokens > budget:
+                chunks.append(" ".join(sentences[j] for j in current))
 
-            if len(potential_chunk) > self.max_chars_per_chunk and current_chunk:
-                chunks.append(self._create_chunk_dict(chunk_id, current_chunk))
-                chunk_id += 1
-                current_chunk = para
-            else:
-                current_chunk = potential_chunk
+                # Start new chunk with the last sentence from previous chunk for
+                # overlap, as long as it still fits next to this one
+                last = current[-1]
+                if counts[last] + separator + tokens <= budget:
+                    current, current_tokens = [last], counts[last]
+                else:
+                    current, current_tokens = [], 0.0
 
-        if current_chunk.strip():
-            chunks.append(self._create_chunk_dict(chunk_id, current_chunk))
+            current_tokens += (separator if current else 0) + tokens
+            current.append(i)
 
-        return chunks if chunks else [self._create_chunk_dict(0, text)]
+        # Add final chunk if there's remaining text
+        if current:
+            chunks.append(" ".join(sentences[j] for j in current))
 
-    def _chunk_by_sentences(self, text: str) -> List[Dict]:
-        """Chunk by sentences with overlap"""
+        return chunks
 
-        # Simple sentence splitting
-        sentences = re.split(r"(?<=[.!?])\s+", text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+    def _pack(self, units: List[str], separator: str, budget: float) -> List[str]:
+        """
+        Greedily join units into texts of at most `budget` tokens
 
-        chunks = []
-        chunk_id = 0
-        current_sentences = []
+        Counts are summed per unit (plus separators) instead of re-counting
+        every candidate text, so each unit is tokenized once
+        """
+        units = self._fit_units(units, separator, budget)
+        counts = self.count_tokens(units)
+        separator_tokens = self.count_tokens([separator])[0]
+
+        packed = []
+        current: List[str] = []
+        current_tokens = 0.0
+
+        for unit, tokens in zip(units, counts):
+            added = tokens + (separator_tokens if current else 0)
+            # If adding this unit exceeds limit, save current and start new
+            if current and current_tokens + added > budget:
+                packed.append(separator.join(current))
+                current, current_tokens = [unit], tokens
+            else:
+                current.append(unit)
+                current_tokens += added
 
-        for sentence in sentences:
-            current_sentences.append(sentence)
-            current_text = " ".join(current_sentences)
+        if current:
+            packed.append(separator.join(current))
 
-            # If current chunk would exceed the limit
-            if (
-                len(current_text) * 4 > self.max_tokens * 4
-                and len(current_sentences) > 1
-            ):
-                # Keep all but the last sentence for the current chunk
-                chunk_text = " ".join(current_sentences[:-1])
-                chunks.append(self._create_chunk_dict(chunk_id, chunk_text))
-                chunk_id += 1
-
-                # Start new chunk with the last sentence from previous chunk for overlap
-                current_sentences = (
-                    current_sentences[-2:]
-                    if len(current_sentences) > 2
-                    else current_sentences[-1:]
-                )
+        return packed
 
-        # Add final chunk if there's remaining text
-        if current_sentences:
-            chunks.append(
-                self._create_chunk_dict(chunk_id, " ".join(current_sentences))
-            )
+    def _fit_units(self, units: List[str], separator: str, budget: float) -> List[str]:
+        """
+        Split any unit longer than the budget on its own - first into
+        sentences, then into words - so no chunk silently overflows
+        """
+        counts = self.count_tokens(units)
+        if all(tokens <= budget for tokens in counts):
+            return units
+
+        fitted = []
+        for unit, tokens in zip(units, counts):
+            if tokens <= budget:
+                fitted.append(unit)
+                continue
 
-        return chunks if chunks else [self._create_chunk_dict(0, text)]
+            sentences = self._split_sentences(unit)
+            if len(sentences) > 1:
+                fitted.extend(self._pack(sentences, " ", budget))
+            else:
+                fitted.extend(self._pack_words(unit, budget))
+        return fitted
+
+    def _pack_words(self, text: str, budget: float) -> List[str]:
+        """Last resort for a single over-long sentence: pack whole words"""
+        words = text.split()
+        counts = self.count_tokens(words)
+        separator = self.count_tokens([" "])[0]
+
+        packed = []
+        current: List[str] = []
+        current_tokens = 0.0
+        for word, tokens in zip(words, counts):
+            added = tokens + (separator if current else 0)
+            if current and current_tokens + added > budget:
+                packed.append(" ".join(current))
+                current, current_tokens = [word], tokens
+            else:
+                current.append(word)
+                current_tokens += added
+        if current:
+            packed.append(" ".join(current))
+        return packed
+
+    @staticmethod
+    def _split_sentences(text: str) -> List[str]:
+        sentences = re.split(r"(?<=[.!?])\s+", text)
+        return [s.strip() for s in sentences if s.strip()]
 
-    def _create_chunk_dict(self, chunk_id: int, text: str) -> Dict:
+    def _create_chunk_dict(
+        self, chunk_id: int, text: str, tokens: float = None
+    ) -> Dict:
         """Create chunk dictionary with metadata"""
         char_count = len(text)
+        if tokens is None:
+            tokens = self.count_tokens([text])[0]
         return {
             "chunk_id": chunk_id,
             "text": text.strip(),
             "char_count": char_count,
-            "estimated_tokens": int(char_count / 4),
+            "estimated_tokens": int(tokens),
             "strategy": "chunked",
         }
 
@@ -0,0 +1,457 @@
+# -----------------------------------------------------------------------------
+# File: constrained_decoding.py
+# Description: Grammar-constrained JSON decoding for ReqEngine - masks logits
+#              so the model can only emit JSON matching the use case schema.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Constrained JSON Decoding
+A character automaton compiled from a JSON schema (objects with fixed keys,
+arrays, strings) decides which vocabulary tokens may come next. Allowed-token
+masks are computed once per automaton state and cached.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+
+WHITESPACE = " \t\n\r"
+HEX_DIGITS = "0123456789abcdefABCDEF"
+ESCAPABLE = '"\\/bfnrt'
+
+# Automaton state: a stack of frames, as a hashable tuple (empty = complete)
+State = Tuple[tuple, ...]
+
+
+class JsonSchemaAutomaton:
+    """
+    Character-level pushdown automaton for a subset of JSON schema.
+
+    Supports objects (every property required, emitted in schema order),
+    arrays and strings - enough for UseCaseSchema and lists of it. Whitespace
+    is allowed wherever JSON allows it.
+    """
+
+    def __init__(self, schema: Dict):
+        """
+        Compile schema
+
+        Args:
+            schema: JSON schema (e.g. from a pydantic model_json_schema())
+        """
+        self._defs = schema.get("$defs", {})
+        # Nodes: ("string",), ("array", item), ("object", ((literal, child), ...))
+        self.nodes: List[tuple] = []
+        self.root = self._compile(schema)
+
+    def initial_state(self, opened: bool = False) -> State:
+        """
+        State before the first generated character
+
+        Args:
+            opened: The root's "[" or "{" is already part of the prompt
+        """
+        if not opened:
+            return (("val", self.root),)
+
+        node = self.nodes[self.root]
+        if node[0] == "array":
+            return (("arr", self.root, "first"),)
+        if node[0] == "object":
+            return (self._object_start(self.root),)
+        raise ValueError("Only array or object roots can be pre-opened")
+
+    def is_complete(self, state: State) -> bool:
+        return state == ()
+
+    def advance(self, state: Optional[State], text: str) -> Optional[State]:
+        """Feed text; None when it cannot continue valid output"""
+        for ch in text:
+            if state is None:
+                return None
+            state = self.step(state, ch)
+        return state
+
+    def step(self, state: State, ch: str) -> Optional[State]:
+        """Feed one character"""
+        if not state:
+            return None
+
+        frame = state[-1]
+        kind = frame[0]
+        rest = state[:-1]
+
+        if kind == "str":
+            if ch == '"':
+                return rest
+            if ch == "\\":
+                return rest + (("esc",),)
+            if ord(ch) < 0x20:
+                return None
+            return state
+
+        if kind == "esc":
+            if ch == "u":
+                return rest + (("hex", 4),)
+            if ch in ESCAPABLE:
+                return rest + (("str",),)
+            return None
+
+        if kind == "hex":
+            if ch not in HEX_DIGITS:
+                return None
+            if frame[1] == 1:
+                return rest + (("str",),)
+            return rest + (("hex", frame[1] - 1),)
+
+        if kind == "obj_empty":
+            if ch in WHITESPACE:
+                return state
+            return rest if ch == "}" else None
+
+        if kind == "val":
+            if ch in WHITESPACE:
+                return state
+            return self._start_value(rest, frame[1], ch)
+
+        if kind == "arr":
+            _, node_id, phase = frame
+            if ch in WHITESPACE:
+                return state
+            if phase == "after":
+                if ch == ",":
+                    return rest + (("arr", node_id, "next"),)
+                return rest if ch == "]" else None
+            if phase == "first" and ch == "]":
+                return rest
+            # First item or item after a comma
+            item = self.nodes[node_id][1]
+            return self._start_value(rest + (("arr", node_id, "after"),), item, ch)
+
+        if kind == "obj":
+            _, node_id, key_idx, phase, pos = frame
+            properties = self.nodes[node_id][1]
+
+            if phase == "key":
+                literal = properties[key_idx][0]
+                if pos == 0 and ch in WHITESPACE:
+                    return state
+                if ch != literal[pos]:
+                    return None
+                if pos + 1 == len(literal):
+                    return rest + (("obj", node_id, key_idx, "colon", 0),)
+                return rest + (("obj", node_id, key_idx, "key", pos + 1),)
+
+            if ch in WHITESPACE:
+                return state
+
+            if phase == "colon":
+                if ch != ":":
+                    return None
+                child = properties[key_idx][1]
+                return rest + (
+                    ("obj", node_id, key_idx, "after", 0),
+                    ("val", child),
+                )
+
+            # phase == "after": next key or end of object
+            if key_idx + 1 < len(properties):
+                if ch == ",":
+                    return rest + (("obj", node_id, key_idx + 1, "key", 0),)
+                return None
+            return rest if ch == "}" else None
+
+        return None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _compile(self, schema: Dict) -> int:
+        if "$ref" in schema:
+            schema = self._defs[schema["$ref"].split("/")[-1]]
+
+        schema_type = schema.get("type")
+        if schema_type == "string":
+            node = ("string",)
+        elif schema_type == "array":
+            node = ("array", self._compile(schema.get("items", {"type": "string"})))
+        elif schema_type == "object":
+            properties = tuple(
+                ('"' + name + '"', self._compile(sub))
+                for name, sub in schema.get("properties", {}).items()
+            )
+            node = ("object", properties)
+        else:
+            raise ValueError(
+                f"Unsupported schema type for constrained decoding: {schema_type}"
+            )
+
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _object_start(self, node_id: int) -> tuple:
+        if not self.nodes[node_id][1]:
+            return ("obj_empty",)
+        return ("obj", node_id, 0, "key", 0)
+
+    def _start_value(self, stack: State, node_id: int, ch: str) -> Optional[State]:
+        node = self.nodes[node_id]
+        if node[0] == "string" and ch == '"':
+            return stack + (("str",),)
+        if node[0] == "array" and ch == "[":
+            return stack + (("arr", node_id, "first"),)
+        if node[0] == "object" and ch == "{":
+            return stack + (self._object_start(node_id),)
+        return None
+
+
+class TokenVocabulary:
+    """
+    Decoded text of every token id, grouped for fast mask computation.
+    Built once per tokenizer and shared by all schemas.
+    """
+
+    def __init__(self, tokenizer):
+        """
+        Decode the vocabulary
+
+        Args:
+            tokenizer: HF tokenizer used for generation
+        """
+        self.eos_token_id = tokenizer.eos_token_id
+        self.size = len(tokenizer)
+        special_ids = set(getattr(tokenizer, "all_special_ids", []) or [])
+
+        self.texts: List[str] = []
+        self.by_first_char: Dict[str, List[int]] = {}
+        # Tokens that can sit anywhere inside a JSON string body
+        self.string_safe = torch.zeros(self.size, dtype=torch.bool)
+        self.string_special: List[int] = []
+
+        for token_id in range(self.size):
+            text = (
+                ""
+                if token_id in special_ids
+                else tokenizer.decode([token_id], clean_up_tokenization_spaces=False)
+            )
+            self.texts.append(text)
+            if not text:
+                continue
+            self.by_first_char.setdefault(text[0], []).append(token_id)
+            if '"' in text or "\\" in text or any(ord(c) < 0x20 for c in text):
+                self.string_special.append(token_id)
+            else:
+                self.string_safe[token_id] = True
+
+
+class TokenMasks:
+    """
+    Which token ids an automaton allows in each state.
+
+    Inside string bodies the string-safe tokens are always allowed, so only
+    tokens with quotes, backslashes or control characters are simulated;
+    other states only simulate tokens whose first character they accept.
+    """
+
+    def __init__(
+        self,
+        automaton: JsonSchemaAutomaton,
+        vocabulary: TokenVocabulary,
+        max_cached_states: int = 4096,
+    ):
+        """
+        Initialize masks
+
+        Args:
+            automaton: Compiled schema automaton
+            vocabulary: Decoded tokenizer vocabulary
+            max_cached_states: Upper bound on cached state masks
+        """
+        self.automaton = automaton
+        self.vocabulary = vocabulary
+        self.eos_token_id = vocabulary.eos_token_id
+        self.vocab_size = vocabulary.size
+        self.max_cached_states = max_cached_states
+
+        self._cache: "OrderedDict[State, torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allowed(self, state: Optional[State]) -> torch.Tensor:
+        """Boolean mask over the vocabulary for the next token"""
+        if state is None or self.automaton.is_complete(state):
+            mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+            if self.eos_token_id is not None:
+                mask[self.eos_token_id] = True
+            return mask
+
+        with self._lock:
+            if state in self._cache:
+                self._cache.move_to_end(state)
+                return self._cache[state]
+
+        mask = self._compute(state)
+        if not mask.any() and self.eos_token_id is not None:
+            # Dead end for this vocabulary - let the sequence end
+            mask[self.eos_token_id] = True
+
+        with self._lock:
+            self._cache[state] = mask
+            while len(self._cache) > self.max_cached_states:
+                self._cache.popitem(last=False)
+        return mask
+
+    def _compute(self, state: State) -> torch.Tensor:
+        automaton = self.automaton
+        vocabulary = self.vocabulary
+        if state[-1][0] == "str":
+            mask = vocabulary.string_safe.clone()
+            candidates = vocabulary.string_special
+        else:
+            mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+            candidates = [
+                token_id
+                for ch, ids in vocabulary.by_first_char.items()
+                if automaton.step(state, ch) is not None
+                for token_id in ids
+            ]
+
+        for token_id in candidates:
+            if automaton.advance(state, vocabulary.texts[token_id]) is not None:
+                mask[token_id] = True
+        return mask
+
+
+class JsonSchemaLogitsProcessor(LogitsProcessor):
+    """
+    Mask every token that would make the generated text invalid for the
+    schema; once the root value is complete only EOS is allowed.
+
+    One shared instance per schema travels with the generation kwargs, so
+    equal requests still batch together. Each model.generate() call decodes
+    with its own for_call() copy, which tracks the automaton state of every
+    batch row by row index.
+    """
+
+    def __init__(self, masks: TokenMasks, opened: bool = True):
+        """
+        Initialize processor
+
+        Args:
+            masks: Token masks for the schema and tokenizer
+            opened: The prompt already ends with the root's "[" or "{"
+        """
+        self.masks = masks
+        self.automaton = masks.automaton
+        self.initial = self.automaton.initial_state(opened)
+
+    def state_after(self, generated_text: str) -> Optional[State]:
+        """Automaton state after the given generated text"""
+        return self.automaton.advance(self.initial, generated_text)
+
+    def cache_key(self):
+        """Compiled schema and start state, for the response cache"""
+        return {"nodes": self.automaton.nodes, "initial": self.initial}
+
+    def for_call(self) -> "JsonSchemaCallProcessor":
+        """Processor with row states for one generate() call"""
+        return JsonSchemaCallProcessor(self)
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        raise RuntimeError(
+            "JsonSchemaLogitsProcessor is shared between calls; "
+            "pass for_call() (or bind_logits_processors()) to generate()"
+        )
+
+
+class JsonSchemaCallProcessor(LogitsProcessor):
+    """
+    Row states of one generate() call. Row i keeps its automaton state from
+    step to step; the first step treats everything so far as prompt.
+    """
+
+    def __init__(self, processor: JsonSchemaLogitsProcessor):
+        self.processor = processor
+        self._rows: Optional[List[List[int]]] = None
+        self._states: List[Optional[State]] = []
+
+    def for_call(self) -> "JsonSchemaCallProcessor":
+        return self.processor.for_call()
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        processor = self.processor
+        texts = processor.masks.vocabulary.texts
+        rows = input_ids.tolist()
+
+        previous_rows = self._rows
+        if (
+            previous_rows is None
+            or len(rows) != len(previous_rows)
+            or len(rows[0]) != len(previous_rows[0]) + 1
+        ):
+            # First step of a generate() call: nothing generated yet
+            states = [processor.initial] * len(rows)
+        else:
+            states = []
+            for i, (row, previous) in enumerate(zip(rows, previous_rows)):
+                if row[:-1] != previous:
+                    raise RuntimeError(
+                        f"Constrained decoding lost track of batch row {i}: "
+                        "its tokens do not extend the previous step"
+                    )
+                states.append(
+                    processor.automaton.advance(self._states[i], texts[row[-1]])
+                )
+        self._rows = rows
+        self._states = states
+
+        allowed = torch.stack([processor.masks.allowed(s) for s in states])
+        allowed = allowed.to(scores.device)
+        # Some models pad the vocab dimension beyond the tokenizer
+        if allowed.shape[1] < scores.shape[1]:
+            padding = torch.zeros(
+                (allowed.shape[0], scores.shape[1] - allowed.shape[1]),
+                dtype=torch.bool,
+                device=scores.device,
+            )
+            allowed = torch.cat([allowed, padding], dim=1)
+        return scores.masked_fill(~allowed, float("-inf"))
+
+
+def bind_logits_processors(generate_kwargs: Dict) -> Dict:
+    """Generation kwargs with shared JSON processors replaced by per-call ones"""
+    processors = generate_kwargs.get("logits_processor")
+    if not processors or not any(hasattr(p, "for_call") for p in processors):
+        return generate_kwargs
+    kwargs = dict(generate_kwargs)
+    kwargs["logits_processor"] = LogitsProcessorList(
+        [p.for_call() if hasattr(p, "for_call") else p for p in processors]
+    )
+    return kwargs
+
+
+def array_schema(item_schema: Dict) -> Dict:
+    """Schema for a JSON array of the given item schema"""
+    schema = {"type": "array", "items": dict(item_schema)}
+    if "$defs" in item_schema:
+        schema["$defs"] = item_schema["$defs"]
+    return schema
+
+
+def build_json_processor(
+    schema: Dict, vocabulary: TokenVocabulary, opened: bool = True
+) -> JsonSchemaLogitsProcessor:
+    """Logits processor constraining output to the given JSON schema"""
+    masks = TokenMasks(JsonSchemaAutomaton(schema), vocabulary)
+    return JsonSchemaLogitsProcessor(masks, opened=opened)
@@ -12,7 +12,7 @@ import json
 import os
 import sqlite3
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 
 def get_db_path():
@@ -154,6 +154,70 @@ def init_db():
     """
     )
 
+    # Generation stats - real output lengths, used to fit token budgets
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS generation_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prompt_type TEXT NOT NULL,
+            size_category TEXT NOT NULL,
+            use_cases INTEGER NOT NULL,
+            generated_tokens INTEGER NOT NULL,
+            max_new_tokens INTEGER NOT NULL,
+            truncated INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    )
+
+    # Background extraction jobs - input, chunk plan and per-chunk results
+    # are kept so an interrupted job resumes after a restart
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS extraction_jobs (
+            job_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            filename TEXT,
+            status TEXT NOT NULL,
+            text TEXT NOT NULL,
+            project_context TEXT,
+            domain TEXT,
+            chunks TEXT,
+            chunk_results TEXT,
+            chunk_summaries TEXT,
+            chunks_total INTEGER,
+            chunks_done INTEGER NOT NULL DEFAULT 0,
+            use_cases_found INTEGER NOT NULL DEFAULT 0,
+            use_cases_stored INTEGER,
+            eta_seconds REAL,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """
+    )
+
+    # Use case embeddings - one vector per use case, tagged with the model
+    # that computed it so a model change re-encodes instead of mixing vectors
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS use_case_embeddings (
+            use_case_id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            model TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            dtype TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (use_case_id) REFERENCES use_cases(id) ON DELETE CASCADE
+        )
+    """
+    )
+
     # Create indexes for faster lookups
     c.execute(
         "CREATE INDEX IF NOT EXISTS idx_use_cases_session_id ON use_cases(session_id)"
@@ -168,6 +232,18 @@ def init_db():
     c.execute(
         "CREATE INDEX IF NOT EXISTS idx_summaries_session_id ON session_summaries(session_id)"
     )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_generation_stats_type ON generation_stats(prompt_type)"
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_extraction_jobs_session_id ON extraction_jobs(session_id)"
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_extraction_jobs_status ON extraction_jobs(status)"
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_use_case_embeddings_session_id ON use_case_embeddings(session_id)"
+    )
 
     conn.commit()
     conn.close()
@@ -418,6 +494,63 @@ def get_use_case_by_id(use_case_id: int) -> Optional[Dict]:
     return None
 
 
+def insert_use_case(session_id: str, use_case: Dict) -> int:
+    """Store a new use case for a session and return its ID"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        """
+        INSERT INTO use_cases
+        (session_id, title, preconditions, main_flow, sub_flows, alternate_flows, outcomes, stakeholders)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        (
+            session_id,
+            use_case.get("title", ""),
+            json.dumps(use_case.get("preconditions", [])),
+            json.dumps(use_case.get("main_flow", [])),
+            json.dumps(use_case.get("sub_flows", [])),
+            json.dumps(use_case.get("alternate_flows", [])),
+            json.dumps(use_case.get("outcomes", [])),
+            json.dumps(use_case.get("stakeholders", [])),
+        ),
+    )
+
+    use_case_id = c.lastrowid
+    conn.commit()
+    conn.close()
+
+    return use_case_id
+
+
+UPDATE_USE_CASE_SQL = """
+    UPDATE use_cases
+    SET title = ?,
+        preconditions = ?,
+        main_flow = ?,
+        sub_flows = ?,
+        alternate_flows = ?,
+        outcomes = ?,
+        stakeholders = ?
+    WHERE id = ?
+"""
+
+
+def _use_case_update_params(use_case_id: int, updated_data: Dict) -> tuple:
+    return (
+        updated_data.get("title", ""),
+        json.dumps(updated_data.get("preconditions", [])),
+        json.dumps(updated_data.get("main_flow", [])),
+        json.dumps(updated_data.get("sub_flows", [])),
+        json.dumps(updated_data.get("alternate_flows", [])),
+        json.dumps(updated_data.get("outcomes", [])),
+        json.dumps(updated_data.get("stakeholders", [])),
+        use_case_id,
+    )
+
+
 def update_use_case(use_case_id: int, updated_data: Dict) -> bool:
     """Update a use case with new data"""
     db_path = get_db_path()
@@ -434,37 +567,184 @@ def update_use_case(use_case_id: int, updated_data: Dict) -> bool:
 
     try:
         c.execute(
-            """
-            UPDATE use_cases
-            SET title = ?,
-                preconditions = ?,
-                main_flow = ?,
-                sub_flows = ?,
-                alternate_flows = ?,
-                outcomes = ?,
-                stakeholders = ?
-            WHERE id = ?
-        """,
-            (
-                updated_data.get("title", ""),
-                json.dumps(updated_data.get("preconditions", [])),
-                json.dumps(updated_data.get("main_flow", [])),
-                json.dumps(updated_data.get("sub_flows", [])),
-                json.dumps(updated_data.get("alternate_flows", [])),
-                json.dumps(updated_data.get("outcomes", [])),
-                json.dumps(updated_data.get("stakeholders", [])),
-                use_case_id,
-            ),
+            UPDATE_USE_CASE_SQL, _use_case_update_params(use_case_id, updated_data)
+        )
+        updated = c.rowcount
+        # The stored vector no longer matches the use case text
+        c.execute(
+            "DELETE FROM use_case_embeddings WHERE use_case_id = ?", (use_case_id,)
         )
         conn.commit()
         conn.close()
-        return c.rowcount > 0
+        return updated > 0
     except Exception as e:
         conn.close()
         print(f"Error updating use case: {e}")
         return False
 
 
+def update_use_cases(updates: List[Tuple[int, Dict]]) -> List[int]:
+    """
+    Update several use cases in one transaction (all or none)
+
+    Returns:
+        IDs of the use cases that exist and were updated
+    """
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    updated = []
+    try:
+        for use_case_id, updated_data in updates:
+            c.execute(
+                UPDATE_USE_CASE_SQL,
+                _use_case_update_params(use_case_id, updated_data),
+            )
+            if c.rowcount > 0:
+                updated.append(use_case_id)
+        c.executemany(
+            "DELETE FROM use_case_embeddings WHERE use_case_id = ?",
+            [(use_case_id,) for use_case_id in updated],
+        )
+        conn.commit()
+        return updated
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating use cases: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def save_use_case_embeddings(
+    session_id: str,
+    vectors: Dict[int, bytes],
+    dim: int,
+    dtype: str,
+    model: str,
+    model_version: str,
+):
+    """Store (or replace) the embedding vectors of use cases of one session"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.executemany(
+        """
+        INSERT OR REPLACE INTO use_case_embeddings
+            (use_case_id, session_id, model, model_version, dtype, dim, vector)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+        [
+            (use_case_id, session_id, model, model_version, dtype, dim, vector)
+            for use_case_id, vector in vectors.items()
+        ],
+    )
+
+    conn.commit()
+    conn.close()
+
+
+def get_use_case_embeddings(session_id: str) -> List[Dict]:
+    """
+    Use cases of a session with their stored embedding (None if there is
+    none yet), in insertion order
+    """
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        """
+        SELECT u.id, u.title, u.main_flow,
+               e.model, e.model_version, e.dtype, e.dim, e.vector
+        FROM use_cases u
+        LEFT JOIN use_case_embeddings e ON e.use_case_id = u.id
+        WHERE u.session_id = ?
+        ORDER BY u.id
+    """,
+        (session_id,),
+    )
+
+    rows = c.fetchall()
+    conn.close()
+
+    return [
+        {
+            "id": row[0],
+            "title": row[1],
+            "main_flow": json.loads(row[2]) if row[2] else [],
+            "embedding": (
+                {
+                    "model": row[3],
+                    "model_version": row[4],
+                    "dtype": row[5],
+                    "dim": row[6],
+                    "vector": row[7],
+                }
+                if row[7] is not None
+                else None
+            ),
+        }
+        for row in rows
+    ]
+
+
+def list_use_case_embeddings(
+    model: str, model_version: str, after_id: int = 0, limit: int = 1000
+) -> List[Dict]:
+    """
+    Stored embeddings of one model across all sessions, by use case ID
+    (pass the last ID seen as after_id to get the next page)
+    """
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        """
+        SELECT use_case_id, session_id, dtype, dim, vector
+        FROM use_case_embeddings
+        WHERE model = ? AND model_version = ? AND use_case_id > ?
+        ORDER BY use_case_id
+        LIMIT ?
+    """,
+        (model, model_version, after_id, limit),
+    )
+
+    rows = c.fetchall()
+    conn.close()
+
+    return [
+        {
+            "use_case_id": row[0],
+            "session_id": row[1],
+            "dtype": row[2],
+            "dim": row[3],
+            "vector": row[4],
+        }
+        for row in rows
+    ]
+
+
+def get_project_session_ids(project_context: str) -> List[str]:
+    """IDs of every session of a project"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        "SELECT session_id FROM sessions WHERE project_context = ?",
+        (project_context,),
+    )
+
+    rows = c.fetchall()
+    conn.close()
+
+    return [row[0] for row in rows]
+
+
 def add_session_summary(session_id: str, summary: str, key_concepts: List[str]):
     """Add a summary of conversation progress"""
     db_path = get_db_path()
@@ -512,6 +792,211 @@ def get_latest_summary(session_id: str) -> Optional[Dict]:
     return None
 
 
+def record_generation_stat(
+    prompt_type: str,
+    size_category: str,
+    use_cases: int,
+    generated_tokens: int,
+    max_new_tokens: int,
+):
+    """Record how many tokens one generation used for how many use cases"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        """
+        INSERT INTO generation_stats
+            (prompt_type, size_category, use_cases, generated_tokens, max_new_tokens, truncated)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+        (
+            prompt_type,
+            size_category,
+            use_cases,
+            generated_tokens,
+            max_new_tokens,
+            int(generated_tokens >= max_new_tokens),
+        ),
+    )
+
+    conn.commit()
+    conn.close()
+
+
+def get_generation_stats(prompt_type: str, limit: int = 500) -> List[Dict]:
+    """Most recent generation stats for a prompt type, newest first"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    c.execute(
+        """
+        SELECT size_category, use_cases, generated_tokens, max_new_tokens, truncated
+        FROM generation_stats
+        WHERE prompt_type = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """,
+        (prompt_type, limit),
+    )
+
+    rows = c.fetchall()
+    conn.close()
+
+    return [
+        {
+            "size_category": row["size_category"],
+            "use_cases": row["use_cases"],
+            "generated_tokens": row["generated_tokens"],
+            "max_new_tokens": row["max_new_tokens"],
+            "truncated": bool(row["truncated"]),
+        }
+        for row in rows
+    ]
+
+
+# Job columns stored as JSON text
+EXTRACTION_JOB_JSON_FIELDS = ("chunks", "chunk_results", "chunk_summaries", "result")
+# Columns reported by the API; the input text, chunk plan and chunk results
+# are only loaded by the job runner
+EXTRACTION_JOB_STATUS_COLUMNS = (
+    "job_id",
+    "session_id",
+    "filename",
+    "status",
+    "chunk_summaries",
+    "chunks_total",
+    "chunks_done",
+    "use_cases_found",
+    "use_cases_stored",
+    "eta_seconds",
+    "result",
+    "error",
+    "created_at",
+    "started_at",
+    "updated_at",
+    "finished_at",
+)
+
+
+def create_extraction_job(
+    job_id: str,
+    session_id: str,
+    filename: str,
+    text: str,
+    project_context: Optional[str] = None,
+    domain: Optional[str] = None,
+):
+    """Store a new queued extraction job"""
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        """
+        INSERT INTO extraction_jobs
+            (job_id, session_id, filename, status, text, project_context, domain)
+        VALUES (?, ?, ?, 'queued', ?, ?, ?)
+    """,
+        (job_id, session_id, filename, text, project_context, domain),
+    )
+
+    conn.commit()
+    conn.close()
+
+
+def update_extraction_job(job_id: str, **fields):
+    """Update job columns; JSON columns are encoded, updated_at is refreshed"""
+    values = {
+        key: json.dumps(value) if key in EXTRACTION_JOB_JSON_FIELDS else value
+        for key, value in fields.items()
+    }
+    assignments = ", ".join(f"{key} = ?" for key in values)
+
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+
+    c.execute(
+        f"""
+        UPDATE extraction_jobs
+        SET {assignments}, updated_at = ?
+        WHERE job_id = ?
+    """,
+        (*values.values(), datetime.now().isoformat(), job_id),
+    )
+
+    conn.commit()
+    conn.close()
+
+
+def _extraction_job_from_row(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    for key in EXTRACTION_JOB_JSON_FIELDS:
+        if key in job:
+            job[key] = json.loads(job[key]) if job[key] else None
+    return job
+
+
+def get_extraction_job(job_id: str, include_input: bool = False) -> Optional[Dict]:
+    """
+    Get one extraction job
+
+    Args:
+        job_id: Job ID
+        include_input: Also return the text, chunk plan and chunk results
+    """
+    columns = "*" if include_input else ", ".join(EXTRACTION_JOB_STATUS_COLUMNS)
+
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    c.execute(f"SELECT {columns} FROM extraction_jobs WHERE job_id = ?", (job_id,))
+    row = c.fetchone()
+    conn.close()
+
+    return _extraction_job_from_row(row) if row else None
+
+
+def list_extraction_jobs(
+    session_id: Optional[str] = None,
+    statuses: Optional[List[str]] = None,
+    limit: int = 50,
+) -> List[Dict]:
+    """Most recent extraction jobs (without their input), newest first"""
+    conditions, params = [], []
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    if statuses:
+        conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    c.execute(
+        f"""
+        SELECT {", ".join(EXTRACTION_JOB_STATUS_COLUMNS)} FROM extraction_jobs
+        {where}
+        ORDER BY created_at DESC, rowid DESC
+        LIMIT ?
+    """,
+        (*params, limit),
+    )
+    rows = c.fetchall()
+    conn.close()
+
+    return [_extraction_job_from_row(row) for row in rows]
+
+
 def clean_new_session_titles():
     """Remove 'New Session' titles and update with better defaults"""
     db_path = get_db_path()
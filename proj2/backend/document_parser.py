@@ -208,16 +208,28 @@ def validate_file_size(file: UploadFile, max_size_mb: int = 10) -> None:
     print(f"✅ File size: {size_mb:.2f}MB")
 
 
-def get_text_stats(text: str) -> dict:
-    """Get statistics about extracted text"""
+def get_text_stats(text: str, length_function=None) -> dict:
+    """
+    Get statistics about extracted text
+
+    Args:
+        text: Extracted text
+        length_function: Optional token counter (e.g. chunking_strategy.TokenCounter)
+            used instead of the words * 1.3 estimate
+    """
     lines = text.split("\n")
     words = text.split()
 
+    if length_function is not None:
+        estimated_tokens = length_function(text)
+    else:
+        estimated_tokens = len(words) * 1.3  # Rough estimate
+
     return {
         "characters": len(text),
         "words": len(words),
         "lines": len(lines),
-        "estimated_tokens": len(words) * 1.3,  # Rough estimate
+        "estimated_tokens": estimated_tokens,
         "size_category": categorize_text_size(len(text)),
     }
 
@@ -0,0 +1,298 @@
+# -----------------------------------------------------------------------------
+# File: extraction_cache.py
+# Description: Semantic extraction cache for ReqEngine - reuses the use cases
+#              extracted from requirement text nearly identical to new input.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Semantic Extraction Cache
+Requirement text that is pasted again with small edits would otherwise run
+a full LLM extraction whose use cases are then skipped as duplicates.
+
+Input text is normalized (case, whitespace) and split into sentences. An
+identical normalized text is a hit without embedding anything. Otherwise
+every sentence is embedded, and a stored text matches when each of its
+sentences has a counterpart at least `threshold` similar in the new text
+and the other way round - so added or dropped requirements are a miss.
+Stored texts are pre-selected by the mean of their sentence vectors.
+
+Entries live in their own SQLite file, tagged with the models that made
+them, and the least recently used ones are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Stored texts whose sentences are compared per lookup, and how far below
+# the threshold the similarity of their mean vectors may be
+CANDIDATES_CHECKED = 5
+CANDIDATE_MARGIN = 0.1
+
+
+def normalize_text(text: str) -> str:
+    """Text with unicode forms, case and whitespace normalized"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "\n".join(
+        " ".join(line.split()) for line in text.splitlines() if line.strip()
+    )
+
+
+def split_sentences(normalized: str) -> List[str]:
+    """Sentences (or lines) of normalized text"""
+    parts = re.split(r"(?<=[.!?;])\s+|\n+", normalized)
+    return [part for part in parts if part.strip()] or [normalized]
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix = matrix.reshape(len(matrix), -1)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+@dataclass
+class CacheLookup:
+    """Result of one lookup; pass it to store() after a miss"""
+
+    key: str
+    use_cases: Optional[List[Dict]] = None
+    similarity: Optional[float] = None
+    sentence_vectors: Optional[np.ndarray] = None
+
+    @property
+    def hit(self) -> bool:
+        return self.use_cases is not None
+
+
+class SemanticExtractionCache:
+    """SQLite store of extracted use cases, found by text similarity"""
+
+    def __init__(
+        self,
+        path: str,
+        encode: Callable[[List[str]], object],
+        model: str,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+    ):
+        """
+        Open (or create) the cache file
+
+        Args:
+            path: SQLite database file
+            encode: Embeds a list of texts into one row per text
+            model: Generator and embedder identity; other entries are dropped
+            threshold: Least similarity of every sentence to its counterpart
+            max_entries: Texts kept (least recently used evicted)
+        """
+        self.path = path
+        self.encode = encode
+        self.model = model
+        self.threshold = threshold
+        self.max_entries = max(1, int(max_entries))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                text_vector BLOB NOT NULL,
+                sentence_vectors BLOB NOT NULL,
+                use_cases TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used "
+            "ON extraction_cache(last_used)"
+        )
+        dropped = self._conn.execute(
+            "DELETE FROM extraction_cache WHERE model != ?", (model,)
+        ).rowcount
+        self._conn.commit()
+        if dropped:
+            print(f"♻️  Dropped {dropped} extraction cache entries of another model")
+
+        # Text vectors of every entry, for pre-selecting candidates
+        self._keys: List[str] = []
+        self._text_vectors = np.zeros((0, 0), dtype=np.float32)
+        rows = self._conn.execute(
+            "SELECT key, text_vector FROM extraction_cache"
+        ).fetchall()
+        if rows:
+            self._keys = [row[0] for row in rows]
+            self._text_vectors = np.stack(
+                [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+            )
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, text: str) -> CacheLookup:
+        """Use cases of the stored text matching `text`, if any"""
+        normalized = normalize_text(text)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT use_cases FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._touch(key)
+                self.exact_hits += 1
+                return CacheLookup(key, json.loads(row[0]), 1.0)
+
+        sentence_vectors = _unit_rows(self.encode(split_sentences(normalized)))
+        lookup = CacheLookup(key, sentence_vectors=sentence_vectors)
+        text_vector = _unit_rows(sentence_vectors.mean(axis=0, keepdims=True))[0]
+
+        with self._lock:
+            if len(self._keys) and self._text_vectors.shape[1] == len(text_vector):
+                scores = self._text_vectors @ text_vector
+                order = np.argsort(-scores)[:CANDIDATES_CHECKED]
+                for i in order:
+                    if scores[i] < self.threshold - CANDIDATE_MARGIN:
+                        break
+                    match = self._match(self._keys[i], sentence_vectors)
+                    if match is not None:
+                        self._touch(self._keys[i])
+                        self.semantic_hits += 1
+                        lookup.use_cases, lookup.similarity = match
+                        return lookup
+            self.misses += 1
+        return lookup
+
+    def store(self, lookup: CacheLookup, use_cases: List[Dict]):
+        """Store the use cases extracted after a missed lookup"""
+        if lookup.hit or lookup.sentence_vectors is None or not use_cases:
+            return
+        vectors = lookup.sentence_vectors
+        text_vector = _unit_rows(vectors.mean(axis=0, keepdims=True))[0]
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO extraction_cache
+                    (key, model, dim, text_vector, sentence_vectors, use_cases,
+                     created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    lookup.key,
+                    self.model,
+                    vectors.shape[1],
+                    text_vector.tobytes(),
+                    vectors.tobytes(),
+                    json.dumps(use_cases, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+            if lookup.key not in self._keys:
+                self._keys.append(lookup.key)
+                self._text_vectors = (
+                    np.vstack([self._text_vectors, text_vector])
+                    if len(self._text_vectors)
+                    else text_vector.reshape(1, -1)
+                )
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many were removed"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM extraction_cache").rowcount
+            self._conn.commit()
+            self._keys = []
+            self._text_vectors = np.zeros((0, 0), dtype=np.float32)
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._keys),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "lookups": lookups,
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (called with the lock held)
+    # ------------------------------------------------------------------
+
+    def _match(self, key: str, sentence_vectors: np.ndarray):
+        """(use cases, similarity) of a stored text if every sentence matches"""
+        row = self._conn.execute(
+            "SELECT dim, sentence_vectors, use_cases FROM extraction_cache "
+            "WHERE key = ?",
+            (key,),
+        ).fetchone()
+        stored = np.frombuffer(row[1], dtype=np.float32).reshape(-1, row[0])
+        similarity = sentence_vectors @ stored.T
+        # Worst sentence of either text against its best counterpart
+        score = float(min(similarity.max(axis=1).min(), similarity.max(axis=0).min()))
+        if score < self.threshold:
+            return None
+        return json.loads(row[2]), score
+
+    def _touch(self, key: str):
+        self._conn.execute(
+            "UPDATE extraction_cache SET last_used = ? WHERE key = ?",
+            (time.time(), key),
+        )
+        self._conn.commit()
+
+    def _evict(self):
+        excess = len(self._keys) - self.max_entries
+        if excess <= 0:
+            return
+        evicted = {
+            row[0]
+            for row in self._conn.execute(
+                "SELECT key FROM extraction_cache ORDER BY last_used LIMIT ?",
+                (excess,),
+            )
+        }
+        self._conn.executemany(
+            "DELETE FROM extraction_cache WHERE key = ?", [(k,) for k in evicted]
+        )
+        keep = [i for i, k in enumerate(self._keys) if k not in evicted]
+        self._keys = [self._keys[i] for i in keep]
+        self._text_vectors = self._text_vectors[keep]
+        self.evictions += len(evicted)
@@ -0,0 +1,235 @@
+# -----------------------------------------------------------------------------
+# File: extraction_jobs.py
+# Description: Background extraction jobs for ReqEngine - runs large document
+#              extractions outside the request and records their progress.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Background Extraction Jobs
+Submitting a document returns a job id right away. A worker runs the
+chunked extraction and records progress after every chunk (chunks done,
+use cases found, ETA). Clients poll the job or follow its events.
+
+Jobs live in SQLite together with their chunk plan and finished chunks, so
+a job interrupted by a restart resumes where it stopped.
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from cancellation import CancelToken, GenerationCancelled, cancel_scope
+from db import (create_extraction_job, get_extraction_job,
+                list_extraction_jobs, update_extraction_job)
+
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_JOB_STATES = ("completed", "failed", "cancelled")
+
+
+class JobProgress:
+    """Progress of one running job, saved after every chunk"""
+
+    def __init__(self, job: Dict):
+        """
+        Initialize progress
+
+        Args:
+            job: Job with its input (get_extraction_job(include_input=True))
+        """
+        self.job_id = job["job_id"]
+        # Chunk plan and results of an earlier run of the same job
+        self.chunks: Optional[List[Dict]] = job.get("chunks")
+        self.chunk_results: Dict[int, List[Dict]] = {
+            int(index): use_cases
+            for index, use_cases in (job.get("chunk_results") or {}).items()
+        }
+        plan = {chunk["chunk_id"]: i for i, chunk in enumerate(self.chunks or [])}
+        self.chunk_summaries: Dict[int, Dict] = {
+            plan[summary["chunk_id"]]: summary
+            for summary in job.get("chunk_summaries") or []
+            if summary["chunk_id"] in plan
+        }
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._resumed = len(self.chunk_results)
+
+    def start(self):
+        """
+        Start the ETA clock once the job actually runs, so time spent
+        waiting for admission is not counted as chunk time
+        """
+        with self._lock:
+            self._started = time.monotonic()
+
+    def planned(self, chunks: List[Dict]):
+        """Save the chunk plan, so a resumed job uses the same chunks"""
+        with self._lock:
+            self.chunks = chunks
+            update_extraction_job(self.job_id, chunks=chunks, chunks_total=len(chunks))
+
+    def chunk_done(self, index: int, summary: Dict, use_cases: List[Dict]):
+        """Save one finished chunk and update counts and ETA"""
+        with self._lock:
+            self.chunk_results[index] = use_cases
+            self.chunk_summaries[index] = summary
+
+            done = len(self.chunk_results)
+            # Chunks finished before a restart don't say anything about speed
+            run_here = done - self._resumed
+            remaining = len(self.chunks) - done
+            elapsed = time.monotonic() - self._started
+
+            update_extraction_job(
+                self.job_id,
+                chunk_results=self.chunk_results,
+                chunk_summaries=[
+                    self.chunk_summaries[i] for i in sorted(self.chunk_summaries)
+                ],
+                chunks_done=done,
+                use_cases_found=sum(len(u) for u in self.chunk_results.values()),
+                eta_seconds=round(elapsed / run_here * remaining, 1),
+            )
+
+
+class JobManager:
+    """Queue extraction jobs and run them on background workers"""
+
+    def __init__(
+        self, runner: Callable[[Dict, JobProgress], Dict], max_workers: int = 1
+    ):
+        """
+        Initialize manager
+
+        Args:
+            runner: Runs one job (with its input) and returns the extraction
+                result; reports chunks through the JobProgress
+            max_workers: Jobs run at the same time
+        """
+        self.runner = runner
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="extraction-job"
+        )
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        session_id: str,
+        filename: str,
+        text: str,
+        project_context: Optional[str] = None,
+        domain: Optional[str] = None,
+    ) -> Dict:
+        """Store a job and queue it; returns the job status"""
+        job_id = str(uuid.uuid4())
+        create_extraction_job(
+            job_id, session_id, filename, text, project_context, domain
+        )
+        self._enqueue(job_id)
+        return get_extraction_job(job_id)
+
+    def resume(self) -> int:
+        """Queue jobs that an earlier process left queued or running"""
+        jobs = list_extraction_jobs(statuses=["queued", "running"], limit=-1)
+        resumed = 0
+        for job in reversed(jobs):
+            with self._lock:
+                if job["job_id"] in self._tokens:
+                    continue
+            update_extraction_job(job["job_id"], status="queued")
+            self._enqueue(job["job_id"])
+            resumed += 1
+        if resumed:
+            print(f"🔁 Resumed {resumed} extraction job(s)")
+        return resumed
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Stop a queued or running job; returns its status (None if unknown)"""
+        with self._lock:
+            job = get_extraction_job(job_id)
+            if job is None or job["status"] in FINISHED_JOB_STATES:
+                return job
+            token = self._tokens.get(job_id)
+            if token is not None:
+                token.cancel()
+            update_extraction_job(
+                job_id, status="cancelled", eta_seconds=None, finished_at=_now()
+            )
+        return get_extraction_job(job_id)
+
+    def cancel_session(self, session_id: str) -> int:
+        """Cancel every queued or running job of a session; returns how many"""
+        jobs = list_extraction_jobs(
+            session_id=session_id, statuses=["queued", "running"], limit=-1
+        )
+        for job in jobs:
+            self.cancel(job["job_id"])
+        return len(jobs)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, job_id: str):
+        token = CancelToken()
+        with self._lock:
+            self._tokens[job_id] = token
+        self._executor.submit(self._run, job_id, token)
+
+    def _run(self, job_id: str, token: CancelToken):
+        try:
+            with self._lock:
+                job = get_extraction_job(job_id, include_input=True)
+                if job is None or job["status"] in FINISHED_JOB_STATES:
+                    return
+                update_extraction_job(
+                    job_id, status="running", started_at=_now(), error=None
+                )
+
+            print(f"🧾 Extraction job {job_id} started ({job['filename']})")
+            with cancel_scope(token):
+                result = self.runner(job, JobProgress(job))
+
+            with self._lock:
+                if not token.cancelled:
+                    update_extraction_job(
+                        job_id,
+                        status="completed",
+                        result=result,
+                        use_cases_stored=result.get("stored_count"),
+                        eta_seconds=0,
+                        finished_at=_now(),
+                    )
+            print(f"✅ Extraction job {job_id} finished")
+
+        except GenerationCancelled:
+            # cancel() already recorded the status
+            print(f"🛑 Extraction job {job_id} cancelled")
+        except Exception as e:
+            traceback.print_exc()
+            update_extraction_job(
+                job_id,
+                status="failed",
+                error=str(e),
+                eta_seconds=None,
+                finished_at=_now(),
+            )
+        finally:
+            with self._lock:
+                self._tokens.pop(job_id, None)
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
@@ -0,0 +1,730 @@
+# -----------------------------------------------------------------------------
+# File: inference_server.py
+# Description: Inference server for ReqEngine - a separate process that owns
+#              the LLM and embedder and serves API workers over a local socket.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Inference Server
+One process loads the model once; any number of API workers submit
+generation and embedding jobs to it. Every connection is served on its own
+thread into one batching scheduler, so jobs from different API workers are
+generated in the same batches.
+
+Run it with:
+    python inference_server.py --address 127.0.0.1:6060
+and start the API with INFERENCE_SERVER_ADDRESS=127.0.0.1:6060.
+
+Messages are pickled, so only clients holding the server's key may connect.
+The key is INFERENCE_SERVER_AUTHKEY, or else a random one the server writes
+to a file only its owner can read (INFERENCE_SERVER_AUTHKEY_FILE).
+"""
+
+import argparse
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import (Client, Listener, answer_challenge,
+                                        deliver_challenge)
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import torch
+from transformers import (LogitsProcessorList, StoppingCriteriaList,
+                          TextStreamer)
+
+from admission_control import (DEFAULT_PRIORITY, current_priority,
+                               priority_scope)
+from cancellation import (CancelToken, GenerationCancelled, cancel_scope,
+                          current_cancel_token)
+from stopping_criteria import JsonObjectStoppingCriteria
+
+DEFAULT_ADDRESS = "127.0.0.1:6060"
+DEFAULT_AUTHKEY_FILE = os.path.join(os.path.dirname(__file__), "inference_server.key")
+DEFAULT_MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
+
+# How often a waiting client checks whether its request was cancelled
+CANCEL_POLL_S = 0.1
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Address:
+    """TCP (host, port) for "host:port", anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+class InferenceServerError(RuntimeError):
+    """
+    A job failed on the inference server, the server is unreachable, or
+    there is no usable key to connect with
+    """
+
+
+def load_authkey(
+    authkey: Optional[str], path: str = DEFAULT_AUTHKEY_FILE, create: bool = False
+) -> str:
+    """
+    Shared secret of the server: authkey if given, else the key file
+
+    Args:
+        authkey: Key from the environment (None or "" to use the file)
+        path: Key file, which must be readable by its owner only
+        create: Write a random key to a missing file (the server does)
+    """
+    if authkey:
+        return authkey
+
+    if create:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            key = secrets.token_hex(32)
+            with os.fdopen(fd, "w") as f:
+                f.write(key)
+            print(f"🔑 Wrote a new inference server key to {path}")
+            return key
+
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        raise InferenceServerError(
+            f"No inference server key: set INFERENCE_SERVER_AUTHKEY or "
+            f"start the server first so it writes {path}"
+        ) from None
+    if os.name == "posix" and mode & 0o077:
+        raise InferenceServerError(
+            f"Inference server key file {path} is readable by other users "
+            f"(chmod 600 it)"
+        )
+    with open(path) as f:
+        key = f.read().strip()
+    if not key:
+        raise InferenceServerError(f"Inference server key file {path} is empty")
+    return key
+
+
+class JsonSchemaSpec:
+    """
+    Stand-in for a JsonSchemaLogitsProcessor on the API side.
+
+    Building the token masks needs the full vocabulary, so API workers only
+    name the schema; the server builds (and keeps) the real processor.
+    """
+
+    def __init__(self, schema: Dict, opened: bool = True):
+        self.schema = schema
+        self.opened = opened
+
+    def cache_key(self):
+        """Schema and start state, for the response cache"""
+        return {"schema": self.schema, "opened": self.opened}
+
+
+# ============================================================================
+# WIRE FORMAT
+# ============================================================================
+# Generation kwargs are plain data except for stopping criteria, logits
+# processors and streamers. Those are sent as {"__remote__": kind, ...} and
+# rebuilt on the server around its own tokenizer.
+
+
+def encode_kwargs(value: Any) -> Any:
+    """Replace tokenizer-bound kwargs with specs that can cross the socket"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {k: encode_kwargs(v) for k, v in value.items()}
+    if isinstance(value, (StoppingCriteriaList, LogitsProcessorList)):
+        return {
+            "__remote__": type(value).__name__,
+            "items": [encode_kwargs(v) for v in value],
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(encode_kwargs(v) for v in value)
+    if isinstance(value, JsonObjectStoppingCriteria):
+        return {"__remote__": "json_stop", **value.cache_key()}
+    if isinstance(value, JsonSchemaSpec):
+        return {"__remote__": "json_schema", **value.cache_key()}
+    raise TypeError(f"Cannot send {type(value).__name__} to the inference server")
+
+
+def streamer_spec(streamer) -> Dict:
+    """Decode settings of a local streamer, reproduced on the server"""
+    return {
+        "__remote__": "streamer",
+        "skip_prompt": getattr(streamer, "skip_prompt", False),
+        "decode_kwargs": dict(getattr(streamer, "decode_kwargs", {})),
+    }
+
+
+class _ConnectionStreamer(TextStreamer):
+    """Sends each piece of finalized text back to the waiting client"""
+
+    def __init__(self, tokenizer, send: Callable, skip_prompt: bool, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=skip_prompt, **decode_kwargs)
+        self._send = send
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        self._send(("chunk", text, stream_end))
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+
+class InferenceServer:
+    """Serve generation and embedding jobs from one loaded model"""
+
+    def __init__(
+        self,
+        generate,
+        embedder=None,
+        tokenizer=None,
+        prefix_cache=None,
+        constrained_decoding: bool = False,
+        backend_info: Optional[Callable[[], Dict]] = None,
+    ):
+        """
+        Initialize server
+
+        Args:
+            generate: Callable with the HF text-generation pipeline signature
+                (normally a BatchingScheduler)
+            embedder: SentenceTransformer-compatible embedder
+            tokenizer: Tokenizer of the model, for stopping criteria,
+                logits processors and streamers
+            prefix_cache: PrefixCachedPipeline that clients may register
+                prompt prefixes with
+            constrained_decoding: Whether schema logits processors are applied
+            backend_info: Describes the backend for info requests
+        """
+        self.generate = generate
+        self.embedder = embedder
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        self.constrained_decoding = constrained_decoding
+        self.backend_info = backend_info or (lambda: {})
+
+        self._vocabulary = None
+        self._processors: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+        self._authkey: Optional[bytes] = None
+
+        self.connections = 0
+        self.rejected = 0
+        self.jobs = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def handle(self, message: Dict, send: Callable) -> Any:
+        """Run one request and return its result"""
+        op = message.get("op")
+        if op == "generate":
+            kwargs = self.decode_kwargs(message.get("kwargs", {}), send)
+            # The API worker's priority class orders the shared scheduler
+            with priority_scope(message.get("priority", DEFAULT_PRIORITY)):
+                return self.generate(message["inputs"], **kwargs)
+        if op == "embed":
+            result = self.embedder.encode(
+                message["sentences"],
+                convert_to_tensor=False,
+                **message.get("kwargs", {}),
+            )
+            return torch.as_tensor(result).cpu().numpy()
+        if op == "register_prefix":
+            if self.prefix_cache is not None:
+                self.prefix_cache.register_prefix(message["prefix"])
+            return self.prefix_cache is not None
+        if op == "info":
+            return self.info()
+        raise ValueError(f"Unknown inference server op '{op}'")
+
+    def decode_kwargs(self, value: Any, send: Callable) -> Any:
+        """Rebuild stopping criteria, processors and streamers from specs"""
+        if isinstance(value, dict) and "__remote__" in value:
+            kind = value["__remote__"]
+            if kind == "StoppingCriteriaList":
+                return StoppingCriteriaList(
+                    [self.decode_kwargs(v, send) for v in value["items"]]
+                )
+            if kind == "LogitsProcessorList":
+                items = [self.decode_kwargs(v, send) for v in value["items"]]
+                return LogitsProcessorList([p for p in items if p is not None])
+            if kind == "json_stop":
+                return JsonObjectStoppingCriteria(
+                    self.tokenizer,
+                    value["max_objects"],
+                    value["marker"],
+                    value.get("limit_pattern"),
+                )
+            if kind == "json_schema":
+                return self._json_processor(value["schema"], value["opened"])
+            if kind == "streamer":
+                return _ConnectionStreamer(
+                    self.tokenizer,
+                    send,
+                    skip_prompt=value["skip_prompt"],
+                    **value["decode_kwargs"],
+                )
+            raise ValueError(f"Unknown remote kwarg kind '{kind}'")
+        if isinstance(value, dict):
+            return {k: self.decode_kwargs(v, send) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.decode_kwargs(v, send) for v in value)
+        return value
+
+    def _json_processor(self, schema: Dict, opened: bool):
+        """One shared processor per schema, so its mask cache is reused and
+        equal requests still batch together"""
+        if not self.constrained_decoding:
+            return None
+
+        from constrained_decoding import TokenVocabulary, build_json_processor
+
+        key = json.dumps([schema, opened], sort_keys=True)
+        with self._lock:
+            if key not in self._processors:
+                if self._vocabulary is None:
+                    self._vocabulary = TokenVocabulary(self.tokenizer)
+                self._processors[key] = build_json_processor(
+                    schema, self._vocabulary, opened=opened
+                )
+            return self._processors[key]
+
+    def info(self) -> Dict:
+        """Backend description and server counters"""
+        stats = getattr(self.generate, "stats", None)
+        return {
+            **self.backend_info(),
+            "inference_server": {
+                "connections": self.connections,
+                "rejected": self.rejected,
+                "jobs": self.jobs,
+                "failures": self.failures,
+                "constrained_decoding": self.constrained_decoding,
+                "embedder": self.embedder is not None,
+                "batching": stats() if stats else {"enabled": False},
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def serve_forever(
+        self, address: str = DEFAULT_ADDRESS, authkey: Optional[str] = None
+    ):
+        """
+        Accept connections until close(); each is authenticated and served
+        on its own thread, so one bad or silent peer cannot stop the others
+        """
+        self.listen(address, authkey)
+        print(f"🛰️  Inference server listening on {self.address}")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._listener is None:
+                    return
+                traceback.print_exc()
+                continue
+            threading.Thread(
+                target=self._serve_connection,
+                args=(conn,),
+                name="inference-connection",
+                daemon=True,
+            ).start()
+
+    def listen(self, address: str = DEFAULT_ADDRESS, authkey: Optional[str] = None):
+        """
+        Bind the listening socket (serve_forever() calls this); without a
+        key anyone reaching the socket could run code, so one is required
+        """
+        if self._listener is None:
+            if not authkey:
+                raise ValueError("The inference server needs an authkey to listen")
+            # The key is checked per connection in _serve_connection()
+            self._authkey = authkey.encode()
+            self._listener = Listener(parse_address(address))
+
+    @property
+    def address(self) -> Address:
+        return self._listener.address if self._listener else None
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+
+    def _serve_connection(self, conn):
+        """
+        Read requests off one connection. A client has one job in flight at
+        a time; it runs on its own thread so a "cancel" message (or the
+        client going away) can stop its generation.
+        """
+        try:
+            # Same handshake as Listener(authkey=...).accept()
+            deliver_challenge(conn, self._authkey)
+            answer_challenge(conn, self._authkey)
+        except (AuthenticationError, EOFError, OSError) as e:
+            with self._lock:
+                self.rejected += 1
+            print(f"⚠️  Inference connection rejected: {e}")
+            conn.close()
+            return
+        with self._lock:
+            self.connections += 1
+
+        send_lock = threading.Lock()
+        job: Optional[Tuple[threading.Thread, CancelToken]] = None
+
+        def send(reply):
+            with send_lock:
+                conn.send(reply)
+
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                if message.get("op") == "cancel":
+                    if job is not None:
+                        job[1].cancel()
+                    continue
+
+                if job is not None:
+                    job[0].join()
+                token = CancelToken()
+                thread = threading.Thread(
+                    target=self._run_job,
+                    args=(message, token, send),
+                    name="inference-job",
+                    daemon=True,
+                )
+                job = (thread, token)
+                thread.start()
+        finally:
+            if job is not None:
+                job[1].cancel()
+                job[0].join()
+            conn.close()
+
+    def _run_job(self, message: Dict, token: CancelToken, send: Callable):
+        with self._lock:
+            self.jobs += 1
+        try:
+            with cancel_scope(token):
+                reply = ("ok", self.handle(message, send))
+        except GenerationCancelled as e:
+            reply = ("error", type(e).__name__, str(e))
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            reply = ("error", type(e).__name__, str(e))
+
+        try:
+            send(reply)
+        except (EOFError, OSError):
+            pass
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+
+class InferenceClient:
+    """
+    Pipeline- and embedder-compatible proxy for a remote inference server.
+
+    Connections are pooled, so concurrent API threads each have their own
+    request in flight and the server batches them together.
+    """
+
+    name = "remote"
+
+    def __init__(
+        self,
+        address: str,
+        authkey: str,
+        max_idle_connections: int = 16,
+    ):
+        """
+        Initialize client
+
+        Args:
+            address: "host:port" or a Unix socket path
+            authkey: Shared secret of the server
+            max_idle_connections: Open connections kept for reuse
+        """
+        if not authkey:
+            raise ValueError("An authkey is needed to connect to the inference server")
+        self.address = address
+        self.authkey = authkey.encode()
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=max_idle_connections)
+
+    # ------------------------------------------------------------------
+    # Pipeline / embedder interface
+    # ------------------------------------------------------------------
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        streamer = generate_kwargs.pop("streamer", None)
+        kwargs = encode_kwargs(generate_kwargs)
+        if streamer is not None:
+            kwargs["streamer"] = streamer_spec(streamer)
+
+        def on_chunk(text: str, stream_end: bool):
+            streamer.on_finalized_text(text, stream_end=stream_end)
+
+        inputs = text_inputs if isinstance(text_inputs, str) else list(text_inputs)
+        token = current_cancel_token()
+        if token is not None:
+            token.raise_if_cancelled()
+        return self._request(
+            {
+                "op": "generate",
+                "inputs": inputs,
+                "kwargs": kwargs,
+                "priority": current_priority(),
+            },
+            on_chunk if streamer is not None else None,
+            cancel_token=token,
+        )
+
+    def encode(self, sentences, convert_to_tensor: bool = False, **kwargs):
+        """SentenceTransformer.encode() computed on the server"""
+        if not isinstance(sentences, str):
+            sentences = list(sentences)
+        result = self._request(
+            {"op": "embed", "sentences": sentences, "kwargs": kwargs}
+        )
+        return torch.from_numpy(result) if convert_to_tensor else result
+
+    def register_prefix(self, prefix: str) -> bool:
+        """Ask the server to prefill a static prompt prefix"""
+        return self._request({"op": "register_prefix", "prefix": prefix})
+
+    def info(self) -> Dict:
+        """Describe the remote backend"""
+        return {**self._request({"op": "info"}), "address": self.address}
+
+    def wait_until_ready(self, timeout: float = 600.0, interval: float = 1.0) -> Dict:
+        """
+        Poll until the server accepts connections (it only listens once the
+        model is loaded)
+
+        Returns:
+            Server info
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.info()
+            except InferenceServerError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(interval)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        try:
+            return Client(parse_address(self.address), authkey=self.authkey)
+        except (OSError, EOFError) as e:
+            raise InferenceServerError(
+                f"Cannot reach inference server at {self.address}: {e}"
+            ) from e
+
+    def _request(
+        self,
+        message: Dict,
+        on_chunk: Optional[Callable] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> Any:
+        # A pooled connection may have been closed by a server restart; the
+        # request has not reached the server then, so it is resent once
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+
+        try:
+            conn.send(message)
+        except (OSError, EOFError) as e:
+            conn.close()
+            if not reused:
+                raise InferenceServerError(f"Inference server connection lost: {e}")
+            conn = self._connect()
+            conn.send(message)
+
+        cancel_sent = cancel_token is None
+        try:
+            while True:
+                if not cancel_sent:
+                    cancel_sent = self._wait_for_reply(conn, cancel_token)
+                reply = conn.recv()
+                if reply[0] == "chunk":
+                    if on_chunk is not None:
+                        on_chunk(reply[1], reply[2])
+                    continue
+                break
+        except (OSError, EOFError) as e:
+            conn.close()
+            raise InferenceServerError(f"Inference server connection lost: {e}")
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+        if reply[0] == "error":
+            if reply[1] == GenerationCancelled.__name__:
+                raise GenerationCancelled(reply[2])
+            raise InferenceServerError(f"{reply[1]}: {reply[2]}")
+        return reply[1]
+
+    @staticmethod
+    def _wait_for_reply(conn, cancel_token: CancelToken) -> bool:
+        """
+        Wait until the server sends something; if the request is cancelled
+        first, tell the server and return True. The server still replies,
+        so the connection stays usable.
+        """
+        while not conn.poll(CANCEL_POLL_S):
+            if cancel_token.cancelled:
+                conn.send({"op": "cancel"})
+                return True
+        return False
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+
+def build_server(model_name: str = DEFAULT_MODEL_NAME) -> InferenceServer:
+    """Load tokenizer, backend, prefix cache, scheduler and embedder from env"""
+    from admission_control import priority_rank
+    from batching_scheduler import BatchingScheduler
+    from llm_backends import (HFPipelineBackend, MockEmbedder, MockTokenizer,
+                              create_backend)
+    from prefix_cache import PrefixCachedPipeline
+
+    backend_name = os.getenv("LLM_BACKEND", "hf")
+    token = os.getenv("HF_TOKEN")
+
+    if backend_name == "mock":
+        tokenizer = MockTokenizer()
+    else:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name, token=token)
+
+    # Decoder-only models must be left-padded for batched generation
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+    backend = create_backend(
+        backend_name,
+        model_name,
+        tokenizer,
+        token=token,
+        model_path=os.getenv("LLAMA_CPP_MODEL_PATH"),
+        n_ctx=int(os.getenv("LLAMA_CPP_CTX", "8192")),
+        n_threads=(
+            int(os.getenv("LLAMA_CPP_THREADS"))
+            if os.getenv("LLAMA_CPP_THREADS")
+            else None
+        ),
+    )
+    is_hf = isinstance(backend, HFPipelineBackend)
+
+    generator = backend
+    prefix_cache = None
+    if os.getenv("LLM_PREFIX_CACHE", "1") == "1" and is_hf:
+        prefix_cache = PrefixCachedPipeline(backend)
+        generator = prefix_cache
+
+    scheduler = BatchingScheduler(
+        generator,
+        max_batch_size=int(os.getenv("LLM_MAX_BATCH_SIZE", "4")),
+        max_wait_ms=float(os.getenv("LLM_MAX_WAIT_MS", "20")),
+        priority=priority_rank,
+        cancel_token=current_cancel_token,
+    )
+
+    if backend_name == "mock":
+        embedder = MockEmbedder()
+    else:
+        from model_registry import registry
+
+        embedder = registry.get("embedder")
+
+    constrained = os.getenv("LLM_CONSTRAINED_DECODING", "1") == "1" and is_hf
+    print(f"✅ Model loaded successfully ({backend.info()})")
+    return InferenceServer(
+        scheduler,
+        embedder=embedder,
+        tokenizer=tokenizer,
+        prefix_cache=prefix_cache,
+        constrained_decoding=constrained,
+        backend_info=backend.info,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReqEngine inference server")
+    parser.add_argument(
+        "--address",
+        default=os.getenv("INFERENCE_SERVER_ADDRESS") or DEFAULT_ADDRESS,
+        help='"host:port" or a Unix socket path',
+    )
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="HF model id")
+    args = parser.parse_args()
+
+    # Refuse to start without a key rather than accept any client
+    authkey = load_authkey(
+        os.getenv("INFERENCE_SERVER_AUTHKEY"),
+        os.getenv("INFERENCE_SERVER_AUTHKEY_FILE") or DEFAULT_AUTHKEY_FILE,
+        create=True,
+    )
+    server = build_server(args.model)
+    try:
+        server.serve_forever(args.address, authkey)
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
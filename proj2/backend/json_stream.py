@@ -0,0 +1,152 @@
+# -----------------------------------------------------------------------------
+# File: json_stream.py
+# Description: Incremental JSON parsing for ReqEngine - pulls complete use
+#              case objects out of a JSON array while it is still streaming.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Incremental JSON Array Parser
+Emits each top-level object of a streamed JSON array as soon as its
+closing brace arrives
+"""
+
+import json
+import re
+from typing import List, Optional, Tuple
+
+
+def loads_lenient(json_str: str):
+    """Parse a JSON fragment, repairing the usual LLM slips on failure"""
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        repaired = re.sub(r",(\s*[}\]])", r"\1", json_str)
+        repaired = repaired.replace("None", "null")
+        repaired = repaired.replace("True", "true").replace("False", "false")
+        return json.loads(repaired)
+
+
+class JsonArrayStreamParser:
+    """Track JSON structure character by character across text chunks"""
+
+    def __init__(self, array_opened: bool = False):
+        """
+        Initialize parser
+
+        Args:
+            array_opened: True when the opening "[" was part of the prompt
+                (extraction prompts end with "[" so the model continues the array)
+        """
+        self.depth = 1 if array_opened else 0
+        self.array_opened = array_opened
+        self.array_closed = False
+        self.in_string = False
+        self.escape = False
+        self.objects_closed = 0
+        self.errors: List[str] = []
+
+        self._object_chars: List[str] = []
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Consume a chunk of generated text
+
+        Args:
+            text: Newly generated text
+
+        Returns:
+            List of objects completed within this chunk
+        """
+        completed = []
+
+        for ch in text:
+            if self.array_closed:
+                break
+
+            if self.depth >= 2:
+                self._object_chars.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                if self.depth == 0:
+                    # Anything before the outer array is preamble
+                    if ch == "[":
+                        self.array_opened = True
+                        self.depth = 1
+                    continue
+                if self.depth == 1 and ch == "{":
+                    self._object_chars = [ch]
+                self.depth += 1
+            elif ch in "]}":
+                if self.depth == 0:
+                    continue
+                self.depth -= 1
+                if self.depth == 1 and ch == "}":
+                    obj = self._finish_object()
+                    if obj is not None:
+                        completed.append(obj)
+                elif self.depth == 0 and self.array_opened:
+                    self.array_closed = True
+
+        return completed
+
+    def _finish_object(self) -> Optional[dict]:
+        raw = "".join(self._object_chars)
+        self._object_chars = []
+        self.objects_closed += 1
+
+        try:
+            obj = loads_lenient(raw)
+        except json.JSONDecodeError as e:
+            self.errors.append(f"object {self.objects_closed}: {e}")
+            return None
+
+        return obj if isinstance(obj, dict) else None
+
+
+def count_closed_objects(text: str, array_opened: bool = False) -> Tuple[int, bool]:
+    """
+    Count complete top-level objects in a (possibly partial) JSON array
+
+    Returns:
+        (objects_closed, array_closed)
+    """
+    parser = JsonArrayStreamParser(array_opened=array_opened)
+    parser.feed(text)
+    return parser.objects_closed, parser.array_closed
+
+
+def close_json_array(text: str) -> str:
+    """
+    Cut a partial JSON array after its last complete object and close it,
+    so output stopped mid-array still parses. Closed arrays are returned as-is.
+    """
+    parser = JsonArrayStreamParser()
+    closed = parser.objects_closed
+    end = None
+
+    for i, ch in enumerate(text):
+        parser.feed(ch)
+        if parser.array_closed:
+            return text
+        if parser.objects_closed != closed:
+            closed = parser.objects_closed
+            end = i + 1
+
+    if end is None:
+        return text
+    return text[:end] + "]"
@@ -0,0 +1,791 @@
+# -----------------------------------------------------------------------------
+# File: llm_backends.py
+# Description: Pluggable LLM backends for ReqEngine - HF transformers pipeline
+#              on GPU/CPU or a quantized GGUF model through llama.cpp on CPU.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+LLM Backends
+Every backend is called like the HF text-generation pipeline:
+backend(prompt_or_prompts, **generate_kwargs) -> [{"generated_text": ...}]
+so batching, prefix caching and extraction code work with any of them
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import torch
+
+# Make llama.cpp import optional - only needed for LLM_BACKEND=llamacpp
+try:
+    from llama_cpp import Llama
+
+    LLAMA_CPP_AVAILABLE = True
+except ImportError:
+    LLAMA_CPP_AVAILABLE = False
+
+BACKEND_NAMES = ("hf", "llamacpp", "mock")
+
+
+def cancel_check(prompt: str, generate_kwargs: Dict):
+    """
+    Callable telling whether the request behind a prompt was cancelled, for
+    backends that decode text one prompt at a time (checked every token)
+    """
+    criteria = [
+        c
+        for c in generate_kwargs.get("stopping_criteria") or []
+        if hasattr(c, "prompt_cancelled")
+    ]
+    return lambda: any(c.prompt_cancelled(prompt) for c in criteria)
+
+
+class HFPipelineBackend:
+    """HF transformers text-generation pipeline (4-bit on CUDA, fp32 on CPU)"""
+
+    name = "hf"
+
+    def __init__(self, pipe):
+        """
+        Initialize backend
+
+        Args:
+            pipe: HF text-generation pipeline
+        """
+        self.pipe = pipe
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        from constrained_decoding import bind_logits_processors
+
+        return self.pipe(text_inputs, **bind_logits_processors(generate_kwargs))
+
+    def __getattr__(self, name):
+        # model/tokenizer stay reachable for the prefix cache
+        if name == "pipe":
+            raise AttributeError(name)
+        return getattr(self.pipe, name)
+
+    def info(self) -> Dict:
+        """Describe the loaded backend"""
+        return {
+            "backend": self.name,
+            "device": str(self.pipe.model.device),
+            "dtype": str(self.pipe.model.dtype),
+        }
+
+
+class LlamaCppBackend:
+    """
+    Quantized GGUF model served by llama.cpp on CPU.
+
+    The HF tokenizer of the same model is kept for token counting and
+    stopping criteria; llama.cpp tokenizes prompts itself and reuses the KV
+    cache for the prompt prefix shared with the previous call.
+    """
+
+    name = "llamacpp"
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        tokenizer=None,
+        n_ctx: int = 8192,
+        n_threads: Optional[int] = None,
+        n_batch: int = 512,
+        llm=None,
+    ):
+        """
+        Initialize backend
+
+        Args:
+            model_path: Path to the .gguf model file
+            tokenizer: HF tokenizer of the same model
+            n_ctx: Context window in tokens
+            n_threads: CPU threads (default: llama.cpp picks)
+            n_batch: Prompt tokens evaluated per forward pass
+            llm: Already constructed llama_cpp.Llama instance
+        """
+        if llm is None:
+            if not LLAMA_CPP_AVAILABLE:
+                raise ImportError(
+                    "llama-cpp-python is required for LLM_BACKEND=llamacpp "
+                    "(pip install llama-cpp-python)"
+                )
+            if not model_path or not os.path.exists(model_path):
+                raise FileNotFoundError(f"GGUF model not found: {model_path}")
+            llm = Llama(
+                model_path=model_path,
+                n_ctx=n_ctx,
+                n_threads=n_threads,
+                n_batch=n_batch,
+                verbose=False,
+            )
+
+        self.llm = llm
+        self.tokenizer = tokenizer
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        if isinstance(text_inputs, str):
+            return [self._generate(text_inputs, generate_kwargs)]
+        # llama.cpp decodes one sequence at a time
+        return [[self._generate(p, generate_kwargs)] for p in text_inputs]
+
+    def info(self) -> Dict:
+        """Describe the loaded backend"""
+        return {
+            "backend": self.name,
+            "device": "cpu",
+            "model_path": self.model_path,
+            "n_ctx": self.n_ctx,
+            "n_threads": self.n_threads,
+        }
+
+    def completion_params(self, generate_kwargs: Dict) -> Dict:
+        """Translate HF generate kwargs into llama.cpp completion params"""
+        params = {
+            "max_tokens": generate_kwargs.get("max_new_tokens", 256),
+            "repeat_penalty": generate_kwargs.get("repetition_penalty", 1.0),
+            "top_k": generate_kwargs.get("top_k", 50),
+            # HF has no min_p by default
+            "min_p": 0.0,
+        }
+
+        if generate_kwargs.get("do_sample", False):
+            params["temperature"] = generate_kwargs.get("temperature", 1.0)
+            params["top_p"] = generate_kwargs.get("top_p", 1.0)
+        else:
+            params["temperature"] = 0.0
+            params["top_p"] = 1.0
+
+        return params
+
+    def _generate(self, prompt: str, generate_kwargs: Dict) -> Dict:
+        params = self.completion_params(generate_kwargs)
+        streamer = generate_kwargs.get("streamer")
+        # Only text-based criteria can be checked without HF token ids
+        criteria = [
+            c
+            for c in generate_kwargs.get("stopping_criteria") or []
+            if hasattr(c, "text_done")
+        ]
+        cancelled = cancel_check(prompt, generate_kwargs)
+
+        # Prompts already carry <|begin_of_text|>, so no extra BOS
+        prompt_tokens = self.llm.tokenize(
+            prompt.encode("utf-8"), add_bos=False, special=True
+        )
+
+        pieces = []
+        try:
+            for chunk in self.llm.create_completion(
+                prompt_tokens, stream=True, **params
+            ):
+                if cancelled():
+                    break
+                piece = chunk["choices"][0]["text"]
+                pieces.append(piece)
+                if streamer is not None:
+                    streamer.on_finalized_text(piece)
+                if criteria and ("}" in piece or "]" in piece):
+                    text = prompt + "".join(pieces)
+                    if any(c.text_done(text) for c in criteria):
+                        break
+        finally:
+            if streamer is not None:
+                streamer.on_finalized_text("", stream_end=True)
+
+        text = "".join(pieces)
+        if generate_kwargs.get("return_full_text", True):
+            text = prompt + text
+        return {"generated_text": text}
+
+
+# ============================================================================
+# MOCK BACKEND - deterministic stand-in for load testing
+# ============================================================================
+
+MOCK_TOKEN_PATTERN = re.compile(r"\s*\w+|\s*[^\w\s]|\s+")
+# Token IDs of the mock tokenizer (about the size of a Llama 3 vocabulary)
+MOCK_VOCAB_SIZE = 2**17
+MOCK_MODAL_PATTERN = re.compile(
+    r"^(?:can|should|must|will|may|shall|is able to|are able to|needs? to|wants? to)\s+",
+    re.IGNORECASE,
+)
+
+
+class MockTokenizer:
+    """
+    Regex word-piece tokenizer with the small part of the HF tokenizer
+    interface the app uses, so the mock backend needs no model download.
+
+    Pieces are hashed into a fixed range of IDs (like MockEmbedder's
+    features), so memory does not grow with the input; decode() returns the
+    piece last encoded under an ID.
+    """
+
+    eos_token = "<|eot_id|>"
+    pad_token = "<|eot_id|>"
+    eos_token_id = 0
+    pad_token_id = 0
+
+    def __init__(self, vocab_size: int = MOCK_VOCAB_SIZE):
+        self.padding_side = "left"
+        self.vocab_size = vocab_size
+        self._pieces: Dict[int, str] = {self.eos_token_id: self.eos_token}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.vocab_size
+
+    def tokenize(self, text: str) -> List[str]:
+        """Split text into word-sized pieces (whitespace kept)"""
+        return MOCK_TOKEN_PATTERN.findall(text)
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        ids = []
+        with self._lock:
+            for piece in self.tokenize(text):
+                # ID 0 is the end-of-text token
+                token_id = 1 + zlib.crc32(piece.encode("utf-8")) % (self.vocab_size - 1)
+                self._pieces[token_id] = piece
+                ids.append(token_id)
+        return ids
+
+    def decode(self, ids, skip_special_tokens: bool = False) -> str:
+        ids = ids.tolist() if hasattr(ids, "tolist") else ids
+        if skip_special_tokens:
+            ids = [i for i in ids if i != self.eos_token_id]
+        return "".join(self._pieces.get(i, "") for i in ids)
+
+
+class MockBackend:
+    """
+    Deterministic LLM stand-in for load testing the full API.
+
+    Extraction prompts get schema-valid use case JSON built from the
+    sentences of the requirements text, refinement prompts get the use case
+    back and other prompts get short plain text. Latency is simulated as a
+    fixed prefill cost per call plus a cost per generated token, and calls
+    fail at random with the configured rate.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        tokenizer=None,
+        prefill_ms: float = 0.0,
+        token_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Initialize backend
+
+        Args:
+            tokenizer: Tokenizer used to count generated tokens
+            prefill_ms: Simulated prompt processing time per call
+            token_ms: Simulated decoding time per generated token
+            failure_rate: Probability (0-1) that a call raises RuntimeError
+            seed: Seed for the failure draws
+        """
+        self.tokenizer = tokenizer or MockTokenizer()
+        self.prefill_ms = prefill_ms
+        self.token_ms = token_ms
+        self.failure_rate = failure_rate
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls, tokenizer=None) -> "MockBackend":
+        """Build from MOCK_LLM_* environment variables"""
+        return cls(
+            tokenizer,
+            prefill_ms=float(os.getenv("MOCK_LLM_PREFILL_MS", "0")),
+            token_ms=float(os.getenv("MOCK_LLM_TOKEN_MS", "0")),
+            failure_rate=float(os.getenv("MOCK_LLM_FAILURE_RATE", "0")),
+            seed=int(os.getenv("MOCK_LLM_SEED", "0")),
+        )
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        self._maybe_fail()
+
+        if isinstance(text_inputs, str):
+            return [self._generate(text_inputs, generate_kwargs)]
+
+        # A batch shares one prefill and decodes in lockstep
+        completions = [
+            (
+                []
+                if cancel_check(p, generate_kwargs)()
+                else self._completion_pieces(p, generate_kwargs)
+            )
+            for p in text_inputs
+        ]
+        longest = max((len(pieces) for pieces in completions), default=0)
+        self._sleep(self.prefill_ms + self.token_ms * longest)
+
+        outputs = []
+        for prompt, pieces in zip(text_inputs, completions):
+            text = "".join(pieces)
+            if generate_kwargs.get("return_full_text", True):
+                text = prompt + text
+            outputs.append([{"generated_text": text}])
+        return outputs
+
+    def info(self) -> Dict:
+        """Describe the backend and its simulated load"""
+        return {
+            "backend": self.name,
+            "device": "none",
+            "prefill_ms": self.prefill_ms,
+            "token_ms": self.token_ms,
+            "failure_rate": self.failure_rate,
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+    def respond(self, prompt: str) -> str:
+        """Full deterministic completion for a prompt"""
+        if prompt.rstrip().endswith("["):
+            return self._extraction_response(prompt)
+        if prompt.rstrip().endswith("{"):
+            return self._refinement_response(prompt)
+        return self._text_response(prompt)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if failed:
+            raise RuntimeError("Mock LLM failure (MOCK_LLM_FAILURE_RATE)")
+
+    def _sleep(self, ms: float):
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def _completion_pieces(self, prompt: str, generate_kwargs: Dict) -> List[str]:
+        """Tokenized completion, cut by max_new_tokens and stopping criteria"""
+        pieces = self.tokenizer.tokenize(self.respond(prompt))
+        pieces = pieces[: generate_kwargs.get("max_new_tokens", len(pieces))]
+
+        criteria = [
+            c
+            for c in generate_kwargs.get("stopping_criteria") or []
+            if hasattr(c, "text_done")
+        ]
+        if not criteria:
+            return pieces
+
+        text = prompt
+        for i, piece in enumerate(pieces):
+            text += piece
+            if ("}" in piece or "]" in piece) and any(
+                c.text_done(text) for c in criteria
+            ):
+                return pieces[: i + 1]
+        return pieces
+
+    def _generate(self, prompt: str, generate_kwargs: Dict) -> Dict:
+        pieces = self._completion_pieces(prompt, generate_kwargs)
+        streamer = generate_kwargs.get("streamer")
+        cancelled = cancel_check(prompt, generate_kwargs)
+
+        self._sleep(self.prefill_ms)
+        emitted = []
+        try:
+            for piece in pieces:
+                if cancelled():
+                    break
+                self._sleep(self.token_ms)
+                emitted.append(piece)
+                if streamer is not None:
+                    streamer.on_finalized_text(piece)
+        finally:
+            if streamer is not None:
+                streamer.on_finalized_text("", stream_end=True)
+
+        text = "".join(emitted)
+        if generate_kwargs.get("return_full_text", True):
+            text = prompt + text
+        return {"generated_text": text}
+
+    @staticmethod
+    def _user_block(prompt: str) -> str:
+        """Text of the last user turn in a Llama 3 chat prompt"""
+        header = "<|start_header_id|>user<|end_header_id|>"
+        start = prompt.rfind(header)
+        block = prompt[start + len(header) :] if start != -1 else prompt
+        block = block.split("<|eot_id|>", 1)[0]
+        return re.sub(r"<\|[a-z_]+\|>", "", block).strip()
+
+    def _extraction_response(self, prompt: str) -> str:
+        block = self._user_block(prompt)
+        # Batch branches carry the requirements in an earlier user turn
+        match = re.search(
+            r"Requirements:\s*(.*?)(?:<\|eot_id\|>|\n\s*\n\s*Extract|$)", prompt, re.S
+        )
+        requirements = match.group(1) if match else block
+
+        count = re.search(r"(?:approximately|exactly)\s+(\d+)", block)
+        limit = int(count.group(1)) if count else None
+        # "Extract use cases 4 to 6 ..." skips the ranges other branches take
+        span = re.search(r"use cases (\d+)(?: to (\d+))?", block)
+        offset = int(span.group(1)) - 1 if span else 0
+        if span:
+            limit = int(span.group(2) or span.group(1)) - offset
+
+        use_cases = []
+        seen_titles = set()
+        for sentence in re.split(r"(?<=[.!?])\s+|\n+", requirements):
+            for use_case in mock_use_cases(sentence):
+                if limit is not None and len(use_cases) >= offset + limit:
+                    break
+                if use_case["title"].lower() not in seen_titles:
+                    seen_titles.add(use_case["title"].lower())
+                    use_cases.append(use_case)
+        use_cases = use_cases[offset:]
+
+        if not use_cases:
+            use_cases.extend(
+                mock_use_cases("Users can complete their tasks in the system")
+            )
+
+        body = ",\n".join(
+            "  " + json.dumps(uc, indent=2).replace("\n", "\n  ") for uc in use_cases
+        )
+        return f"\n{body}\n]"
+
+    def _refinement_response(self, prompt: str) -> str:
+        match = re.search(r"Current use case:\s*(\{.*\})\s*Task:", prompt, re.S)
+        try:
+            use_case = json.loads(match.group(1)) if match else {}
+        except json.JSONDecodeError:
+            use_case = {}
+
+        steps = list(use_case.get("main_flow", []))
+        steps.append("System records the outcome for auditing")
+        use_case["main_flow"] = steps
+        # The prompt already opened the object
+        return json.dumps(use_case, indent=2)[1:]
+
+    def _text_response(self, prompt: str) -> str:
+        block = self._user_block(prompt)
+        if "descriptive title" in block.lower():
+            text = re.sub(r"Requirements text:|Generate a short.*", "", block)
+            words = re.findall(r"[A-Za-z]{4,}", text)[:5]
+            return " ".join(w.capitalize() for w in words) or "Requirements Session"
+
+        question = re.search(r"Question:\s*(.+)", block)
+        topic = question.group(1).strip() if question else block[:80]
+        return f"Based on the documented use cases, {topic.rstrip('?')} is covered by the main flows above."
+
+
+def _third_person(verb: str) -> str:
+    if verb.endswith(("s", "sh", "ch", "x", "z")):
+        return verb + "es"
+    if verb.endswith("y") and verb[-2:-1] not in "aeiou":
+        return verb[:-1] + "ies"
+    return verb + "s"
+
+
+def mock_use_cases(sentence: str) -> List[Dict]:
+    """
+    Build schema-valid use cases from one requirements sentence, one per
+    comma-separated action ("Users can register, log in, and reset ...")
+    """
+    words = sentence.strip().rstrip(".!?").split()
+    if len(words) < 3:
+        return []
+
+    actor = words[0].strip(",").capitalize()
+    if actor.endswith("s") and not actor.endswith("ss"):
+        actor = actor[:-1]
+    if actor.lower() in ("the", "a", "an", "it", "this", "there"):
+        actor = "User"
+    actor_lower = actor.lower()
+
+    actions = MOCK_MODAL_PATTERN.sub("", " ".join(words[1:]))
+    use_cases = []
+    for action in re.split(r",\s*(?:and\s+|or\s+)?", actions):
+        action_words = action.strip().split()
+        if not action_words:
+            continue
+
+        goal = " ".join(action_words[:10])
+        verb = _third_person(action_words[0].lower())
+        title = " ".join([actor, verb] + action_words[1:7])
+        if len(title) < 10:
+            title = f"{title} in the system"
+
+        use_cases.append(
+            {
+                "title": title,
+                "preconditions": [f"{actor} has access to the system"],
+                "main_flow": [
+                    f"{actor} navigates to the relevant section",
+                    f"{actor} provides the details needed to {goal}",
+                    "System validates the input",
+                    f"System completes the request and confirms to the {actor_lower}",
+                ],
+                "sub_flows": [],
+                "alternate_flows": [
+                    f"If validation fails, system shows an error to the {actor_lower}"
+                ],
+                "outcomes": [f"{actor} is able to {goal}"],
+                "stakeholders": [actor, "System"],
+            }
+        )
+
+    return use_cases
+
+
+class MockEmbedder:
+    """
+    Hashed bag-of-words embedder with the SentenceTransformer encode()
+    interface, so mock mode runs duplicate detection without downloads
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, convert_to_tensor: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        vectors = torch.zeros((len(texts), self.dim))
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                vectors[row, zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        vectors = torch.nn.functional.normalize(vectors, dim=1)
+
+        result = vectors[0] if single else vectors
+        return result if convert_to_tensor else result.numpy()
+
+
+def load_hf_backend(model_name: str, tokenizer, token: Optional[str] = None):
+    """
+    Load the HF model as a text-generation pipeline
+
+    Uses 4-bit bitsandbytes quantization on CUDA and plain fp32 on CPU,
+    where bitsandbytes is not available.
+    """
+    from transformers import AutoModelForCausalLM, pipeline
+
+    if torch.cuda.is_available():
+        from transformers import BitsAndBytesConfig
+
+        print("Loading model with 4-bit quantization...")
+        bnb_config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_use_double_quant=True,
+            bnb_4bit_compute_dtype=torch.float16,
+        )
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            quantization_config=bnb_config,
+            device_map="auto",
+            token=token,
+            torch_dtype=torch.float16,
+            low_cpu_mem_usage=True,
+        )
+    else:
+        print("Loading model on CPU (no CUDA - 4-bit quantization unavailable)...")
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            token=token,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True,
+        )
+
+    generator = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    return HFPipelineBackend(generator)
+
+
+def create_backend(
+    name: str,
+    model_name: str,
+    tokenizer,
+    token: Optional[str] = None,
+    model_path: Optional[str] = None,
+    n_ctx: int = 8192,
+    n_threads: Optional[int] = None,
+):
+    """
+    Create an LLM backend by name
+
+    Args:
+        name: "hf", "llamacpp" or "mock" (settings from MOCK_LLM_* env)
+        model_name: HF model id (weights for "hf")
+        tokenizer: HF tokenizer of the model
+        token: HF access token
+        model_path: GGUF file for "llamacpp"
+        n_ctx: llama.cpp context window
+        n_threads: llama.cpp CPU threads
+
+    Returns:
+        Pipeline-compatible backend
+    """
+    if name == "hf":
+        return load_hf_backend(model_name, tokenizer, token=token)
+    if name == "llamacpp":
+        print(f"Loading GGUF model with llama.cpp: {model_path}")
+        return LlamaCppBackend(model_path, tokenizer, n_ctx=n_ctx, n_threads=n_threads)
+    if name == "mock":
+        print("Using mock LLM backend (deterministic output, simulated latency)")
+        return MockBackend.from_env(tokenizer)
+    raise ValueError(f"Unknown LLM backend '{name}' (expected one of {BACKEND_NAMES})")
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+SAMPLE_REQUIREMENTS = [
+    "Users can register with email and password, log in, and reset a forgotten password.",
+    "Customers search the product catalog, add items to a cart and check out with a card. "
+    "Admins manage inventory and view daily sales reports.",
+    "Patients book appointments online. Doctors view their schedule and write "
+    "prescriptions. The system sends reminder emails a day before each visit.",
+]
+
+
+def build_benchmark_prompt(requirements: str) -> str:
+    """Wrap requirements text in a short Llama 3 extraction prompt"""
+    return (
+        "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n"
+        "You are a requirements analyst. Extract use cases as a JSON array of "
+        'objects with "title", "preconditions", "main_flow", "outcomes" and '
+        '"stakeholders".<|eot_id|><|start_header_id|>user<|end_header_id|>\n\n'
+        f"Requirements:\n{requirements}<|eot_id|>"
+        "<|start_header_id|>assistant<|end_header_id|>\n\n["
+    )
+
+
+def benchmark_backend(
+    backend, prompts: List[str], tokenizer=None, warmup: bool = True, **generate_kwargs
+) -> Dict:
+    """
+    Time a backend on the given prompts (one call per prompt)
+
+    Args:
+        backend: Pipeline-compatible backend
+        prompts: Full prompts to generate from
+        tokenizer: Used to count generated tokens (default: backend.tokenizer)
+        warmup: Run the first prompt once before timing
+        generate_kwargs: Generation settings, identical for every backend
+
+    Returns:
+        Latency and throughput summary
+    """
+    tokenizer = tokenizer or getattr(backend, "tokenizer", None)
+    generate_kwargs.setdefault("return_full_text", False)
+
+    if warmup and prompts:
+        backend(prompts[0], **generate_kwargs)
+
+    latencies = []
+    generated_tokens = 0
+    for prompt in prompts:
+        start = time.perf_counter()
+        output = backend(prompt, **generate_kwargs)
+        latencies.append(time.perf_counter() - start)
+
+        text = output[0]["generated_text"]
+        if tokenizer is not None:
+            generated_tokens += len(tokenizer.encode(text, add_special_tokens=False))
+
+    total = sum(latencies)
+    return {
+        "backend": getattr(backend, "name", type(backend).__name__),
+        "prompts": len(prompts),
+        "total_time_s": round(total, 3),
+        "mean_latency_s": round(statistics.mean(latencies), 3) if latencies else 0.0,
+        "max_latency_s": round(max(latencies), 3) if latencies else 0.0,
+        "generated_tokens": generated_tokens,
+        "tokens_per_second": round(generated_tokens / total, 2) if total else 0.0,
+    }
+
+
+def main():
+    """Compare backends on the same prompts: python llm_backends.py --backends hf,llamacpp"""
+    from transformers import AutoTokenizer
+
+    parser = argparse.ArgumentParser(description="Benchmark ReqEngine LLM backends")
+    parser.add_argument("--backends", default="hf,llamacpp")
+    parser.add_argument(
+        "--model-name",
+        default=os.getenv("MODEL_NAME", "meta-llama/Llama-3.2-3B-Instruct"),
+    )
+    parser.add_argument("--model-path", default=os.getenv("LLAMA_CPP_MODEL_PATH"))
+    parser.add_argument(
+        "--prompts-file", help="Text file with one requirements text per line"
+    )
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    requirements = SAMPLE_REQUIREMENTS
+    if args.prompts_file:
+        with open(args.prompts_file, "r", encoding="utf-8") as f:
+            requirements = [line.strip() for line in f if line.strip()]
+    prompts = [build_benchmark_prompt(r) for r in requirements]
+
+    token = os.getenv("HF_TOKEN")
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name, token=token)
+
+    results = []
+    for name in args.backends.split(","):
+        backend = create_backend(
+            name.strip(),
+            args.model_name,
+            tokenizer,
+            token=token,
+            model_path=args.model_path,
+            n_threads=args.threads,
+        )
+        results.append(
+            benchmark_backend(
+                backend,
+                prompts,
+                tokenizer,
+                max_new_tokens=args.max_new_tokens,
+                do_sample=False,
+            )
+        )
+        del backend
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# -----------------------------------------------------------------------------
+# File: llm_cache.py
+# Description: Persistent LLM response cache for ReqEngine - stores generated
+#              text on disk keyed by a hash of model, prompt and settings.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+LLM Response Cache
+Content-addressed, size-bounded SQLite cache in front of the text-generation
+pipeline. Least recently used entries are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def cache_repr(value: Any) -> Any:
+    """
+    JSON-serializable description of a generation kwarg.
+
+    Objects opt in by providing cache_key(); anything else (streamers,
+    arbitrary callables) raises TypeError because its effect on the output
+    cannot be described.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): cache_repr(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [type(value).__name__] + [cache_repr(v) for v in value]
+    if hasattr(value, "cache_key"):
+        return [type(value).__name__, cache_repr(value.cache_key())]
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+
+def make_cache_key(model_id: str, prompt: str, generate_kwargs: Dict) -> Optional[str]:
+    """
+    SHA-256 key for one generation, or None if the kwargs are not describable
+
+    Args:
+        model_id: Identifies the model weights (and backend) that generate
+        prompt: Full prompt text
+        generate_kwargs: Generation kwargs passed to the pipeline
+    """
+    try:
+        payload = json.dumps(
+            [model_id, prompt, cache_repr(generate_kwargs)],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+    except TypeError:
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of pipeline outputs with LRU eviction by total size"""
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Open (or create) the cache file
+
+        Args:
+            path: SQLite database file
+            max_bytes: Upper bound on the summed size of cached values
+        """
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used "
+            "ON llm_responses(last_used)"
+        )
+        self._conn.commit()
+
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value and mark it as recently used"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_responses SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        """Store a value, evicting least recently used entries to fit"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses "
+                "(key, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop oldest-used entries until the size bound holds (lock held)"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_responses ORDER BY last_used, rowid LIMIT 32"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        """Remove one entry; returns whether it was cached"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._conn.commit()
+            self._total_bytes -= row[0]
+            self.invalidations += 1
+        return True
+
+    def clear(self) -> int:
+        """Remove every entry and return how many were removed"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM llm_responses").rowcount
+            self._conn.commit()
+            self._total_bytes = 0
+        return removed
+
+    def stats(self) -> Dict:
+        """Return cache counters and size"""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM llm_responses"
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Fields added to the generated sequences of a cached call
+CACHE_KEY_FIELD = "cache_key"
+CACHED_FIELD = "cached"
+
+
+def _mark_output(output, key: str, cached: bool):
+    """Tag every generated sequence of an output with its cache key"""
+    for sequence in output if isinstance(output, list) else [output]:
+        if isinstance(sequence, dict):
+            sequence[CACHE_KEY_FIELD] = key
+            if cached:
+                sequence[CACHED_FIELD] = True
+    return output
+
+
+def _output_field(output, field: str):
+    first = output[0] if isinstance(output, list) and output else output
+    return first.get(field) if isinstance(first, dict) else None
+
+
+def is_cached_output(output) -> bool:
+    """Whether a pipeline output was replayed from the cache"""
+    return bool(_output_field(output, CACHED_FIELD))
+
+
+class CachedPipeline:
+    """
+    Text-generation callable that answers repeated prompts from the cache.
+
+    A call is cached when decoding is greedy (do_sample=False) or when the
+    caller passes cache=True; cache=False always bypasses. Streaming calls
+    bypass the cache, since the streamer has to see tokens as they are made.
+    With no cache configured the wrapper only strips the cache kwarg.
+
+    Outputs of cached calls carry their "cache_key", and replayed ones are
+    also marked "cached": True. A caller that cannot use an output (it did
+    not parse) passes it to invalidate(), so a retry generates it again.
+    """
+
+    def __init__(self, pipe, cache: Optional[ResponseCache] = None, model_id: str = ""):
+        """
+        Initialize wrapper
+
+        Args:
+            pipe: Callable with the HF text-generation pipeline signature
+            cache: Response store, or None to disable caching
+            model_id: Model identity mixed into every key
+        """
+        self.pipe = pipe
+        self.cache = cache
+        self.model_id = model_id
+
+    def __call__(self, text_inputs, cache: Optional[bool] = None, **generate_kwargs):
+        if self.cache is None or not self._should_cache(cache, generate_kwargs):
+            if self.cache is not None:
+                self.cache.bypassed += 1
+            return self.pipe(text_inputs, **generate_kwargs)
+
+        if isinstance(text_inputs, str):
+            return self._generate_many([text_inputs], generate_kwargs)[0]
+        return self._generate_many(list(text_inputs), generate_kwargs)
+
+    def __getattr__(self, name):
+        if name == "pipe":
+            raise AttributeError(name)
+        return getattr(self.pipe, name)
+
+    def stats(self) -> Dict:
+        return self.cache.stats() if self.cache else {"enabled": False}
+
+    def invalidate(self, output) -> bool:
+        """Drop the cache entry an output was stored under, if any"""
+        key = _output_field(output, CACHE_KEY_FIELD)
+        if self.cache is None or key is None:
+            return False
+        return self.cache.delete(key)
+
+    @staticmethod
+    def _should_cache(cache: Optional[bool], generate_kwargs: Dict) -> bool:
+        if cache is False or generate_kwargs.get("streamer") is not None:
+            return False
+        return cache is True or generate_kwargs.get("do_sample") is False
+
+    def _generate_many(self, prompts: List[str], generate_kwargs: Dict) -> List:
+        results = [None] * len(prompts)
+        pending: Dict[str, List[int]] = {}
+        uncacheable: List[int] = []
+
+        for i, prompt in enumerate(prompts):
+            key = make_cache_key(self.model_id, prompt, generate_kwargs)
+            if key is None:
+                self.cache.bypassed += 1
+                uncacheable.append(i)
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = _mark_output(cached, key, cached=True)
+            else:
+                pending.setdefault(key, []).append(i)
+
+        # Misses still go to the pipeline as one call so they batch together;
+        # duplicate prompts within the call are generated once
+        todo = [indices[0] for indices in pending.values()] + uncacheable
+        if todo:
+            outputs = self._call_pipe([prompts[i] for i in todo], generate_kwargs)
+            for i, output in zip(todo, outputs):
+                results[i] = output
+
+        for key, indices in pending.items():
+            output = results[indices[0]]
+            self.cache.put(key, output)
+            _mark_output(output, key, cached=False)
+            for i in indices[1:]:
+                results[i] = output
+
+        return results
+
+    def _call_pipe(self, prompts: List[str], generate_kwargs: Dict) -> List:
+        if len(prompts) == 1:
+            return [self.pipe(prompts[0], **generate_kwargs)]
+        return self.pipe(prompts, **generate_kwargs)
@@ -8,37 +8,82 @@
 # License: MIT License - see LICENSE file in the root directory.
 # -----------------------------------------------------------------------------
 
+import asyncio
+import contextvars
 import json
 import os
 import re
 import sqlite3
+import threading
 import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
 import torch
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import (Depends, FastAPI, File, Form, HTTPException, Request,
+                     UploadFile)
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer, util
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-
-from chunking_strategy import DocumentChunker
+from transformers import (AutoTokenizer, LogitsProcessorList,
+                          StoppingCriteriaList, TextIteratorStreamer)
+
+from admission_control import (AdmissionController, AdmissionRejected,
+                               parse_limits, priority_rank, priority_scope)
+from ann_index import ANNIndex
+from batching_scheduler import BatchingScheduler
+from cancellation import (CancelToken, GenerationCancelled, cancel_scope,
+                          current_cancel_token)
+from chunking_strategy import DocumentChunker, TokenCounter, estimate_tokens
+from constrained_decoding import (TokenVocabulary, array_schema,
+                                  build_json_processor)
 from db import (add_conversation_message, add_session_summary, create_session,
-                get_conversation_history, get_db_path, get_latest_summary,
-                get_session_context, get_session_title, get_session_use_cases, get_use_case_by_id,
-                init_db, migrate_db, update_session_context, update_use_case)
-from document_parser import (extract_text_from_file, get_text_stats,
-                             validate_file_size)
+                get_conversation_history, get_db_path, get_extraction_job,
+                get_latest_summary, get_project_session_ids,
+                get_session_context, get_session_title, get_session_use_cases,
+                get_use_case_by_id, get_use_case_embeddings, init_db,
+                insert_use_case, list_extraction_jobs,
+                list_use_case_embeddings, migrate_db, save_use_case_embeddings,
+                update_session_context, update_use_case, update_use_cases)
+from document_parser import (categorize_text_size, extract_text_from_file,
+                             get_text_stats, validate_file_size)
 from export_utils import export_to_docx, export_to_markdown, export_to_plantuml
+from extraction_cache import SemanticExtractionCache
+from extraction_jobs import (FINISHED_JOB_STATES, JOB_STATES, JobManager,
+                             JobProgress)
+from inference_server import (DEFAULT_AUTHKEY_FILE, InferenceClient,
+                              InferenceServerError, JsonSchemaSpec,
+                              load_authkey)
+from json_stream import (JsonArrayStreamParser, close_json_array,
+                         count_closed_objects)
+from llm_cache import CachedPipeline, ResponseCache, is_cached_output
+from llm_backends import (HFPipelineBackend, MockEmbedder, MockTokenizer,
+                          create_backend)
+from model_registry import DEFAULT_EMBEDDING_MODEL, registry
+from prefix_cache import PrefixCachedPipeline
 from rag_utils import build_memory_context
+from stopping_criteria import JsonObjectStoppingCriteria
+from token_budget import TokenBudgetModel
 from use_case_enrichment import enrich_use_case
+from use_case_index import (SessionUseCaseIndex, as_cpu_vectors,
+                            blob_to_vector, find_duplicates, use_case_text,
+                            vector_to_blob)
 from use_case_validator import UseCaseValidator
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Weights load in the background so the server accepts requests right away
+    start_model_loading()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS ---
 app.add_middleware(
@@ -89,11 +134,82 @@ class RefinementRequest(BaseModel):
     custom_instruction: Optional[str] = None
 
 
+class BulkRefinementRequest(BaseModel):
+    refinements: List[RefinementRequest]
+
+
 class QueryRequest(BaseModel):
     session_id: str
     question: str
 
 
+# ============================================================================
+# PROMPT TEMPLATES
+# ============================================================================
+# The constant system block of each extraction prompt is kept separate so its
+# KV cache can be prefilled once and reused. Prefixes end on <|end_header_id|>
+# so tokenizing prefix and remainder separately matches the full prompt.
+
+SINGLE_STAGE_PROMPT_PREFIX = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+You are a requirements analyst. Extract use cases from text and return them as JSON.
+
+CRITICAL RULES:
+1. Each action mentioned should be a SEPARATE use case
+2. DO NOT create duplicate use cases with the same title
+3. Each use case must be unique and distinct
+4. Split compound actions: "logs in and adds" → 2 separate use cases
+
+IMPORTANT: 
+- "User logs in and adds to cart" → Create 2 separate use cases:
+  1. "User logs in to system"  
+  2. "User adds items to cart"
+- DO NOT create the same use case twice
+- Each use case must have a different title
+
+Return a JSON array where EACH use case has UNIQUE title and purpose:
+[
+  {
+    "title": "User logs in to system",
+    "preconditions": ["User has valid credentials"],
+    "main_flow": ["User opens app", "User enters credentials", "System validates", "User is authenticated"],
+    "sub_flows": ["User can reset password", "User can remember device"],
+    "alternate_flows": ["If invalid: System shows error", "If locked: System requires unlock"],
+    "outcomes": ["User is logged in successfully"],
+    "stakeholders": ["User", "Authentication System"]
+  },
+  {
+    "title": "User adds items to shopping cart",
+    "preconditions": ["User is logged in", "Products are available"],
+    "main_flow": ["User browses products", "User selects product", "User clicks add to cart", "System adds item", "Cart is updated"],
+    "sub_flows": ["User can adjust quantity", "User can view cart"],
+    "alternate_flows": ["If out of stock: System notifies user", "If cart full: System prompts checkout"],
+    "outcomes": ["Item added to cart successfully"],
+    "stakeholders": ["User", "Shopping Cart System", "Inventory System"]
+  }
+]
+
+<|eot_id|><|start_header_id|>user<|end_header_id|>"""
+
+BATCH_PROMPT_PREFIX = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+You are a requirements analyst. Extract use cases from the requirements and return ONLY a JSON array in this format:
+
+[
+  {
+    "title": "Actor performs action on object",
+    "preconditions": ["Precondition 1", "Precondition 2"],
+    "main_flow": ["Step 1", "Step 2", "Step 3", "Step 4"],
+    "sub_flows": ["Optional feature 1", "Optional feature 2"],
+    "alternate_flows": ["Error case 1", "Error case 2"],
+    "outcomes": ["Success result 1", "Success result 2"],
+    "stakeholders": ["Actor", "System"]
+  }
+]
+
+<|eot_id|><|start_header_id|>user<|end_header_id|>"""
+
+
 # --- Load LLaMA 3.2 3B Instruct ---
 # Add this RIGHT BEFORE: MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
 
@@ -103,54 +219,430 @@ class QueryRequest(BaseModel):
 
 # Around line 85-113 in your main.py, wrap the model loading:
 
-if not os.getenv("TESTING"):
-    # --- Load LLaMA 3.2 3B Instruct ---
-    MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
+# Dynamic batching: concurrent prompts are merged into one padded batch
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "4"))
+LLM_MAX_WAIT_MS = float(os.getenv("LLM_MAX_WAIT_MS", "20"))
+# Prefix KV cache for the static system block of extraction prompts
+LLM_PREFIX_CACHE = os.getenv("LLM_PREFIX_CACHE", "1") == "1"
+# Generation backend: "hf" (transformers), "llamacpp" (GGUF on CPU) or "mock"
+LLM_BACKEND = os.getenv("LLM_BACKEND", "hf")
+LLAMA_CPP_MODEL_PATH = os.getenv("LLAMA_CPP_MODEL_PATH")
+LLAMA_CPP_CTX = int(os.getenv("LLAMA_CPP_CTX", "8192"))
+LLAMA_CPP_THREADS = (
+    int(os.getenv("LLAMA_CPP_THREADS")) if os.getenv("LLAMA_CPP_THREADS") else None
+)
+# How many document chunks are extracted concurrently (batched together)
+CHUNK_EXTRACTION_CONCURRENCY = int(
+    os.getenv("CHUNK_EXTRACTION_CONCURRENCY", str(LLM_MAX_BATCH_SIZE))
+)
+# Prompt size (chunk text plus prompt template and memory) per chunked extraction
+CHUNK_MAX_PROMPT_TOKENS = int(os.getenv("CHUNK_MAX_PROMPT_TOKENS", "4096"))
+# Grammar-constrained JSON decoding for extraction and refinement (hf backend)
+LLM_CONSTRAINED_DECODING = os.getenv("LLM_CONSTRAINED_DECODING", "1") == "1"
+# Disk cache of generated responses for repeated prompts
+LLM_CACHE = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), "llm_cache.db")
+)
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+# Separate inference server process that owns the model and embedder
+# (see inference_server.py); unset to load the model in this process
+INFERENCE_SERVER_ADDRESS = os.getenv("INFERENCE_SERVER_ADDRESS")
+# Shared secret; without it the key file written by the server is read
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY")
+INFERENCE_SERVER_AUTHKEY_FILE = os.getenv(
+    "INFERENCE_SERVER_AUTHKEY_FILE", DEFAULT_AUTHKEY_FILE
+)
+INFERENCE_SERVER_CONNECT_TIMEOUT = float(
+    os.getenv("INFERENCE_SERVER_CONNECT_TIMEOUT", "600")
+)
+# Admission control: per priority class "class=max_concurrent/max_queued"
+# (interactive, extraction, bulk); unlisted classes keep their defaults
+ADMISSION_LIMITS = parse_limits(os.getenv("ADMISSION_LIMITS", ""))
+ADMISSION_MAX_WAIT_S = float(os.getenv("ADMISSION_MAX_WAIT_S", "600"))
+# Threads that run extraction requests (text parsing, title and use case
+# generation) off the event loop
+LLM_REQUEST_WORKERS = int(os.getenv("LLM_REQUEST_WORKERS", "32"))
+# How often a waiting extraction request checks for a client disconnect
+DISCONNECT_POLL_S = 0.5
+# Background extraction jobs (/jobs) run at the same time
+EXTRACTION_JOB_WORKERS = int(os.getenv("EXTRACTION_JOB_WORKERS", "1"))
+# Job event stream: how often progress is checked, and keep-alive interval
+JOB_EVENTS_POLL_S = 1.0
+JOB_EVENTS_KEEPALIVE_S = 15.0
+# Token budgets fitted from recorded output lengths
+TOKEN_BUDGET_PERCENTILE = float(os.getenv("TOKEN_BUDGET_PERCENTILE", "95"))
+TOKEN_BUDGET_MIN_SAMPLES = int(os.getenv("TOKEN_BUDGET_MIN_SAMPLES", "20"))
+# Sentence embedder for duplicate detection and /query. Stored use case
+# vectors are tagged with model and version; bump EMBEDDING_VERSION to
+# re-encode them (e.g. after changing what is embedded)
+EMBEDDING_MODEL_NAME = DEFAULT_EMBEDDING_MODEL
+EMBEDDING_VERSION = os.getenv("EMBEDDING_VERSION", "1")
+# float16 halves the size of stored vectors
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+# /query: most use cases put in the prompt, and their token budget
+QUERY_TOP_K = int(os.getenv("QUERY_TOP_K", "8"))
+QUERY_CONTEXT_TOKENS = int(os.getenv("QUERY_CONTEXT_TOKENS", "1500"))
+# Least similarity for a use case to be listed as relevant to a question
+QUERY_MIN_SIMILARITY = float(os.getenv("QUERY_MIN_SIMILARITY", "0.3"))
+# ANN index of stored use case vectors across sessions (see ann_index.py),
+# and how many of its lists a search scores
+ANN_INDEX = os.getenv("ANN_INDEX", "1") == "1"
+ANN_INDEX_PATH = os.getenv(
+    "ANN_INDEX_PATH", os.path.join(os.path.dirname(__file__), "ann_index.db")
+)
+ANN_INDEX_N_PROBE = int(os.getenv("ANN_INDEX_N_PROBE", "8"))
+# New use cases are matched against other sessions of the same project
+CROSS_SESSION_THRESHOLD = float(os.getenv("CROSS_SESSION_THRESHOLD", "0.85"))
+CROSS_SESSION_LIMIT = int(os.getenv("CROSS_SESSION_LIMIT", "3"))
+# Reuse the use cases of nearly identical text instead of extracting again
+# (see extraction_cache.py); every sentence must be this similar
+EXTRACTION_CACHE = os.getenv("EXTRACTION_CACHE", "1") == "1"
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "extraction_cache.db"),
+)
+EXTRACTION_CACHE_THRESHOLD = float(os.getenv("EXTRACTION_CACHE_THRESHOLD", "0.95"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "1000"))
+
+token_budgets = TokenBudgetModel(
+    percentile=TOKEN_BUDGET_PERCENTILE, min_samples=TOKEN_BUDGET_MIN_SAMPLES
+)
+
+admission = AdmissionController(ADMISSION_LIMITS, max_wait_s=ADMISSION_MAX_WAIT_S)
+llm_executor = ThreadPoolExecutor(
+    max_workers=LLM_REQUEST_WORKERS, thread_name_prefix="llm-request"
+)
+# LLM titles of new sessions, generated after the session is created
+title_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-title")
+
+# --- Load LLaMA 3.2 3B Instruct ---
+MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
+# Seconds clients are told to wait (Retry-After) while the model is loading
+MODEL_LOAD_RETRY_AFTER = int(os.getenv("MODEL_LOAD_RETRY_AFTER", "10"))
+
+# Set by load_models() on a background thread; endpoints that generate are
+# guarded by require_models() so they never see a half-loaded model
+tokenizer = None
+model = None
+llm_backend = None
+json_processors = None
+pipe = None
+scheduler = None
+llm_cache = None
+prefix_cache = None
+embedder = None
+embedding_model_id = EMBEDDING_MODEL_NAME
+ann_index = None
+extraction_cache = None
+token_counter = None
+chunker = None
+
+model_status = {
+    "state": "not_started",
+    "error": None,
+    "started_at": None,
+    "ready_at": None,
+    "warmup_ms": None,
+}
+models_ready = threading.Event()
+
+WARMUP_PROMPT = """<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+Reply with OK.<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+"""
+
+
+def load_models():
+    """Load tokenizer, LLM backend, caches, embedder and chunker"""
+    global tokenizer, model, llm_backend, json_processors, pipe, scheduler
+    global llm_cache, prefix_cache, embedder, token_counter, chunker
+
     token = os.getenv("HF_TOKEN")
 
-    print("Loading model with 4-bit quantization...")
+    # Shared through the model registry, so other modules don't load copies
+    if LLM_BACKEND == "mock":
+        registry.register("tokenizer", MockTokenizer)
+    else:
+        registry.register(
+            "tokenizer", lambda: AutoTokenizer.from_pretrained(MODEL_NAME, token=token)
+        )
+    tokenizer = registry.get("tokenizer")
+
+    # Decoder-only models must be left-padded for batched generation
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
 
-    from transformers import BitsAndBytesConfig
+    if INFERENCE_SERVER_ADDRESS:
+        load_remote_models()
+    else:
+        load_local_models(token)
 
-    # Configure 4-bit quantization for RTX 3050
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True,
-        bnb_4bit_quant_type="nf4",
-        bnb_4bit_use_double_quant=True,
-        bnb_4bit_compute_dtype=torch.float16,
+    # Initialize document chunker, sized with the model's own tokenizer
+    token_counter = TokenCounter(tokenizer)
+    chunker = DocumentChunker(
+        max_tokens=CHUNK_MAX_PROMPT_TOKENS, length_function=token_counter
     )
 
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, token=token)
+    # Stores tied to the loaded generator and embedder
+    open_ann_index()
+    open_extraction_cache()
+
 
-    # Load model with 4-bit quantization
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_NAME,
-        quantization_config=bnb_config,
-        device_map="auto",
-        token=token,
-        torch_dtype=torch.float16,
-        low_cpu_mem_usage=True,
+def build_cached_pipeline(generator, model_id: str) -> CachedPipeline:
+    """Put the response cache (if enabled) in front of the generator"""
+    global llm_cache
+
+    llm_cache = None
+    if LLM_CACHE:
+        llm_cache = ResponseCache(
+            LLM_CACHE_PATH, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)
+        )
+    return CachedPipeline(generator, llm_cache, model_id=model_id)
+
+
+def describe_llm_cache() -> str:
+    """Response cache location and size bound, for the startup log"""
+    return f"{LLM_CACHE_PATH} ({LLM_CACHE_MAX_MB:.0f}MB)" if llm_cache else "off"
+
+
+def load_local_models(token: Optional[str]):
+    """Load the LLM backend and embedder into this process"""
+    global model, llm_backend, json_processors, pipe, scheduler
+    global prefix_cache, embedder, embedding_model_id
+
+    registry.register(
+        "generator",
+        lambda: create_backend(
+            LLM_BACKEND,
+            MODEL_NAME,
+            tokenizer,
+            token=token,
+            model_path=LLAMA_CPP_MODEL_PATH,
+            n_ctx=LLAMA_CPP_CTX,
+            n_threads=LLAMA_CPP_THREADS,
+        ),
+    )
+    generator = registry.get("generator")
+    llm_backend = generator
+    model = getattr(generator, "model", None)
+
+    # llama.cpp reuses its own KV cache for shared prompt prefixes
+    prefix_cache = None
+    if LLM_PREFIX_CACHE and isinstance(generator, HFPipelineBackend):
+        prefix_cache = PrefixCachedPipeline(generator)
+        prefix_cache.register_prefix(SINGLE_STAGE_PROMPT_PREFIX)
+        prefix_cache.register_prefix(BATCH_PROMPT_PREFIX)
+        generator = prefix_cache
+
+    # Masks are built from the schema so only valid use case JSON can be emitted
+    json_processors = None
+    if LLM_CONSTRAINED_DECODING and isinstance(llm_backend, HFPipelineBackend):
+        vocabulary = TokenVocabulary(tokenizer)
+        use_case_schema = UseCaseSchema.model_json_schema()
+        json_processors = {
+            "array": build_json_processor(array_schema(use_case_schema), vocabulary),
+            "object": build_json_processor(use_case_schema, vocabulary),
+        }
+        print(f"🔒 Constrained JSON decoding enabled ({vocabulary.size} tokens)")
+
+    # Queued prompts of interactive requests are generated first
+    scheduler = BatchingScheduler(
+        generator,
+        max_batch_size=LLM_MAX_BATCH_SIZE,
+        max_wait_ms=LLM_MAX_WAIT_MS,
+        priority=priority_rank,
+        cancel_token=current_cancel_token,
     )
 
-    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer, device_map="auto")
+    # Cache hits return before queueing; misses are batched as usual
+    pipe = build_cached_pipeline(
+        scheduler, model_id=f"{LLM_BACKEND}:{LLAMA_CPP_MODEL_PATH or MODEL_NAME}"
+    )
+
+    print(f"✅ Model loaded successfully ({llm_backend.info()})")
+    print(f"   Batching: up to {LLM_MAX_BATCH_SIZE} prompts, {LLM_MAX_WAIT_MS:.0f}ms window")
+    print(f"   Response cache: {describe_llm_cache()}")
 
-    print("✅ Model loaded successfully with 4-bit quantization!")
-    print(f"   Model size: ~1.5GB (vs 6GB unquantized)")
-    print(f"   Expected speedup: 2-3x faster\n")
+    # Embedding model for duplicate detection, /query and the vector store
+    if LLM_BACKEND == "mock":
+        registry.put("embedder", MockEmbedder())
+        embedding_model_id = "mock-embedder"
+    else:
+        embedding_model_id = EMBEDDING_MODEL_NAME
+    embedder = registry.get("embedder")
 
-    # Initialize embedding model for duplicate detection
-    embedder = SentenceTransformer("all-MiniLM-L6-v2")
 
-    # Initialize document chunker
-    chunker = DocumentChunker(max_tokens=3000)
-else:
-    print("⚠️  Testing mode: Model loading skipped")
-    MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"  # Define for tests
-    tokenizer = None
+def load_remote_models():
+    """
+    Use the inference server's model and embedder
+
+    The server batches jobs from every API worker and keeps the prefix
+    cache, so this process only keeps the tokenizer and response cache.
+    """
+    global model, llm_backend, json_processors, pipe, scheduler
+    global prefix_cache, embedder, embedding_model_id
+
+    authkey = load_authkey(INFERENCE_SERVER_AUTHKEY, INFERENCE_SERVER_AUTHKEY_FILE)
+    client = InferenceClient(INFERENCE_SERVER_ADDRESS, authkey=authkey)
+    print(f"🛰️  Waiting for inference server at {INFERENCE_SERVER_ADDRESS}...")
+    server_info = client.wait_until_ready(INFERENCE_SERVER_CONNECT_TIMEOUT)
+
+    client.register_prefix(SINGLE_STAGE_PROMPT_PREFIX)
+    client.register_prefix(BATCH_PROMPT_PREFIX)
+
+    # The server builds the real logits processors from the schema
+    json_processors = None
+    server_constrained = server_info["inference_server"]["constrained_decoding"]
+    if LLM_CONSTRAINED_DECODING and server_constrained:
+        use_case_schema = UseCaseSchema.model_json_schema()
+        json_processors = {
+            "array": JsonSchemaSpec(array_schema(use_case_schema)),
+            "object": JsonSchemaSpec(use_case_schema),
+        }
+
+    llm_backend = client
     model = None
-    pipe = None
-    embedder = None
-    chunker = None
+    prefix_cache = None
+    scheduler = None
+    embedder = client
+    registry.put("generator", client)
+    registry.put("embedder", client)
+    # Cached responses are keyed by the server's model, not this process's env
+    backend = server_info.get("backend")
+    embedding_model_id = "mock-embedder" if backend == "mock" else EMBEDDING_MODEL_NAME
+    pipe = build_cached_pipeline(
+        client, model_id=f"{backend}:{server_info.get('model_path') or MODEL_NAME}"
+    )
+
+    print(f"✅ Connected to inference server ({backend})")
+    print(f"   Response cache: {describe_llm_cache()}")
+
+
+def open_ann_index():
+    """
+    Open the ANN index for the loaded embedder and reconcile it with the
+    stored vectors (it is empty when new or after a model change, and an
+    add that failed leaves a use case out)
+    """
+    global ann_index
+
+    ann_index = None
+    if not ANN_INDEX:
+        return
+    ann_index = ANNIndex(
+        ANN_INDEX_PATH,
+        model=f"{embedding_model_id}:{EMBEDDING_VERSION}",
+        dtype=EMBEDDING_STORE_DTYPE,
+        n_probe=ANN_INDEX_N_PROBE,
+    )
+    reconcile_ann_index()
+    print(f"   ANN index: {ANN_INDEX_PATH} ({len(ann_index)} vectors)")
+
+
+def open_extraction_cache():
+    """Open the semantic extraction cache for the loaded model and embedder"""
+    global extraction_cache
+
+    extraction_cache = None
+    if not EXTRACTION_CACHE:
+        return
+    extraction_cache = SemanticExtractionCache(
+        EXTRACTION_CACHE_PATH,
+        encode=lambda texts: as_cpu_vectors(embed_texts(texts)).numpy(),
+        model=f"{pipe.model_id}|{embedding_model_id}:{EMBEDDING_VERSION}",
+        threshold=EXTRACTION_CACHE_THRESHOLD,
+        max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+    )
+    print(f"   Extraction cache: {EXTRACTION_CACHE_PATH}")
+
+
+def reconcile_ann_index(page_size: int = 1000):
+    """
+    Add stored vectors of the current embedder missing from the ANN index,
+    and drop index entries whose use case is gone
+    """
+    indexed = ann_index.ids()
+    stored = set()
+    after_id = 0
+    added = 0
+    while True:
+        rows = list_use_case_embeddings(
+            embedding_model_id, EMBEDDING_VERSION, after_id=after_id, limit=page_size
+        )
+        if not rows:
+            break
+
+        by_session: Dict[str, Dict[int, torch.Tensor]] = {}
+        for row in rows:
+            stored.add(row["use_case_id"])
+            if row["use_case_id"] in indexed:
+                continue
+            by_session.setdefault(row["session_id"], {})[row["use_case_id"]] = (
+                blob_to_vector(row["vector"], row["dtype"], row["dim"])
+            )
+        for session_id, vectors in by_session.items():
+            ann_index.add(session_id, vectors)
+            added += len(vectors)
+
+        after_id = rows[-1]["use_case_id"]
+
+    removed = ann_index.remove(indexed - stored) if indexed - stored else 0
+    if added or removed:
+        print(f"🗂️  ANN index reconciled: {added} vector(s) added, {removed} removed")
+
+
+def warmup_models():
+    """Run one short generation and embedding so first requests skip lazy init"""
+    start = time.time()
+    pipe(
+        WARMUP_PROMPT,
+        max_new_tokens=4,
+        do_sample=False,
+        return_full_text=False,
+        cache=False,
+    )
+    embedder.encode(["warmup"], convert_to_tensor=True)
+    return (time.time() - start) * 1000
+
+
+def _load_models_in_background():
+    try:
+        load_models()
+        model_status["warmup_ms"] = round(warmup_models(), 1)
+    except Exception as e:
+        traceback.print_exc()
+        model_status["state"] = "failed"
+        model_status["error"] = str(e)
+        print(f"❌ Model loading failed: {e}")
+        return
+
+    model_status["state"] = "ready"
+    model_status["ready_at"] = time.time()
+    models_ready.set()
+    load_seconds = model_status["ready_at"] - model_status["started_at"]
+    print(f"✅ Model ready in {load_seconds:.1f}s (warmup {model_status['warmup_ms']:.0f}ms)\n")
+
+    # Jobs interrupted by the last shutdown continue from their finished chunks
+    job_manager.resume()
+
+
+def start_model_loading():
+    """Start loading models on a background thread (called at app startup)"""
+    if models_ready.is_set() or model_status["state"] == "loading":
+        return
+
+    model_status["state"] = "loading"
+    model_status["started_at"] = time.time()
+    threading.Thread(
+        target=_load_models_in_background, name="model-loader", daemon=True
+    ).start()
+
+
+if os.getenv("TESTING"):
+    print("⚠️  Testing mode: Model loading skipped")
+    model_status["state"] = "skipped"
+    models_ready.set()
 
 # ============================================================================
 # SMART USE CASE ESTIMATOR - FIXED!
@@ -538,21 +1030,59 @@ def get_smart_max_use_cases(text: str) -> int:
     return smart_max
 
 
-def get_smart_token_budget(text: str, estimated_use_cases: int) -> int:
-    """Calculate appropriate token budget based on estimated use cases"""
+def get_smart_token_budget(
+    text: str, estimated_use_cases: int, prompt_type: str = "single_stage"
+) -> int:
+    """
+    Calculate appropriate token budget based on estimated use cases
 
-    base_tokens = estimated_use_cases * 120
-    overhead = 80
-    token_budget = base_tokens + overhead
-    token_budget = max(300, min(token_budget, 1200))
+    Uses the per-use-case cost fitted from recorded generations of this
+    prompt type and input size once enough history exists, otherwise the
+    fixed defaults (120 tokens per use case + 80 for single-stage)
+    """
+    size_category = categorize_text_size(len(text))
+    token_budget, source = token_budgets.budget(
+        prompt_type, size_category, estimated_use_cases
+    )
+    params, _ = token_budgets.params(prompt_type, size_category)
 
     print(
-        f"💰 Token budget: {token_budget} tokens ({estimated_use_cases} use cases × 120 + overhead)\n"
+        f"💰 Token budget: {token_budget} tokens ({estimated_use_cases} use cases × "
+        f"{params['per_use_case']:.0f} + {params['overhead']:.0f}, {source})\n"
     )
 
     return token_budget
 
 
+def discard_cached_response(output):
+    """
+    Forget an LLM response that could not be parsed, so retrying the same
+    text generates a new one instead of replaying it
+    """
+    if isinstance(pipe, CachedPipeline) and pipe.invalidate(output):
+        print("🗑️  Dropped the unusable response from the LLM cache")
+
+
+def record_generation(
+    prompt_type: str, text: str, generated_text: str, max_new_tokens: int
+):
+    """Store the real output length of a use case JSON generation"""
+    try:
+        use_cases, _ = count_closed_objects(generated_text, array_opened=True)
+        generated_tokens = len(
+            tokenizer.encode(generated_text, add_special_tokens=False)
+        )
+        token_budgets.record(
+            prompt_type,
+            categorize_text_size(len(text)),
+            use_cases,
+            generated_tokens,
+            max_new_tokens,
+        )
+    except Exception as e:
+        print(f"⚠️  Could not record generation stats: {e}")
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -631,7 +1161,169 @@ def flatten_use_case(data: dict) -> dict:
 def compute_usecase_embedding(use_case: UseCaseSchema):
     """Combine title and main_flow into embedding vector"""
     text = use_case.title + " " + " ".join(use_case.main_flow)
-    return embedder.encode(text, convert_to_tensor=True)
+    return as_cpu_vectors(embedder.encode(text, convert_to_tensor=True))
+
+
+def embed_use_cases(use_cases: List[UseCaseSchema]) -> torch.Tensor:
+    """Embed new use cases in one batch (one row each, same text as above)"""
+    if not use_cases:
+        return torch.empty(0)
+    vectors = embed_texts([use_case_text(uc.model_dump()) for uc in use_cases])
+    return as_cpu_vectors(vectors).reshape(len(use_cases), -1)
+
+
+def get_existing_embeddings(session_id: str):
+    """
+    Vectors of every stored use case of a session for duplicate detection
+
+    Vectors are read from use_case_embeddings. Use cases without a vector
+    of the current embedder (stored before, or after a model change) are
+    encoded in one batch and their vectors stored.
+    """
+    rows = get_use_case_embeddings(session_id)
+    if not rows:
+        return None
+
+    vectors = {}
+    for row in rows:
+        stored = row["embedding"]
+        if (
+            stored is not None
+            and stored["model"] == embedding_model_id
+            and stored["model_version"] == EMBEDDING_VERSION
+        ):
+            vectors[row["id"]] = blob_to_vector(
+                stored["vector"], stored["dtype"], stored["dim"]
+            )
+
+    missing = [row for row in rows if row["id"] not in vectors]
+    if missing:
+        print(f"🧮 Encoding {len(missing)} use case(s) without a stored vector")
+        vectors.update(store_use_case_embeddings(session_id, missing))
+
+    return torch.stack([vectors[row["id"]] for row in rows])
+
+
+def store_use_case_embeddings(
+    session_id: str, use_cases: List[dict], embeddings: Optional[torch.Tensor] = None
+) -> Dict[int, torch.Tensor]:
+    """
+    Store the vectors of use cases (dicts with "id") of one session; they
+    are encoded in one batch unless given (one row per use case)
+    """
+    if embeddings is None:
+        embeddings = embed_texts([use_case_text(uc) for uc in use_cases])
+    embeddings = as_cpu_vectors(embeddings).reshape(len(use_cases), -1)
+
+    vectors = {uc["id"]: embeddings[i] for i, uc in enumerate(use_cases)}
+    save_use_case_embeddings(
+        session_id,
+        {
+            use_case_id: vector_to_blob(vector, EMBEDDING_STORE_DTYPE)
+            for use_case_id, vector in vectors.items()
+        },
+        dim=embeddings.shape[1],
+        dtype=EMBEDDING_STORE_DTYPE,
+        model=embedding_model_id,
+        model_version=EMBEDDING_VERSION,
+    )
+
+    if ann_index is not None:
+        try:
+            ann_index.add(session_id, vectors)
+        except Exception as e:
+            # The index is reconciled with use_case_embeddings at startup
+            print(f"⚠️  Could not update ANN index: {e}")
+    return vectors
+
+
+def store_use_case(session_id: str, uc: UseCaseSchema, embedding) -> int:
+    """Insert a new use case together with its vector; returns its ID"""
+    use_case_id = insert_use_case(session_id, uc.model_dump())
+    store_use_case_embeddings(session_id, [{"id": use_case_id}], embedding)
+    return use_case_id
+
+
+def refresh_use_case_embeddings(use_cases: List[dict]):
+    """
+    Re-encode refined use cases (dicts with "id" and "session_id"); a
+    failure only means they are encoded again by the next duplicate check
+    """
+    by_session: Dict[str, List[dict]] = {}
+    for uc in use_cases:
+        by_session.setdefault(uc["session_id"], []).append(uc)
+    try:
+        for session_id, session_use_cases in by_session.items():
+            store_use_case_embeddings(session_id, session_use_cases)
+    except Exception as e:
+        print(f"⚠️  Could not store use case embeddings: {e}")
+
+
+def embed_texts(texts: List[str]) -> torch.Tensor:
+    """Embed several texts in one batch"""
+    return embedder.encode(texts, convert_to_tensor=True)
+
+
+# Use case vectors per session, reused by /query until a use case changes
+use_case_index = SessionUseCaseIndex(encode=embed_texts)
+
+
+def find_matches_in_project(
+    session_id: str, embeddings: torch.Tensor, threshold: float, limit: int
+) -> List[List[dict]]:
+    """
+    Per vector, the most similar use cases of other sessions of the same
+    project (empty if the session has no project or the index is off)
+    """
+    matches: List[List[dict]] = [[] for _ in range(len(embeddings))]
+    if ann_index is None or not matches:
+        return matches
+    project = (get_session_context(session_id) or {}).get("project_context")
+    if not project:
+        return matches
+
+    sessions = get_project_session_ids(project)
+    for i, vector in enumerate(embeddings):
+        hits = ann_index.search(
+            vector.numpy(),
+            threshold,
+            limit=limit,
+            session_ids=sessions,
+            exclude_session_id=session_id,
+        )
+        matches[i] = describe_ann_hits(hits)
+    return matches
+
+
+def describe_ann_hits(hits: List[Dict]) -> List[dict]:
+    """ANN index hits with the title of the use case (deleted ones dropped)"""
+    described = []
+    for hit in hits:
+        uc = get_use_case_by_id(hit["use_case_id"])
+        if uc is not None:
+            described.append(
+                {
+                    "use_case_id": hit["use_case_id"],
+                    "session_id": hit["session_id"],
+                    "title": uc["title"],
+                    "similarity": round(hit["score"], 3),
+                }
+            )
+    return described
+
+
+def lookup_extraction_cache(text: str):
+    """
+    Semantic cache lookup for extraction input (None if the cache is off or
+    failed, in which case the text is simply extracted)
+    """
+    if extraction_cache is None:
+        return None
+    try:
+        return extraction_cache.lookup(text)
+    except Exception as e:
+        print(f"⚠️  Extraction cache lookup failed: {e}")
+        return None
 
 
 def ensure_string_list(value) -> List[str]:
@@ -660,14 +1352,164 @@ def ensure_string_list(value) -> List[str]:
 # ============================================================================
 
 
+# Where a single-stage prompt states its estimate; the early stop reads it
+# per row, so chunks with different estimates still share a batch
+SINGLE_STAGE_ESTIMATE_PATTERN = r"Extract approximately (\d+) UNIQUE"
+
+
+def build_single_stage_prompt(text: str, memory_context: str, max_use_cases: int) -> str:
+    """Build the single-stage extraction prompt (static rules live in the prefix)"""
+    return f"""{SINGLE_STAGE_PROMPT_PREFIX}
+
+{memory_context}
+
+Requirements:
+{text}
+
+Extract approximately {max_use_cases} UNIQUE, DISTINCT use cases from the requirements above.
+Return them as a JSON array in the format shown, each with a different title.
+
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+["""
+
+
+def json_stopping_criteria(
+    max_objects: int, limit_pattern: Optional[str] = None
+) -> StoppingCriteriaList:
+    """
+    Stop decoding once max_objects use cases (or the whole array) are
+    complete; with limit_pattern, once the count each prompt asks for is
+    """
+    criteria = JsonObjectStoppingCriteria(
+        tokenizer, max_objects, limit_pattern=limit_pattern
+    )
+    return StoppingCriteriaList([criteria])
+
+
+def json_logits_processor(root: str) -> Optional[LogitsProcessorList]:
+    """
+    Constrain decoding to use case JSON: "array" continues an opened list of
+    use cases, "object" an opened single use case. None when disabled.
+    """
+    if json_processors is None:
+        return None
+    return LogitsProcessorList([json_processors[root]])
+
+
+def shared_prompt_prefix(prefix: str):
+    """
+    Keep the KV cache of a per-request prompt prefix while prompts forked
+    from it are generated (no-op without the HF prefix cache)
+    """
+    if prefix_cache is None:
+        return nullcontext()
+    return prefix_cache.shared_prefix(prefix)
+
+
+def build_batch_branch_prompts(
+    text: str, memory_context: str, max_use_cases: int, batch_size: int
+) -> Tuple[str, List[str]]:
+    """
+    Build one shared document prefix and a branch prompt per batch
+
+    The document ends its own user turn, so every branch prompt starts with
+    exactly the same tokens. Each branch then asks for its own range of use
+    cases (in document order) and is told which ranges the others cover.
+
+    Returns:
+        (shared_prefix, branch_prompts)
+    """
+    shared_prefix = f"""{BATCH_PROMPT_PREFIX}
+
+{memory_context}
+
+Requirements:
+{text}<|eot_id|>"""
+
+    ranges = [
+        (first, min(first + batch_size - 1, max_use_cases))
+        for first in range(1, max_use_cases + 1, batch_size)
+    ]
+
+    def describe(first: int, last: int) -> str:
+        return f"{first}" if first == last else f"{first} to {last}"
+
+    prompts = []
+    for first, last in ranges:
+        others = [describe(a, b) for a, b in ranges if (a, b) != (first, last)]
+        taken = ""
+        if others:
+            taken = (
+                f" Use cases {', '.join(others)} are already taken by other "
+                "extractors - do not repeat them."
+            )
+        prompts.append(
+            f"""{shared_prefix}<|start_header_id|>user<|end_header_id|>
+
+Extract use cases {describe(first, last)} of the {max_use_cases} in these requirements, counting in the order they appear.{taken} Return ONLY a JSON array of exactly {last - first + 1} use cases.
+
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+["""
+        )
+
+    return shared_prefix, prompts
+
+
+def structure_use_case(uc, idx: int, text: str) -> Optional[dict]:
+    """Validate, normalize and enrich one raw use case parsed from LLM output"""
+    if not isinstance(uc, dict):
+        print(f"⚠️  Skipping non-dict item {idx}")
+        return None
+
+    # Validate and structure
+    validated_uc = {
+        "title": str(uc.get("title", f"Use Case {idx}")).strip(),
+        "preconditions": ensure_string_list(uc.get("preconditions", [])),
+        "main_flow": ensure_string_list(uc.get("main_flow", [])),
+        "sub_flows": ensure_string_list(uc.get("sub_flows", [])),
+        "alternate_flows": ensure_string_list(uc.get("alternate_flows", [])),
+        "outcomes": ensure_string_list(uc.get("outcomes", [])),
+        "stakeholders": ensure_string_list(uc.get("stakeholders", [])),
+    }
+
+    # Quality check
+    title_len = len(validated_uc["title"])
+    flow_len = len(validated_uc["main_flow"])
+
+    if title_len < 10:
+        print(f"⚠️  [{idx}] Title too short: {validated_uc['title']}")
+        return None
+
+    if flow_len < 3:
+        print(f"⚠️  [{idx}] Main flow too short ({flow_len} steps)")
+        # Enrich it instead of skipping
+        validated_uc = enrich_use_case(validated_uc, text)
+
+    # Enrich to improve quality
+    validated_uc = enrich_use_case(validated_uc, text)
+
+    print(f"✅ [{idx}] {validated_uc['title'][:60]}")
+    return validated_uc
+
+
 def extract_use_cases_single_stage(
-    text: str, memory_context: str, max_use_cases: int = None
+    text: str,
+    memory_context: str,
+    max_use_cases: int = None,
+    max_new_tokens: int = None,
+    stop_after: int = None,
 ) -> List[dict]:
     """
     ROBUST SINGLE-STAGE EXTRACTION
     - Better prompting
     - Robust JSON parsing
     - Quality validation
+
+    max_new_tokens and stop_after override the per-text budget and the
+    ceiling of the early stop, so concurrent callers can share generation
+    kwargs (and a batch). Each prompt still stops at its own estimate.
     """
 
     # Smart estimation
@@ -675,61 +1517,14 @@ def extract_use_cases_single_stage(
         max_use_cases = get_smart_max_use_cases(text)
 
     # Dynamic token budget
-    max_new_tokens = get_smart_token_budget(text, max_use_cases)
+    if max_new_tokens is None:
+        max_new_tokens = get_smart_token_budget(text, max_use_cases)
+    if stop_after is None:
+        stop_after = max_use_cases
 
     # ✅ IMPROVED PROMPT - Clearer, more explicit
-    prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
-
-You are a requirements analyst. Extract use cases from text and return them as JSON.
-
-CRITICAL RULES:
-1. Each action mentioned should be a SEPARATE use case
-2. DO NOT create duplicate use cases with the same title
-3. Each use case must be unique and distinct
-4. Split compound actions: "logs in and adds" → 2 separate use cases
-
-
-<|eot_id|><|start_header_id|>user<|end_header_id|>
-
-{memory_context}
-
-Requirements:
-{text}
-
-Extract approximately {max_use_cases} UNIQUE, DISTINCT use cases from the requirements above.
-
-IMPORTANT: 
-- "User logs in and adds to cart" → Create 2 separate use cases:
-  1. "User logs in to system"  
-  2. "User adds items to cart"
-- DO NOT create the same use case twice
-- Each use case must have a different title
-
-Return a JSON array where EACH use case has UNIQUE title and purpose:
-[
-  {{
-    "title": "User logs in to system",
-    "preconditions": ["User has valid credentials"],
-    "main_flow": ["User opens app", "User enters credentials", "System validates", "User is authenticated"],
-    "sub_flows": ["User can reset password", "User can remember device"],
-    "alternate_flows": ["If invalid: System shows error", "If locked: System requires unlock"],
-    "outcomes": ["User is logged in successfully"],
-    "stakeholders": ["User", "Authentication System"]
-  }},
-  {{
-    "title": "User adds items to shopping cart",
-    "preconditions": ["User is logged in", "Products are available"],
-    "main_flow": ["User browses products", "User selects product", "User clicks add to cart", "System adds item", "Cart is updated"],
-    "sub_flows": ["User can adjust quantity", "User can view cart"],
-    "alternate_flows": ["If out of stock: System notifies user", "If cart full: System prompts checkout"],
-    "outcomes": ["Item added to cart successfully"],
-    "stakeholders": ["User", "Shopping Cart System", "Inventory System"]
-  }}
-]
-
-<|eot_id|><|start_header_id|>assistant<|end_header_id|>
-
-["""
+    prompt = build_single_stage_prompt(text, memory_context, max_use_cases)
+    outputs = None
 
     try:
         print(f"🚀 ROBUST SINGLE-STAGE EXTRACTION")
@@ -750,9 +1545,22 @@ Return a JSON array where EACH use case has UNIQUE title and purpose:
             return_full_text=False,
             eos_token_id=tokenizer.eos_token_id,
             pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=json_stopping_criteria(
+                stop_after, SINGLE_STAGE_ESTIMATE_PATTERN
+            ),
+            logits_processor=json_logits_processor("array"),
+            # Same text, same use cases: reuse the stored response on resubmits
+            cache=True,
         )
 
-        response = "[" + outputs[0]["generated_text"].strip()
+        # Replayed responses were not generated; they would skew the fit
+        if not is_cached_output(outputs):
+            record_generation(
+                "single_stage", text, outputs[0]["generated_text"], max_new_tokens
+            )
+
+        # Early stopping leaves the array open after the last object
+        response = close_json_array("[" + outputs[0]["generated_text"].strip())
 
         elapsed = time.time() - start_time
         print(f"⏱️  Generation time: {elapsed:.1f}s\n")
@@ -767,13 +1575,15 @@ Return a JSON array where EACH use case has UNIQUE title and purpose:
 
         if start_idx == -1 or end_idx == -1:
             print("⚠️  No JSON array found, using fallback\n")
+            discard_cached_response(outputs)
             return extract_with_smart_fallback(text)
 
         json_str = response[start_idx : end_idx + 1]
 
-        # ✅ ROBUST CLEANING
-        print("🔧 Cleaning JSON...")
-        json_str = clean_llm_json(json_str)
+        # ✅ ROBUST CLEANING (constrained output is valid JSON already)
+        if json_processors is None:
+            print("🔧 Cleaning JSON...")
+            json_str = clean_llm_json(json_str)
 
         # Attempt to parse
         try:
@@ -781,6 +1591,7 @@ Return a JSON array where EACH use case has UNIQUE title and purpose:
 
             if not isinstance(use_cases_raw, list):
                 print(f"⚠️  Expected array, got {type(use_cases_raw)}\n")
+                discard_cached_response(outputs)
                 return extract_with_smart_fallback(text)
 
             print(f"✅ Parsed {len(use_cases_raw)} use cases from JSON\n")
@@ -788,41 +1599,9 @@ Return a JSON array where EACH use case has UNIQUE title and purpose:
             use_cases = []
 
             for idx, uc in enumerate(use_cases_raw, 1):
-                if not isinstance(uc, dict):
-                    print(f"⚠️  Skipping non-dict item {idx}")
-                    continue
-
-                # Validate and structure
-                validated_uc = {
-                    "title": str(uc.get("title", f"Use Case {idx}")).strip(),
-                    "preconditions": ensure_string_list(uc.get("preconditions", [])),
-                    "main_flow": ensure_string_list(uc.get("main_flow", [])),
-                    "sub_flows": ensure_string_list(uc.get("sub_flows", [])),
-                    "alternate_flows": ensure_string_list(
-                        uc.get("alternate_flows", [])
-                    ),
-                    "outcomes": ensure_string_list(uc.get("outcomes", [])),
-                    "stakeholders": ensure_string_list(uc.get("stakeholders", [])),
-                }
-
-                # Quality check
-                title_len = len(validated_uc["title"])
-                flow_len = len(validated_uc["main_flow"])
-
-                if title_len < 10:
-                    print(f"⚠️  [{idx}] Title too short: {validated_uc['title']}")
-                    continue
-
-                if flow_len < 3:
-                    print(f"⚠️  [{idx}] Main flow too short ({flow_len} steps)")
-                    # Enrich it instead of skipping
-                    validated_uc = enrich_use_case(validated_uc, text)
-
-                # Enrich to improve quality
-                validated_uc = enrich_use_case(validated_uc, text)
-                use_cases.append(validated_uc)
-
-                print(f"✅ [{idx}] {validated_uc['title'][:60]}")
+                validated_uc = structure_use_case(uc, idx, text)
+                if validated_uc is not None:
+                    use_cases.append(validated_uc)
 
             # Hard limit check
             if len(use_cases) > max_use_cases + 2:
@@ -843,13 +1622,18 @@ Return a JSON array where EACH use case has UNIQUE title and purpose:
             print(
                 f"   Problematic section: ...{json_str[max(0,e.pos-50):e.pos+50]}...\n"
             )
+            discard_cached_response(outputs)
             return extract_with_smart_fallback(text)
 
+    except GenerationCancelled:
+        raise
     except Exception as e:
         print(f"❌ Extraction error: {e}\n")
         import traceback
 
         traceback.print_exc()
+        if outputs is not None:
+            discard_cached_response(outputs)
         return extract_with_smart_fallback(text)
 
 
@@ -858,7 +1642,8 @@ def extract_use_cases_batch(
 ) -> List[dict]:
     """
     BATCH EXTRACTION - Extract use cases in small batches for speed
-    Optimized for RTX 3050: 3-5x faster than single-stage
+    All batches fork from one shared document prefix: the document is
+    prefilled once and the batches decode together as one padded batch
     """
 
     print(f"🔄 BATCH EXTRACTION MODE")
@@ -866,59 +1651,27 @@ def extract_use_cases_batch(
     print(f"   Processing in batches of 3-4 use cases\n")
 
     all_use_cases = []
+    seen_titles = set()
+    failed_batches = 0
     batch_size = 3  # Extract 3 use cases per batch
-    total_batches = (max_use_cases + batch_size - 1) // batch_size
-
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        remaining = max_use_cases - start_idx
-        batch_count = min(batch_size, remaining)
-
-        print(f"{'='*80}")
-        print(
-            f"📦 BATCH {batch_num + 1}/{total_batches} - Extracting {batch_count} use cases"
-        )
-        print(f"{'='*80}")
-
-        # Create focused prompt for this batch
-        prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
-
-You are a requirements analyst. Extract exactly {batch_count} use cases from the requirements.
-
-<|eot_id|><|start_header_id|>user<|end_header_id|>
-
-{memory_context}
-
-Requirements:
-{text}
-
-Extract exactly {batch_count} distinct use cases. Return ONLY a JSON array:
-
-[
-  {{
-    "title": "Actor performs action on object",
-    "preconditions": ["Precondition 1", "Precondition 2"],
-    "main_flow": ["Step 1", "Step 2", "Step 3", "Step 4"],
-    "sub_flows": ["Optional feature 1", "Optional feature 2"],
-    "alternate_flows": ["Error case 1", "Error case 2"],
-    "outcomes": ["Success result 1", "Success result 2"],
-    "stakeholders": ["Actor", "System"]
-  }}
-]
-
-<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    shared_prefix, prompts = build_batch_branch_prompts(
+        text, memory_context, max_use_cases, batch_size
+    )
+    total_batches = len(prompts)
 
-["""
+    # Same budget for every branch so they share one generate() batch
+    batch_tokens = get_smart_token_budget(text, batch_size, prompt_type="batch")
 
-        # Calculate token budget for this batch
-        batch_tokens = batch_count * 150 + 100  # 150 tokens per use case + overhead
+    print(f"{'='*80}")
+    print(f"📦 {total_batches} BATCHES forked from one shared document prefix")
+    print(f"{'='*80}")
 
-        start_time = time.time()
+    start_time = time.time()
 
-        try:
-            # Generate with reduced tokens
+    try:
+        with shared_prompt_prefix(shared_prefix):
             outputs = pipe(
-                prompt,
+                prompts,
                 max_new_tokens=batch_tokens,
                 temperature=0.3,
                 top_p=0.85,
@@ -927,77 +1680,87 @@ Extract exactly {batch_count} distinct use cases. Return ONLY a JSON array:
                 return_full_text=False,
                 eos_token_id=tokenizer.eos_token_id,
                 pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=json_stopping_criteria(batch_size),
+                logits_processor=json_logits_processor("array"),
+                cache=True,
             )
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        print(f"❌ Error in batch generation: {e}\n")
+        traceback.print_exc()
+        return all_use_cases
 
-            response = "[" + outputs[0]["generated_text"].strip()
-            elapsed = time.time() - start_time
+    elapsed = time.time() - start_time
+    print(f"⏱️  Batch generation time: {elapsed:.1f}s\n")
 
-            print(f"⏱️  Batch generation time: {elapsed:.1f}s\n")
+    for batch_num, output in enumerate(outputs):
+        if not is_cached_output(output):
+            record_generation("batch", text, output[0]["generated_text"], batch_tokens)
+        response = close_json_array("[" + output[0]["generated_text"].strip())
 
-            # Extract JSON
-            start_idx = response.find("[")
-            end_idx = response.rfind("]")
+        # Extract JSON
+        start_idx = response.find("[")
+        end_idx = response.rfind("]")
 
-            if start_idx == -1 or end_idx == -1:
-                print(f"⚠️  No JSON array in batch {batch_num + 1}, skipping\n")
-                continue
+        if start_idx == -1 or end_idx == -1:
+            print(f"⚠️  No JSON array in batch {batch_num + 1}, skipping\n")
+            discard_cached_response(output)
+            failed_batches += 1
+            continue
 
-            json_str = response[start_idx : end_idx + 1]
+        json_str = response[start_idx : end_idx + 1]
+        if json_processors is None:
             json_str = clean_llm_json(json_str)
 
-            # Parse JSON
-            try:
-                batch_use_cases = json.loads(json_str)
-
-                if not isinstance(batch_use_cases, list):
-                    print(f"⚠️  Invalid JSON structure in batch {batch_num + 1}\n")
-                    continue
-
-                print(
-                    f"✅ Parsed {len(batch_use_cases)} use cases from batch {batch_num + 1}"
-                )
-
-                # Validate and add to results
-                for idx, uc in enumerate(batch_use_cases, 1):
-                    if not isinstance(uc, dict):
-                        continue
+        # Parse JSON
+        try:
+            batch_use_cases = json.loads(json_str)
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON parse error in batch {batch_num + 1}: {e}\n")
+            discard_cached_response(output)
+            failed_batches += 1
+            continue
 
-                    validated_uc = {
-                        "title": str(
-                            uc.get("title", f"Use Case {len(all_use_cases) + 1}")
-                        ).strip(),
-                        "preconditions": ensure_string_list(
-                            uc.get("preconditions", [])
-                        ),
-                        "main_flow": ensure_string_list(uc.get("main_flow", [])),
-                        "sub_flows": ensure_string_list(uc.get("sub_flows", [])),
-                        "alternate_flows": ensure_string_list(
-                            uc.get("alternate_flows", [])
-                        ),
-                        "outcomes": ensure_string_list(uc.get("outcomes", [])),
-                        "stakeholders": ensure_string_list(uc.get("stakeholders", [])),
-                    }
+        if not isinstance(batch_use_cases, list):
+            print(f"⚠️  Invalid JSON structure in batch {batch_num + 1}\n")
+            discard_cached_response(output)
+            failed_batches += 1
+            continue
 
-                    # Enrich for quality
-                    validated_uc = enrich_use_case(validated_uc, text)
-                    all_use_cases.append(validated_uc)
+        print(f"✅ Parsed {len(batch_use_cases)} use cases from batch {batch_num + 1}")
 
-                    print(f"   [{len(all_use_cases)}] {validated_uc['title'][:60]}")
+        # Validate and add to results
+        for uc in batch_use_cases:
+            if not isinstance(uc, dict):
+                continue
 
-                print(
-                    f"\n✅ Batch {batch_num + 1} complete: {len(batch_use_cases)} use cases extracted\n"
-                )
+            validated_uc = {
+                "title": str(
+                    uc.get("title", f"Use Case {len(all_use_cases) + 1}")
+                ).strip(),
+                "preconditions": ensure_string_list(uc.get("preconditions", [])),
+                "main_flow": ensure_string_list(uc.get("main_flow", [])),
+                "sub_flows": ensure_string_list(uc.get("sub_flows", [])),
+                "alternate_flows": ensure_string_list(uc.get("alternate_flows", [])),
+                "outcomes": ensure_string_list(uc.get("outcomes", [])),
+                "stakeholders": ensure_string_list(uc.get("stakeholders", [])),
+            }
 
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parse error in batch {batch_num + 1}: {e}\n")
+            # Branches cannot see each other, so drop exact repeats
+            title_key = validated_uc["title"].lower()
+            if title_key in seen_titles:
+                print(f"   ⏭️  Skipping repeat: {validated_uc['title'][:60]}")
                 continue
+            seen_titles.add(title_key)
 
-        except Exception as e:
-            print(f"❌ Error in batch {batch_num + 1}: {e}\n")
-            import traceback
+            # Enrich for quality
+            validated_uc = enrich_use_case(validated_uc, text)
+            all_use_cases.append(validated_uc)
 
-            traceback.print_exc()
-            continue
+            print(f"   [{len(all_use_cases)}] {validated_uc['title'][:60]}")
+
+        print(f"\n✅ Batch {batch_num + 1} complete\n")
 
     print(f"\n{'='*80}")
     print(f"✅ BATCH EXTRACTION COMPLETE")
@@ -1005,6 +1768,8 @@ Extract exactly {batch_count} distinct use cases. Return ONLY a JSON array:
     print(f"Total use cases extracted: {len(all_use_cases)}")
     print(f"{'='*80}\n")
 
+    if failed_batches:
+        return FallbackUseCases(all_use_cases)
     return all_use_cases
 
 
@@ -1013,6 +1778,13 @@ Extract exactly {batch_count} distinct use cases. Return ONLY a JSON array:
 # ============================================================================
 
 
+class FallbackUseCases(list):
+    """
+    Use cases that did not all come from a parsed LLM response (heuristic
+    fallback, or batches that failed); they are never cached
+    """
+
+
 def extract_with_smart_fallback(text: str) -> List[dict]:
     """
     IMPROVED FALLBACK with better pattern recognition
@@ -1185,7 +1957,7 @@ def extract_with_smart_fallback(text: str) -> List[dict]:
             break
 
     print(f"\n🔧 Fallback: Extracted {len(use_cases)} quality use cases\n")
-    return use_cases
+    return FallbackUseCases(use_cases)
 
 
 # ============================================================================
@@ -1193,16 +1965,29 @@ def extract_with_smart_fallback(text: str) -> List[dict]:
 # ============================================================================
 
 
+def summarize_chunk(chunk: dict, chunk_use_cases: List[dict]) -> dict:
+    """Per-chunk entry of chunk_summaries (also reported by job progress)"""
+    return {
+        "chunk_id": chunk["chunk_id"],
+        "use_cases_found": len(chunk_use_cases),
+        "char_count": chunk["char_count"],
+    }
+
+
 def parse_large_document_chunked(
     text: str,
     session_id: str,
     project_context: Optional[str] = None,
     domain: Optional[str] = None,
     filename: str = "document",
+    progress: Optional[JobProgress] = None,
 ) -> dict:
     """
     Process large documents by chunking and extracting from each chunk
     NOW WITH SMART ESTIMATION PER CHUNK!
+
+    A background job passes its progress: every finished chunk is reported
+    to it, and a resumed job reuses its chunk plan and finished chunks.
     """
 
     start_time = time.time()
@@ -1218,39 +2003,75 @@ def parse_large_document_chunked(
         previous_use_cases=previous_use_cases,
     )
 
-    # Chunk the document
-    chunks = chunker.chunk_document(text, strategy="auto")
+    # Chunk the document; every chunk is sent inside the extraction prompt
+    # with the same memory context, so those tokens come off each chunk's budget
+    if progress is not None and progress.chunks:
+        # Resumed job: the memory context has changed since, keep the same chunks
+        chunks = progress.chunks
+    else:
+        reserved_tokens = 0
+        if token_counter is not None:
+            reserved_tokens = token_counter(
+                build_single_stage_prompt("", memory_context, 100)
+            )
+        chunks = chunker.chunk_document(
+            text, strategy="auto", reserved_tokens=reserved_tokens
+        )
+        if progress is not None:
+            progress.planned(chunks)
+    finished = dict(progress.chunk_results) if progress is not None else {}
 
     print(f"\n{'='*80}")
     print(f"⚡ CHUNKED EXTRACTION - {len(chunks)} chunks")
     print(f"{'='*80}\n")
 
-    # Extract use cases from each chunk
-    all_chunk_results = []
-    chunk_summaries = []
-
-    for i, chunk in enumerate(chunks, 1):
-        print(f"{'='*80}")
-        print(f"Processing Chunk {i}/{len(chunks)}")
-        print(f"{'='*80}")
+    # Chunks are extracted concurrently so the batching scheduler can run
+    # their prompts as one batch. They share the generation kwargs (largest
+    # budget and estimate as ceilings) so they land in the same batch; each
+    # row still stops at its own chunk's estimate
+    estimates = [get_smart_max_use_cases(chunk["text"]) for chunk in chunks]
+    shared_budget = max(
+        get_smart_token_budget(chunk["text"], estimate)
+        for chunk, estimate in zip(chunks, estimates)
+    )
+    workers = max(1, min(CHUNK_EXTRACTION_CONCURRENCY, len(chunks)))
+    print(f"🔀 Extracting {len(chunks)} chunks, {workers} at a time\n")
+    if finished:
+        print(f"🔁 {len(finished)} chunks already done before a restart\n")
 
-        # Extract from this chunk - NO max_use_cases, let it auto-detect!
+    def extract_chunk(index: int, chunk: dict, estimate: int) -> List[dict]:
         chunk_use_cases = extract_use_cases_single_stage(
-            text=chunk["text"],
-            memory_context=memory_context,
-            # NO max_use_cases parameter - auto-detects per chunk!
-        )
-
-        all_chunk_results.append(chunk_use_cases)
-        chunk_summaries.append(
-            {
-                "chunk_id": chunk["chunk_id"],
-                "use_cases_found": len(chunk_use_cases),
-                "char_count": chunk["char_count"],
-            }
+            chunk["text"], memory_context, estimate, shared_budget, max(estimates)
         )
+        if progress is not None:
+            progress.chunk_done(
+                index, summarize_chunk(chunk, chunk_use_cases), chunk_use_cases
+            )
+        return chunk_use_cases
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            index: executor.submit(
+                contextvars.copy_context().run,
+                extract_chunk,
+                index,
+                chunk,
+                estimate,
+            )
+            for index, (chunk, estimate) in enumerate(zip(chunks, estimates))
+            if index not in finished
+        }
+        # Results stay in chunk order regardless of completion order
+        all_chunk_results = [
+            finished[index] if index in finished else futures[index].result()
+            for index in range(len(chunks))
+        ]
 
-        print(f"✅ Chunk {i}: Extracted {len(chunk_use_cases)} use cases\n")
+    chunk_summaries = []
+    for i, (chunk, chunk_use_cases) in enumerate(zip(chunks, all_chunk_results), 1):
+        chunk_summaries.append(summarize_chunk(chunk, chunk_use_cases))
+        print(f"✅ Chunk {i}: Extracted {len(chunk_use_cases)} use cases")
+    print()
 
     # Merge results from all chunks
     merged_use_cases = chunker.merge_extracted_use_cases(all_chunk_results)
@@ -1288,64 +2109,37 @@ def parse_large_document_chunked(
                 }
             )
 
-    # Check for duplicates and store
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute(
-        "SELECT title, main_flow FROM use_cases WHERE session_id = ?", (session_id,)
-    )
-    existing_rows = c.fetchall()
-    conn.close()
-
-    existing_texts = [
-        f"{row[0]} {' '.join(json.loads(row[1]))}" for row in existing_rows if row[1]
-    ]
-    existing_embeddings = (
-        embedder.encode(existing_texts, convert_to_tensor=True)
-        if existing_texts
-        else None
-    )
+    # Check for duplicates (of stored use cases and of each other) and store
+    existing_embeddings = get_existing_embeddings(session_id)
 
     results = []
     stored_count = 0
     threshold = 0.85
 
-    for uc in all_use_cases:
-        uc_emb = compute_usecase_embedding(uc)
-        is_duplicate = False
+    embeddings = embed_use_cases(all_use_cases)
+    duplicates = find_duplicates(embeddings, existing_embeddings, threshold)
+    # Same use case already produced in another session of the project
+    project_matches = find_matches_in_project(
+        session_id, embeddings, CROSS_SESSION_THRESHOLD, CROSS_SESSION_LIMIT
+    )
 
-        if existing_embeddings is not None:
-            cos_sim = util.cos_sim(uc_emb, existing_embeddings)
-            max_sim = float(torch.max(cos_sim))
-            if max_sim >= threshold:
-                is_duplicate = True
-                print(f"🔄 Duplicate detected ({max_sim:.2f}): {uc.title[:50]}")
+    for uc, uc_emb, max_sim, matches in zip(
+        all_use_cases, embeddings, duplicates, project_matches
+    ):
+        is_duplicate = max_sim is not None
+        if is_duplicate:
+            print(f"🔄 Duplicate detected ({max_sim:.2f}): {uc.title[:50]}")
 
         if not is_duplicate:
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO use_cases 
-                (session_id, title, preconditions, main_flow, sub_flows, alternate_flows, outcomes, stakeholders)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    session_id,
-                    uc.title,
-                    json.dumps(uc.preconditions),
-                    json.dumps(uc.main_flow),
-                    json.dumps(uc.sub_flows),
-                    json.dumps(uc.alternate_flows),
-                    json.dumps(uc.outcomes),
-                    json.dumps(uc.stakeholders),
-                ),
-            )
-            conn.commit()
-            conn.close()
+            store_use_case(session_id, uc, uc_emb)
 
-            results.append({"status": "stored", "title": uc.title})
+            results.append(
+                {
+                    "status": "stored",
+                    "title": uc.title,
+                    "matches_in_other_sessions": matches,
+                }
+            )
             stored_count += 1
             print(f"💾 Stored: {uc.title}")
         else:
@@ -1401,6 +2195,116 @@ def parse_large_document_chunked(
 # ============================================================================
 
 
+def extraction_priority(text: str) -> str:
+    """Texts that will be chunked run in the bulk class"""
+    if categorize_text_size(len(text)) in ["tiny", "small", "medium"]:
+        return "extraction"
+    return "bulk"
+
+
+def too_many_requests(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Too many {e.priority} requests: {e}",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def check_admission(priority: str):
+    """429 right away if the priority class queue is already full"""
+    try:
+        admission.check(priority)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+
+
+@contextmanager
+def admit_llm_work(priority: str, session_id: Optional[str] = None):
+    """
+    Hold an admission slot of the priority class and tag LLM calls with it;
+    429 with Retry-After when the class queue is full
+    """
+    try:
+        slot = admission.acquire(priority, session_id)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+
+    try:
+        with priority_scope(priority):
+            yield
+    finally:
+        slot.release()
+
+
+def wait_for_admission(priority: str, session_id: Optional[str] = None):
+    """
+    Admission slot for background work: a full queue is retried after its
+    Retry-After instead of failing the work with 429
+    """
+    while True:
+        try:
+            return admission.acquire(priority, session_id)
+        except AdmissionRejected as e:
+            cancel_token = current_cancel_token()
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            time.sleep(e.retry_after)
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request: Request):
+    """
+    Cancel token for the LLM work of one request, cancelled when the client
+    disconnects; the block ends with 499 if the work was cancelled
+    """
+    token = CancelToken()
+    watcher = asyncio.create_task(watch_disconnect(request, token))
+    try:
+        yield token
+    except GenerationCancelled:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        watcher.cancel()
+
+
+async def watch_disconnect(request: Request, token: CancelToken):
+    while not token.cancelled:
+        if await request.is_disconnected():
+            print(f"🛑 Client disconnected - cancelling {request.url.path}")
+            token.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_S)
+
+
+async def run_in_llm_executor(cancel_token: CancelToken, fn, *args, **kwargs):
+    """Run blocking work on the LLM executor under the request's cancel token"""
+    context = contextvars.copy_context()
+
+    def call():
+        cancel_token.raise_if_cancelled()
+        with cancel_scope(cancel_token):
+            return fn(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(llm_executor, context.run, call)
+
+
+def require_models():
+    """Dependency for endpoints that generate: 503 until the model is ready"""
+    if models_ready.is_set():
+        return
+
+    if model_status["state"] == "failed":
+        raise HTTPException(
+            status_code=503, detail=f"Model failed to load: {model_status['error']}"
+        )
+    raise HTTPException(
+        status_code=503,
+        detail="Model is still loading, retry shortly",
+        headers={"Retry-After": str(MODEL_LOAD_RETRY_AFTER)},
+    )
+
+
 @app.post("/session/create")
 def create_or_get_session(request: SessionRequest):
     """Create a new session or retrieve existing session info"""
@@ -1463,24 +2367,16 @@ def get_session_history(session_id: str, limit: int = 10):
     }
 
 
-@app.post("/parse_use_case_rag/")
-def parse_use_case_fast(request: InputText):
-    """
-    SMART EXTRACTION with intelligent use case estimation
-    - Auto-detects number of use cases in text
-    - Adapts token budget dynamically
-    - No more hardcoded max_use_cases = 8!
-    - Handles any size: tiny to very large
-    """
-
+def prepare_text_session(request: InputText) -> str:
+    """Create or update the session for a text request and store the user input"""
     session_id = request.session_id or str(uuid.uuid4())
 
     # Smart session handling
     existing_context = get_session_context(session_id)
 
     if existing_context is None:
-        # Generate a title for new session using LLM
-        session_title = generate_session_title(request.raw_text, use_llm=True)
+        # Quick title now; the LLM title replaces it in the background
+        session_title = generate_fallback_title(request.raw_text)
 
         # Session doesn't exist - create it with provided context and title
         create_session(
@@ -1490,6 +2386,7 @@ def parse_use_case_fast(request: InputText):
             session_title=session_title,
         )
         print(f"✅ Created new session: {session_id} with title: {session_title}")
+        schedule_session_title(session_id, request.raw_text, session_title)
     else:
         # Session exists - only update context if NEW values are provided
         # Don't update the session title if it already exists (prevents overwriting file upload titles)
@@ -1526,8 +2423,48 @@ def parse_use_case_fast(request: InputText):
     
     print(f"💬 User message stored in session: {session_id}")
 
+    return session_id
+
+
+def get_memory_context(session_id: str) -> str:
+    """Build the memory context for a session's next extraction"""
+    conversation_history = get_conversation_history(session_id, limit=10)
+    session_context = get_session_context(session_id) or {}
+    previous_use_cases = get_session_use_cases(session_id)
+
+    return build_memory_context(
+        conversation_history=conversation_history,
+        session_context=session_context,
+        previous_use_cases=previous_use_cases,
+    )
+
+
+@app.post("/parse_use_case_rag/", dependencies=[Depends(require_models)])
+async def parse_use_case_fast(request: InputText, http_request: Request):
+    """
+    SMART EXTRACTION with intelligent use case estimation
+    - Auto-detects number of use cases in text
+    - Adapts token budget dynamically
+    - No more hardcoded max_use_cases = 8!
+    - Handles any size: tiny to very large
+    """
+    priority = extraction_priority(request.raw_text)
+
+    def extract():
+        with admit_llm_work(priority, request.session_id):
+            return extract_from_text(request)
+
+    async with cancel_on_disconnect(http_request) as cancel_token:
+        return await run_in_llm_executor(cancel_token, extract)
+
+
+def extract_from_text(request: InputText) -> dict:
+    """Text extraction behind /parse_use_case_rag/ (admission already held)"""
+
+    session_id = prepare_text_session(request)
+
     # Check text size and decide processing strategy
-    stats = get_text_stats(request.raw_text)
+    stats = get_text_stats(request.raw_text, length_function=token_counter)
 
     print(f"\n{'='*80}")
     print(f"⚡ TEXT INPUT ANALYSIS")
@@ -1546,23 +2483,25 @@ def parse_use_case_fast(request: InputText):
         print(f"✅ Using direct processing (text is {stats['size_category']})\n")
 
         # Get memory context
-        conversation_history = get_conversation_history(session_id, limit=10)
-        session_context = get_session_context(session_id) or {}
-        previous_use_cases = get_session_use_cases(session_id)
-
-        memory_context = build_memory_context(
-            conversation_history=conversation_history,
-            session_context=session_context,
-            previous_use_cases=previous_use_cases,
-        )
+        memory_context = get_memory_context(session_id)
 
         start_time = time.time()
 
         # Get text stats and estimate
         max_use_cases_estimate = get_smart_max_use_cases(request.raw_text)
 
+        # Nearly identical text extracted before: reuse its use cases
+        cache_lookup = lookup_extraction_cache(request.raw_text)
+        cache_hit = cache_lookup is not None and cache_lookup.hit
+
         # Choose extraction strategy based on size
-        if stats["estimated_tokens"] > 300 and max_use_cases_estimate >= 4:
+        if cache_hit:
+            print(
+                f"♻️  Reusing use cases of similar text "
+                f"(similarity {cache_lookup.similarity:.2f})\n"
+            )
+            use_cases_raw = cache_lookup.use_cases
+        elif stats["estimated_tokens"] > 300 and max_use_cases_estimate >= 4:
             print(
                 f"📦 Using BATCH extraction (better for {max_use_cases_estimate} use cases)\n"
             )
@@ -1575,6 +2514,14 @@ def parse_use_case_fast(request: InputText):
                 request.raw_text, memory_context
             )
 
+        # Only use cases parsed from a complete LLM response are reused
+        if (
+            cache_lookup is not None
+            and not cache_hit
+            and not isinstance(use_cases_raw, FallbackUseCases)
+        ):
+            extraction_cache.store(cache_lookup, use_cases_raw)
+
         if not use_cases_raw:
             return {
                 "message": "No use cases could be extracted",
@@ -1618,66 +2565,29 @@ def parse_use_case_fast(request: InputText):
                     }
                 )
 
-        # Check for duplicates
-        db_path = get_db_path()
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute(
-            "SELECT title, main_flow FROM use_cases WHERE session_id = ?", (session_id,)
-        )
-        existing_rows = c.fetchall()
-        conn.close()
-
-        existing_texts = [
-            f"{row[0]} {' '.join(json.loads(row[1]))}"
-            for row in existing_rows
-            if row[1]
-        ]
-        existing_embeddings = (
-            embedder.encode(existing_texts, convert_to_tensor=True)
-            if existing_texts
-            else None
-        )
+        # Check for duplicates (of stored use cases and of each other)
+        existing_embeddings = get_existing_embeddings(session_id)
 
         results = []
         stored_count = 0
         threshold = 0.85
 
-        for uc in all_use_cases:
-            uc_emb = compute_usecase_embedding(uc)
-            is_duplicate = False
-            if existing_embeddings is not None:
-                cos_sim = util.cos_sim(uc_emb, existing_embeddings)
-                max_sim = float(torch.max(cos_sim))
-                if max_sim >= threshold:
-                    is_duplicate = True
-                    print(f"🔄 Duplicate detected ({max_sim:.2f}): {uc.title[:50]}")
+        embeddings = embed_use_cases(all_use_cases)
+        duplicates = find_duplicates(embeddings, existing_embeddings, threshold)
+        # Same use case already produced in another session of the project
+        project_matches = find_matches_in_project(
+            session_id, embeddings, CROSS_SESSION_THRESHOLD, CROSS_SESSION_LIMIT
+        )
 
-            if not is_duplicate:
-                conn = sqlite3.connect(db_path)
-                c = conn.cursor()
-                c.execute(
-                    """
-            INSERT INTO use_cases 
-            (session_id, title, preconditions, main_flow, sub_flows, alternate_flows, outcomes, stakeholders)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-                    (
-                        session_id,
-                        uc.title,
-                        json.dumps(uc.preconditions),
-                        json.dumps(uc.main_flow),
-                        json.dumps(uc.sub_flows),
-                        json.dumps(uc.alternate_flows),
-                        json.dumps(uc.outcomes),
-                        json.dumps(uc.stakeholders),
-                    ),
-                )
+        for uc, uc_emb, max_sim, matches in zip(
+            all_use_cases, embeddings, duplicates, project_matches
+        ):
+            is_duplicate = max_sim is not None
+            if is_duplicate:
+                print(f"🔄 Duplicate detected ({max_sim:.2f}): {uc.title[:50]}")
 
-                # Get the inserted ID
-                use_case_id = c.lastrowid
-                conn.commit()
-                conn.close()
+            if not is_duplicate:
+                use_case_id = store_use_case(session_id, uc, uc_emb)
 
                 # NEW CODE - Return FULL use case details
                 results.append(
@@ -1691,6 +2601,7 @@ def parse_use_case_fast(request: InputText):
                         "alternate_flows": uc.alternate_flows,
                         "outcomes": uc.outcomes,
                         "stakeholders": uc.stakeholders,
+                        "matches_in_other_sessions": matches,
                     }
                 )
                 stored_count += 1
@@ -1716,6 +2627,8 @@ def parse_use_case_fast(request: InputText):
         extraction_method = (
             "batch_extraction" if max_use_cases_estimate >= 4 else "single_stage"
         )
+        if cache_hit:
+            extraction_method = "semantic_cache"
 
         # Store response
         add_conversation_message(
@@ -1769,16 +2682,280 @@ def parse_use_case_fast(request: InputText):
         )
 
 
-@app.post("/parse_use_case_document/")
-async def parse_use_case_from_document(
-    file: UploadFile = File(...),
-    session_id: Optional[str] = Form(None),
-    project_context: Optional[str] = Form(None),
-    domain: Optional[str] = Form(None),
+def _ndjson(event: dict) -> str:
+    """Serialize one streaming event as a line of NDJSON"""
+    return json.dumps(event) + "\n"
+
+
+def stream_generation(
+    prompt: str, cancel_token: Optional[CancelToken] = None, **generate_kwargs
 ):
-    """
+    """Yield generated text pieces while the model is still decoding"""
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    errors = []
+
+    def run():
+        try:
+            with cancel_scope(cancel_token):
+                pipe(prompt, streamer=streamer, **generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, name="llm-stream", daemon=True)
+    thread.start()
+
+    for piece in streamer:
+        yield piece
+
+    if errors:
+        raise errors[0]
+
+
+def stream_use_case_extraction(
+    text: str, session_id: str, cancel_token: Optional[CancelToken] = None
+):
+    """
+    Run single-stage extraction and emit each use case as soon as its JSON
+    object closes. Every use case is validated, enriched, deduplicated and
+    stored before it is sent.
+    """
+    start_time = time.time()
+
+    memory_context = get_memory_context(session_id)
+    max_use_cases = get_smart_max_use_cases(text)
+    max_new_tokens = get_smart_token_budget(text, max_use_cases)
+    prompt = build_single_stage_prompt(text, memory_context, max_use_cases)
+
+    yield _ndjson(
+        {
+            "event": "session",
+            "session_id": session_id,
+            "estimated_use_cases": max_use_cases,
+        }
+    )
+
+    existing_embeddings = get_existing_embeddings(session_id)
+    results = []
+    validation_results = []
+    threshold = 0.85
+    extraction_method = "streaming_single_stage"
+
+    def process(uc_raw, idx: int):
+        nonlocal existing_embeddings
+
+        uc_dict = structure_use_case(uc_raw, idx, text)
+        if uc_dict is None:
+            return None
+
+        try:
+            is_valid, issues = UseCaseValidator.validate(uc_dict)
+            quality_score = UseCaseValidator.calculate_quality_score(uc_dict)
+            uc = UseCaseSchema(**flatten_use_case(uc_dict))
+        except Exception as e:
+            print(f"⚠️  Validation error for '{uc_dict.get('title', 'Unknown')}': {e}")
+            validation_results.append(
+                {
+                    "title": uc_dict.get("title", "Unknown"),
+                    "status": "error",
+                    "reason": str(e),
+                }
+            )
+            return None
+
+        validation_results.append(
+            {
+                "title": uc.title,
+                "status": "valid" if is_valid else "valid_with_warnings",
+                "issues": issues,
+                "quality_score": quality_score,
+            }
+        )
+
+        # Objects arrive one at a time, so each is embedded on its own
+        uc_emb = compute_usecase_embedding(uc)
+        max_sim = find_duplicates(
+            uc_emb.reshape(1, -1), existing_embeddings, threshold
+        )[0]
+        is_duplicate = max_sim is not None
+        if is_duplicate:
+            print(f"🔄 Duplicate detected ({max_sim:.2f}): {uc.title[:50]}")
+
+        result = {"status": "duplicate_skipped", **uc.model_dump()}
+        if not is_duplicate:
+            matches = find_matches_in_project(
+                session_id,
+                uc_emb.reshape(1, -1),
+                CROSS_SESSION_THRESHOLD,
+                CROSS_SESSION_LIMIT,
+            )[0]
+            use_case_id = store_use_case(session_id, uc, uc_emb)
+            result = {
+                "status": "stored",
+                "id": use_case_id,
+                **uc.model_dump(),
+                "matches_in_other_sessions": matches,
+            }
+            print(f"💾 Stored: {uc.title}")
+
+            # Later objects in the same stream are checked against this one too
+            uc_emb = uc_emb.reshape(1, -1)
+            existing_embeddings = (
+                uc_emb
+                if existing_embeddings is None
+                else torch.cat([existing_embeddings, uc_emb])
+            )
+
+        results.append(result)
+        return result
+
+    print(f"🌊 STREAMING EXTRACTION")
+    print(f"   Estimated: {max_use_cases} use cases")
+    print(f"   Token budget: {max_new_tokens}\n")
+
+    parser = JsonArrayStreamParser(array_opened=True)
+    generated = []
+    try:
+        for piece in stream_generation(
+            prompt,
+            cancel_token=cancel_token,
+            max_new_tokens=max_new_tokens,
+            temperature=0.3,
+            top_p=0.85,
+            repetition_penalty=1.1,
+            do_sample=True,
+            return_full_text=False,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=json_stopping_criteria(max_use_cases),
+            logits_processor=json_logits_processor("array"),
+        ):
+            generated.append(piece)
+            for uc_raw in parser.feed(piece):
+                if parser.objects_closed > max_use_cases:
+                    break
+                result = process(uc_raw, parser.objects_closed)
+                if result is not None:
+                    yield _ndjson({"event": "use_case", **result})
+
+            if parser.array_closed or parser.objects_closed >= max_use_cases:
+                break
+    except GenerationCancelled:
+        # Client went away mid-stream; don't fall back or store anything else
+        return
+    except Exception as e:
+        print(f"❌ Streaming generation error: {e}\n")
+        traceback.print_exc()
+    else:
+        record_generation("single_stage", text, "".join(generated), max_new_tokens)
+
+    # Nothing usable came out of the stream - same fallback as single-stage
+    if not results:
+        extraction_method = "streaming_fallback"
+        for idx, uc_raw in enumerate(extract_with_smart_fallback(text), 1):
+            result = process(uc_raw, idx)
+            if result is not None:
+                yield _ndjson({"event": "use_case", **result})
+
+    total_time = time.time() - start_time
+    stored_count = sum(1 for r in results if r["status"] == "stored")
+
+    add_conversation_message(
+        session_id=session_id,
+        role="assistant",
+        content=f"Streaming extraction: {len(results)} use cases in {total_time:.1f}s",
+        metadata={
+            "use_cases": results,
+            "validation_results": validation_results,
+            "extraction_method": extraction_method,
+            "processing_time": total_time,
+        },
+    )
+
+    print(f"\n⚡ Streamed {len(results)} use cases in {total_time:.1f}s\n")
+
+    yield _ndjson(
+        {
+            "event": "done",
+            "session_id": session_id,
+            "extracted_count": len(results),
+            "stored_count": stored_count,
+            "duplicate_count": len(results) - stored_count,
+            "processing_time_seconds": round(total_time, 1),
+            "validation_results": validation_results,
+            "extraction_method": extraction_method,
+        }
+    )
+
+
+@app.post("/parse_use_case_rag/stream", dependencies=[Depends(require_models)])
+def parse_use_case_stream(request: InputText):
+    """
+    STREAMING EXTRACTION (NDJSON)
+    - Emits a "session" event, one "use_case" event per stored/duplicate use case
+      as soon as its JSON object is complete, then a "done" summary
+    - Intended for small/medium text; large text should use /parse_use_case_rag/
+    """
+
+    # Reject before the stream starts; the slot itself is held while streaming
+    check_admission("extraction")
+
+    session_id = prepare_text_session(request)
+
+    cancel_token = CancelToken()
+    events = admitted_stream(
+        stream_use_case_extraction(request.raw_text, session_id, cancel_token),
+        "extraction",
+        session_id,
+    )
+    return StreamingResponse(
+        cancel_when_closed(events, cancel_token),
+        media_type="application/x-ndjson",
+    )
+
+
+async def cancel_when_closed(events, cancel_token: CancelToken):
+    """
+    Stream events from a worker thread; when the response ends early (the
+    client disconnected), generation stops at the next token
+    """
+    try:
+        async for event in iterate_in_threadpool(events):
+            yield event
+    finally:
+        cancel_token.cancel()
+
+
+def admitted_stream(events, priority: str, session_id: str):
+    """Hold an admission slot while a streaming response is generated"""
+    try:
+        slot = admission.acquire(priority, session_id)
+    except AdmissionRejected as e:
+        yield _ndjson({"event": "error", "detail": str(e)})
+        return
+
+    try:
+        yield from events
+    finally:
+        slot.release()
+
+
+@app.post("/parse_use_case_document/", dependencies=[Depends(require_models)])
+async def parse_use_case_from_document(
+    http_request: Request,
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None),
+    project_context: Optional[str] = Form(None),
+    domain: Optional[str] = Form(None),
+):
+    """
     Extract use cases from uploaded document (PDF, DOCX, TXT, MD)
     Handles documents of any size with intelligent chunking and smart estimation
+
+    Parsing, session setup and extraction run on the LLM executor; if the
+    client disconnects, generation stops at the next token.
     """
 
     print(f"\n{'='*80}")
@@ -1794,16 +2971,61 @@ async def parse_use_case_from_document(
     # Validate file size (10MB max)
     validate_file_size(file, max_size_mb=10)
 
-    # Extract text from document
+    async with cancel_on_disconnect(http_request) as cancel_token:
+        extracted_text, file_type = await read_document_text(cancel_token, file)
+
+        # Reject before creating the session if this class is already backed up
+        priority = extraction_priority(extracted_text)
+        check_admission(priority)
+
+        session_id, stats = await run_in_llm_executor(
+            cancel_token,
+            prepare_document_session,
+            extracted_text,
+            file.filename,
+            file_type,
+            session_id,
+            project_context,
+            domain,
+        )
+
+        return await run_in_llm_executor(
+            cancel_token,
+            extract_from_document,
+            extracted_text,
+            stats,
+            session_id,
+            project_context,
+            domain,
+            file.filename,
+            priority,
+        )
+
+
+async def read_document_text(
+    cancel_token: CancelToken, file: UploadFile
+) -> Tuple[str, str]:
+    """Extract text from an uploaded document on the LLM executor"""
     try:
-        extracted_text, file_type = extract_text_from_file(file)
-    except HTTPException as e:
-        raise e
+        return await run_in_llm_executor(cancel_token, extract_text_from_file, file)
+    except (HTTPException, GenerationCancelled):
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to extract text: {str(e)}")
 
+
+def prepare_document_session(
+    extracted_text: str,
+    filename: str,
+    file_type: str,
+    session_id: Optional[str],
+    project_context: Optional[str],
+    domain: Optional[str],
+) -> Tuple[str, dict]:
+    """Create or update the session for an upload and store it in history"""
+
     # Get text statistics
-    stats = get_text_stats(extracted_text)
+    stats = get_text_stats(extracted_text, length_function=token_counter)
 
     print(f"\n📊 EXTRACTED TEXT STATS:")
     print(f"   Characters: {stats['characters']:,}")
@@ -1824,8 +3046,9 @@ async def parse_use_case_from_document(
     print(f"📋 Session check for {session_id}: {'EXISTS' if existing_context else 'NEW'}")
     
     if existing_context is None:
-        # Generate session title from extracted content (not just filename)
-        session_title = generate_session_title(extracted_text, use_llm=True)
+        # Title from extracted content (not just filename); the LLM title
+        # replaces it in the background
+        session_title = generate_fallback_title(extracted_text)
         
         create_session(
             session_id=session_id,
@@ -1834,13 +3057,14 @@ async def parse_use_case_from_document(
             session_title=session_title,
         )
         print(f"✅ Created new session for file upload: {session_id} with title: {session_title}")
+        schedule_session_title(session_id, extracted_text, session_title)
     else:
         # EXISTING SESSION: Don't overwrite the session title or context  
         print(f"✅ Using existing session for file upload: {session_id}")
         print(f"   Existing title: {existing_context.get('session_title', 'N/A')}")
         print(f"   Project: {existing_context.get('project_context') or 'Not set'}")
         print(f"   Domain: {existing_context.get('domain') or 'Not set'}")
-        print(f"   File: {file.filename}")
+        print(f"   File: {filename}")
        
         # Only update if new values provided
         if project_context or domain:
@@ -1856,70 +3080,235 @@ async def parse_use_case_from_document(
     add_conversation_message(
         session_id=session_id,
         role="user",
-        content=f"Uploaded document: {file.filename}",
+        content=f"Uploaded document: {filename}",
         metadata={
             "type": "document_upload",
-            "filename": file.filename,
+            "filename": filename,
             "file_type": file_type,
             "stats": stats,
         },
     )
 
+    return session_id, stats
+
+
+def extract_from_document(
+    extracted_text: str,
+    stats: dict,
+    session_id: str,
+    project_context: Optional[str],
+    domain: Optional[str],
+    filename: str,
+    priority: str,
+) -> dict:
+    """Extract use cases from an uploaded document's text"""
+
     # Process based on document size
-    if stats["size_category"] in ["tiny", "small", "medium"]:
-        # Small document - process directly with smart estimation
-        print(
-            f"\n✅ Document is {stats['size_category']} - processing directly with smart estimation\n"
-        )
+    with admit_llm_work(priority, session_id):
+        if stats["size_category"] in ["tiny", "small", "medium"]:
+            # Small document - process directly with smart estimation
+            print(
+                f"\n✅ Document is {stats['size_category']} - processing directly with smart estimation\n"
+            )
 
-        # Use existing parsing logic
-        request_data = InputText(
-            raw_text=extracted_text,
-            session_id=session_id,
-            project_context=project_context,
-            domain=domain,
-        )
+            # Use existing parsing logic
+            request_data = InputText(
+                raw_text=extracted_text,
+                session_id=session_id,
+                project_context=project_context,
+                domain=domain,
+            )
 
-        return parse_use_case_fast(request_data)
+            return extract_from_text(request_data)
 
-    else:
-        # Large document - use chunking with smart estimation per chunk
-        print(
-            f"\n⚠️  Document is {stats['size_category']} - using chunked processing with smart estimation\n"
-        )
+        else:
+            # Large document - use chunking with smart estimation per chunk
+            print(
+                f"\n⚠️  Document is {stats['size_category']} - using chunked processing with smart estimation\n"
+            )
 
-        return parse_large_document_chunked(
-            text=extracted_text,
-            session_id=session_id,
-            project_context=project_context,
-            domain=domain,
-            filename=file.filename,
+            return parse_large_document_chunked(
+                text=extracted_text,
+                session_id=session_id,
+                project_context=project_context,
+                domain=domain,
+                filename=filename,
+            )
+
+
+# ============================================================================
+# BACKGROUND EXTRACTION JOBS
+# ============================================================================
+
+
+def run_extraction_job(job: dict, progress: JobProgress) -> dict:
+    """Chunked extraction of a job's document, in the bulk class"""
+    slot = wait_for_admission("bulk", job["session_id"])
+    progress.start()
+    try:
+        with priority_scope("bulk"):
+            return parse_large_document_chunked(
+                text=job["text"],
+                session_id=job["session_id"],
+                project_context=job["project_context"],
+                domain=job["domain"],
+                filename=job["filename"],
+                progress=progress,
+            )
+    finally:
+        slot.release()
+
+
+job_manager = JobManager(run_extraction_job, max_workers=EXTRACTION_JOB_WORKERS)
+
+
+def job_response(job: dict) -> dict:
+    """Job status plus where to follow it"""
+    return {
+        **job,
+        "status_url": f"/jobs/{job['job_id']}",
+        "events_url": f"/jobs/{job['job_id']}/events",
+    }
+
+
+@app.post("/jobs/document", status_code=202, dependencies=[Depends(require_models)])
+async def submit_document_job(
+    http_request: Request,
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None),
+    project_context: Optional[str] = Form(None),
+    domain: Optional[str] = Form(None),
+):
+    """
+    Extract use cases from a document in the background
+    Returns a job right away; follow it with GET /jobs/{job_id} or its events
+    """
+    print(f"\n📁 DOCUMENT JOB: {file.filename}")
+
+    validate_file_size(file, max_size_mb=10)
+
+    async with cancel_on_disconnect(http_request) as cancel_token:
+        extracted_text, file_type = await read_document_text(cancel_token, file)
+        session_id, _ = await run_in_llm_executor(
+            cancel_token,
+            prepare_document_session,
+            extracted_text,
+            file.filename,
+            file_type,
+            session_id,
+            project_context,
+            domain,
         )
 
+    job = await run_in_threadpool(
+        job_manager.submit,
+        session_id,
+        file.filename,
+        extracted_text,
+        project_context,
+        domain,
+    )
+    print(f"🧾 Queued extraction job {job['job_id']} for session {session_id}")
+    return job_response(job)
 
-@app.post("/use-case/refine")
-def refine_use_case_endpoint(request: RefinementRequest):
-    """Refine a specific use case based on user request"""
 
-    use_case = get_use_case_by_id(request.use_case_id)
-    if not use_case:
-        raise HTTPException(status_code=404, detail="Use case not found")
+@app.get("/jobs")
+def list_jobs(session_id: Optional[str] = None, status: Optional[str] = None):
+    """Recent extraction jobs, optionally for one session or status"""
+    if status is not None and status not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"Unknown job status '{status}'")
 
-    # Build refinement prompt based on type
-    if request.refinement_type == "more_main_flows":
-        instruction = "Add more main flows (additional primary flows or steps) to this use case. Expand the main flow with more detailed or additional steps."
-    elif request.refinement_type == "more_sub_flows":
-        instruction = "Add more sub flows to this use case. Include additional branching scenarios, related flows, or secondary paths."
-    elif request.refinement_type == "more_alternate_flows":
-        instruction = "Add more alternate flows to this use case. Include alternative paths, edge cases, error scenarios, and exception handling flows."
-    elif request.refinement_type == "more_preconditions":
-        instruction = "Add more preconditions to this use case. Include additional requirements, system states, or conditions that must be met before the use case can execute."
-    elif request.refinement_type == "more_stakeholders":
-        instruction = "Add more stakeholders to this use case. Identify additional actors, users, systems, or entities involved in this use case."
-    else:
-        instruction = "Improve the overall quality and completeness of this use case."
+    jobs = list_extraction_jobs(
+        session_id=session_id, statuses=[status] if status else None
+    )
+    return {"jobs": [job_response(job) for job in jobs]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status: chunks done, use cases found/stored, ETA and the result"""
+    job = get_extraction_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job (finished jobs are returned unchanged)"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job status whenever it changes"""
+    if await run_in_threadpool(get_extraction_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_update = None
+        idle = 0.0
+        while True:
+            job = await run_in_threadpool(get_extraction_job, job_id)
+            if job is None:
+                return
+
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                finished = job["status"] in FINISHED_JOB_STATES
+                event = "done" if finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job_response(job))}\n\n"
+                if finished:
+                    return
+                idle = 0.0
+            elif idle >= JOB_EVENTS_KEEPALIVE_S:
+                # Comment line, keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+            idle += JOB_EVENTS_POLL_S
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+REFINEMENT_INSTRUCTIONS = {
+    "more_main_flows": "Add more main flows (additional primary flows or steps) to this use case. Expand the main flow with more detailed or additional steps.",
+    "more_sub_flows": "Add more sub flows to this use case. Include additional branching scenarios, related flows, or secondary paths.",
+    "more_alternate_flows": "Add more alternate flows to this use case. Include alternative paths, edge cases, error scenarios, and exception handling flows.",
+    "more_preconditions": "Add more preconditions to this use case. Include additional requirements, system states, or conditions that must be met before the use case can execute.",
+    "more_stakeholders": "Add more stakeholders to this use case. Identify additional actors, users, systems, or entities involved in this use case.",
+}
+DEFAULT_REFINEMENT_INSTRUCTION = (
+    "Improve the overall quality and completeness of this use case."
+)
+
+# Most use cases refined by one /use-case/refine/bulk request
+MAX_BULK_REFINEMENTS = 50
+
+REFINEMENT_GENERATION_KWARGS = dict(
+    max_new_tokens=800,
+    temperature=0.4,
+    top_p=0.9,
+    do_sample=True,
+    return_full_text=False,
+)
+
+
+def build_refinement_prompt(use_case: dict, refinement_type: str) -> str:
+    """Prompt asking the LLM to refine one use case"""
+    instruction = REFINEMENT_INSTRUCTIONS.get(
+        refinement_type, DEFAULT_REFINEMENT_INSTRUCTION
+    )
+
+    return f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
 
 You are a requirements analyst refining a use case.
 
@@ -1936,45 +3325,278 @@ Return the refined use case in the same JSON format, with improvements applied.
 
 {{"""
 
-    try:
-        outputs = pipe(
-            prompt,
-            max_new_tokens=800,
-            temperature=0.4,
-            top_p=0.9,
-            do_sample=True,
-            return_full_text=False,
-        )
 
-        response = outputs[0]["generated_text"].strip()
+def parse_refined_use_case(generated_text: str) -> dict:
+    """Refined use case from the generated text; ValueError if there is none"""
+    response = generated_text.strip()
 
-        # Extract JSON
-        if not response.startswith("{"):
-            response = "{" + response
+    # Extract JSON
+    if not response.startswith("{"):
+        response = "{" + response
 
-        start = response.find("{")
-        end = response.rfind("}")
+    start = response.find("{")
+    end = response.rfind("}")
 
-        if start != -1 and end != -1:
-            json_str = response[start : end + 1]
-            json_str = re.sub(r",(\s*[}\]])", r"\1", json_str)
-            refined = json.loads(json_str)
+    if start == -1 or end == -1:
+        raise ValueError("Could not extract valid JSON from refinement")
 
-            # Update in database
-            update_use_case(request.use_case_id, refined)
+    json_str = response[start : end + 1]
+    if json_processors is None:
+        json_str = re.sub(r",(\s*[}\]])", r"\1", json_str)
+    return json.loads(json_str)
+
+
+@app.get("/use-case/{use_case_id}/similar", dependencies=[Depends(require_models)])
+def similar_use_cases(
+    use_case_id: int,
+    threshold: float = CROSS_SESSION_THRESHOLD,
+    limit: int = 10,
+    scope: str = "project",
+):
+    """
+    Use cases of other sessions similar to this one, from the ANN index;
+    scope "project" only searches sessions of the same project, "all" every
+    session
+    """
+    if ann_index is None:
+        raise HTTPException(status_code=404, detail="ANN index is disabled")
+    if scope not in ("project", "all"):
+        raise HTTPException(status_code=400, detail="scope must be project or all")
+
+    use_case = get_use_case_by_id(use_case_id)
+    if not use_case:
+        raise HTTPException(status_code=404, detail="Use case not found")
+
+    session_id = use_case["session_id"]
+    session_ids = None
+    if scope == "project":
+        project = (get_session_context(session_id) or {}).get("project_context")
+        session_ids = get_project_session_ids(project) if project else []
+
+    vector = as_cpu_vectors(embed_texts([use_case_text(use_case)]))[0]
+    hits = ann_index.search(
+        vector.numpy(),
+        threshold,
+        limit=max(1, min(limit, 100)),
+        session_ids=session_ids,
+        exclude_session_id=session_id,
+    )
+    return {
+        "use_case_id": use_case_id,
+        "session_id": session_id,
+        "scope": scope,
+        "threshold": threshold,
+        "matches": describe_ann_hits(hits),
+    }
 
-            return {
-                "message": "Use case refined successfully",
-                "refined_use_case": refined,
-            }
-        else:
-            raise ValueError("Could not extract valid JSON from refinement")
 
+@app.get("/ann-index/stats")
+def ann_index_stats():
+    """Size, list count and search counters of the ANN index"""
+    return ann_index.stats() if ann_index else {"enabled": False}
+
+
+@app.post("/use-case/refine", dependencies=[Depends(require_models)])
+def refine_use_case_endpoint(request: RefinementRequest):
+    """Refine a specific use case based on user request"""
+
+    use_case = get_use_case_by_id(request.use_case_id)
+    if not use_case:
+        raise HTTPException(status_code=404, detail="Use case not found")
+
+    prompt = build_refinement_prompt(use_case, request.refinement_type)
+
+    try:
+        with admit_llm_work("interactive", use_case.get("session_id")):
+            outputs = pipe(
+                prompt,
+                **REFINEMENT_GENERATION_KWARGS,
+                logits_processor=json_logits_processor("object"),
+            )
+
+        refined = parse_refined_use_case(outputs[0]["generated_text"])
+
+        # Update in database
+        update_use_case(request.use_case_id, refined)
+        refresh_use_case_embeddings(
+            [
+                {
+                    **refined,
+                    "id": request.use_case_id,
+                    "session_id": use_case.get("session_id"),
+                }
+            ]
+        )
+
+        return {
+            "message": "Use case refined successfully",
+            "refined_use_case": refined,
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Refinement failed: {str(e)}")
 
 
-@app.post("/query")
+@app.post("/use-case/refine/bulk", dependencies=[Depends(require_models)])
+async def refine_use_cases_bulk(request: BulkRefinementRequest, http_request: Request):
+    """
+    Refine many use cases at once
+    - All prompts go to the LLM as one batched generation
+    - Refined use cases are written back in one transaction
+    - Use cases that are missing or fail to parse are reported per item
+    """
+    refinements = request.refinements
+    if not refinements:
+        raise HTTPException(status_code=400, detail="No refinements given")
+    if len(refinements) > MAX_BULK_REFINEMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_REFINEMENTS} refinements per request",
+        )
+    use_case_ids = [r.use_case_id for r in refinements]
+    if len(set(use_case_ids)) != len(use_case_ids):
+        raise HTTPException(
+            status_code=400, detail="Each use case can be refined once per request"
+        )
+
+    def refine():
+        return refine_use_cases(refinements)
+
+    async with cancel_on_disconnect(http_request) as cancel_token:
+        return await run_in_llm_executor(cancel_token, refine)
+
+
+def refine_use_cases(refinements: List[RefinementRequest]) -> dict:
+    """Batched refinement behind /use-case/refine/bulk"""
+    failed = []
+    pending = []
+    for refinement in refinements:
+        use_case = get_use_case_by_id(refinement.use_case_id)
+        if not use_case:
+            failed.append(
+                {
+                    "use_case_id": refinement.use_case_id,
+                    "refinement_type": refinement.refinement_type,
+                    "error": "Use case not found",
+                }
+            )
+            continue
+        pending.append((refinement, use_case))
+
+    refined = []
+    if pending:
+        print(f"\n✏️  BULK REFINEMENT: {len(pending)} use case(s)")
+        prompts = [
+            build_refinement_prompt(use_case, refinement.refinement_type)
+            for refinement, use_case in pending
+        ]
+        # One request, so one session's share of the bulk class
+        session_id = pending[0][1].get("session_id")
+
+        start_time = time.time()
+        try:
+            with admit_llm_work("bulk", session_id):
+                outputs = pipe(
+                    prompts,
+                    **REFINEMENT_GENERATION_KWARGS,
+                    logits_processor=json_logits_processor("object"),
+                )
+        except (HTTPException, GenerationCancelled):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Refinement failed: {str(e)}")
+        print(f"⏱️  Bulk refinement time: {time.time() - start_time:.1f}s")
+
+        sessions = {}
+        for (refinement, use_case), output in zip(pending, outputs):
+            sessions[refinement.use_case_id] = use_case.get("session_id")
+            try:
+                refined_use_case = parse_refined_use_case(output[0]["generated_text"])
+            except ValueError as e:
+                failed.append(
+                    {
+                        "use_case_id": refinement.use_case_id,
+                        "refinement_type": refinement.refinement_type,
+                        "error": str(e),
+                    }
+                )
+                continue
+            refined.append(
+                {
+                    "use_case_id": refinement.use_case_id,
+                    "refinement_type": refinement.refinement_type,
+                    "refined_use_case": refined_use_case,
+                }
+            )
+
+    # Write back together, so a failed write leaves every use case unchanged
+    if refined:
+        updated = update_use_cases(
+            [(item["use_case_id"], item["refined_use_case"]) for item in refined]
+        )
+        if not updated:
+            raise HTTPException(
+                status_code=500, detail="Refinement failed: could not store results"
+            )
+        refresh_use_case_embeddings(
+            [
+                {
+                    **item["refined_use_case"],
+                    "id": item["use_case_id"],
+                    "session_id": sessions[item["use_case_id"]],
+                }
+                for item in refined
+                if item["use_case_id"] in updated
+            ]
+        )
+
+    return {
+        "message": f"Refined {len(refined)} of {len(refinements)} use cases",
+        "refined": refined,
+        "failed": failed,
+    }
+
+
+def format_use_case_compact(use_case: dict) -> str:
+    """
+    Use case as short labelled lines for a prompt (no IDs, so use case
+    numbers do not end up in the answer)
+    """
+    lines = [f"Use case: {use_case.get('title', '')}"]
+    for field, label in (
+        ("preconditions", "Preconditions"),
+        ("main_flow", "Main flow"),
+        ("sub_flows", "Sub flows"),
+        ("alternate_flows", "Alternate flows"),
+        ("outcomes", "Outcomes"),
+        ("stakeholders", "Stakeholders"),
+    ):
+        values = use_case.get(field) or []
+        if values:
+            lines.append(f"{label}: {'; '.join(values)}")
+    return "\n".join(lines)
+
+
+def select_query_context(ranked: List[Tuple[dict, float]]) -> List[Tuple[dict, float]]:
+    """
+    The best ranked use cases that fit QUERY_CONTEXT_TOKENS (at most
+    QUERY_TOP_K); the best one is always included
+    """
+    count_tokens = token_counter or estimate_tokens
+    selected = []
+    used = 0
+    for use_case, score in ranked[:QUERY_TOP_K]:
+        tokens = count_tokens(format_use_case_compact(use_case))
+        if selected and used + tokens > QUERY_CONTEXT_TOKENS:
+            break
+        selected.append((use_case, score))
+        used += tokens
+    return selected
+
+
+@app.post("/query", dependencies=[Depends(require_models)])
 def query_requirements(request: QueryRequest):
     """Answer natural language questions about requirements"""
 
@@ -1986,22 +3608,10 @@ def query_requirements(request: QueryRequest):
             "relevant_use_cases": [],
         }
 
-    # Remove database IDs from use cases before sending to LLM
-    # This prevents use case numbers from appearing in explanations
-    use_cases_for_context = []
-    for uc in use_cases:
-        use_case_without_id = {
-            "title": uc.get("title", ""),
-            "preconditions": uc.get("preconditions", []),
-            "main_flow": uc.get("main_flow", []),
-            "sub_flows": uc.get("sub_flows", []),
-            "alternate_flows": uc.get("alternate_flows", []),
-            "outcomes": uc.get("outcomes", []),
-            "stakeholders": uc.get("stakeholders", []),
-        }
-        use_cases_for_context.append(use_case_without_id)
-
-    context = json.dumps(use_cases_for_context, indent=2)
+    # Only the use cases closest to the question go into the prompt
+    ranked = use_case_index.rank(request.session_id, use_cases, request.question)
+    selected = select_query_context(ranked)
+    context = "\n\n".join(format_use_case_compact(uc) for uc, _ in selected)
 
     prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
 
@@ -2022,14 +3632,15 @@ Provide a clear, helpful answer based on the use cases above. Do not include any
 """
 
     try:
-        outputs = pipe(
-            prompt,
-            max_new_tokens=400,
-            temperature=0.5,
-            top_p=0.9,
-            do_sample=True,
-            return_full_text=False,
-        )
+        with admit_llm_work("interactive", request.session_id):
+            outputs = pipe(
+                prompt,
+                max_new_tokens=400,
+                temperature=0.5,
+                top_p=0.9,
+                do_sample=True,
+                return_full_text=False,
+            )
 
         answer = outputs[0]["generated_text"].strip()
 
@@ -2047,20 +3658,19 @@ Provide a clear, helpful answer based on the use cases above. Do not include any
         answer = re.sub(r"\s*,\s*\.", ".", answer)
         answer = answer.strip()
 
-        # Find relevant use cases
-        question_lower = request.question.lower()
-        relevant = []
-
-        for uc in use_cases:
-            if any(word in uc["title"].lower() for word in question_lower.split()):
-                relevant.append(uc["title"])
+        relevant = [
+            uc["title"] for uc, score in selected if score >= QUERY_MIN_SIMILARITY
+        ]
 
         return {
             "answer": answer,
             "relevant_use_cases": relevant,
             "total_use_cases": len(use_cases),
+            "context_use_cases": len(selected),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
@@ -2112,6 +3722,9 @@ def export_markdown_endpoint(session_id: str):
 @app.delete("/session/{session_id}")
 def clear_session(session_id: str):
     """Clear all data for a specific session"""
+    # Stop its jobs first, so none stores use cases into the cleared session
+    job_manager.cancel_session(session_id)
+
     db_path = get_db_path()
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
@@ -2119,11 +3732,16 @@ def clear_session(session_id: str):
     # Delete session data
     c.execute("DELETE FROM conversation_history WHERE session_id = ?", (session_id,))
     c.execute("DELETE FROM use_cases WHERE session_id = ?", (session_id,))
+    c.execute("DELETE FROM use_case_embeddings WHERE session_id = ?", (session_id,))
     c.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
     c.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    c.execute("DELETE FROM extraction_jobs WHERE session_id = ?", (session_id,))
 
     conn.commit()
     conn.close()
+    use_case_index.forget(session_id)
+    if ann_index is not None:
+        ann_index.remove_session(session_id)
 
     return {"message": f"Session {session_id} cleared successfully"}
 
@@ -2168,14 +3786,16 @@ Requirements text:
 Generate a short, descriptive title (4-7 words):
 <|eot_id|><|start_header_id|>assistant<|end_header_id|>
 """
-        outputs = pipe(
-            prompt,
-            max_new_tokens=30,
-            temperature=0.3,
-            top_p=0.85,
-            do_sample=True,
-            return_full_text=False,
-        )
+        # Runs in the background once the session exists: after extraction
+        with priority_scope("bulk"):
+            outputs = pipe(
+                prompt,
+                max_new_tokens=30,
+                temperature=0.3,
+                top_p=0.85,
+                do_sample=True,
+                return_full_text=False,
+            )
 
         title = outputs[0]["generated_text"].strip()
         title = title.replace("\n", " ").strip().strip("\"'.,;:")
@@ -2190,6 +3810,29 @@ Generate a short, descriptive title (4-7 words):
     return generate_fallback_title(text, max_length)
 
 
+def schedule_session_title(session_id: str, text: str, fallback_title: str):
+    """
+    Generate the LLM title of a new session in the background and store it,
+    unless the session was deleted or retitled in the meantime
+    """
+
+    def improve_title():
+        try:
+            title = generate_session_title(text, use_llm=True)
+            if title == fallback_title:
+                return
+
+            context = get_session_context(session_id)
+            if context is None or context.get("session_title") != fallback_title:
+                return
+            update_session_context(session_id=session_id, session_title=title)
+            print(f"🏷️  Session {session_id} titled: {title}")
+        except Exception as e:
+            print(f"⚠️  Session title update failed: {e}")
+
+    return title_executor.submit(improve_title)
+
+
 def generate_fallback_title(text: str, max_length: int = 50) -> str:
     """
     Fallback method: Extract key concepts and build a title
@@ -2362,12 +4005,98 @@ def export_session(session_id: str):
     }
 
 
+@app.get("/token-budgets")
+def token_budget_params():
+    """Token budget parameters fitted from recorded generation lengths"""
+    return token_budgets.summary()
+
+
+@app.get("/admission/stats")
+def admission_stats():
+    """Active requests, queue depth and wait times per priority class"""
+    return admission.stats()
+
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    """Hit/miss counters and size of the LLM response cache"""
+    return llm_cache.stats() if llm_cache else {"enabled": False}
+
+
+@app.delete("/llm-cache")
+def clear_llm_cache():
+    """Drop every cached LLM response"""
+    if not llm_cache:
+        raise HTTPException(status_code=404, detail="LLM response cache is disabled")
+
+    removed = llm_cache.clear()
+    return {"message": "LLM response cache cleared", "removed": removed}
+
+
+@app.get("/models")
+def model_stats():
+    """Models in the shared registry with their load time and memory"""
+    return registry.stats()
+
+
+@app.get("/extraction-cache/stats")
+def extraction_cache_stats():
+    """Hit rate and size of the semantic extraction cache"""
+    return extraction_cache.stats() if extraction_cache else {"enabled": False}
+
+
+@app.delete("/extraction-cache")
+def clear_extraction_cache():
+    """Drop every cached extraction"""
+    if not extraction_cache:
+        raise HTTPException(status_code=404, detail="Extraction cache is disabled")
+
+    removed = extraction_cache.clear()
+    return {"message": "Extraction cache cleared", "removed": removed}
+
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, else 503"""
+    started_at = model_status["started_at"]
+    ready_at = model_status["ready_at"]
+    status = {
+        "ready": models_ready.is_set(),
+        "state": model_status["state"],
+        "model": MODEL_NAME,
+        "backend": LLM_BACKEND,
+        "load_seconds": (
+            round(ready_at - started_at, 1) if started_at and ready_at else None
+        ),
+        "warmup_ms": model_status["warmup_ms"],
+        "error": model_status["error"],
+    }
+    if status["ready"]:
+        return status
+
+    headers = None
+    if model_status["state"] != "failed":
+        headers = {"Retry-After": str(MODEL_LOAD_RETRY_AFTER)}
+    return JSONResponse(status_code=503, content=status, headers=headers)
+
+
+def describe_llm_backend() -> Dict:
+    """Backend info for /health; a remote backend may be unreachable"""
+    if llm_backend is None:
+        return {"backend": None}
+    try:
+        return llm_backend.info()
+    except InferenceServerError as e:
+        return {"backend": "remote", "address": INFERENCE_SERVER_ADDRESS, "error": str(e)}
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint with system info"""
     return {
         "status": "healthy",
         "model": MODEL_NAME,
+        "model_state": model_status["state"],
         "extraction_method": "smart_single_stage_with_chunking",
         "performance": "Intelligent estimation + dynamic token budgets",
         "features": [
@@ -2392,9 +4121,21 @@ def health_check():
         "max_file_size": "10MB",
         "chunking": {
             "enabled": True,
-            "max_tokens_per_chunk": 3000,
+            # Whole prompt; template and memory context come off each chunk
+            "max_prompt_tokens": CHUNK_MAX_PROMPT_TOKENS,
             "strategies": ["auto", "section", "paragraph", "sentence"],
         },
+        "batching": scheduler.stats() if scheduler else {"enabled": False},
+        "admission": admission.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else {"enabled": False},
+        "prefix_cache": prefix_cache.stats() if prefix_cache else {"enabled": False},
+        "ann_index": ann_index.stats() if ann_index else {"enabled": False},
+        "extraction_cache": (
+            extraction_cache.stats() if extraction_cache else {"enabled": False}
+        ),
+        "llm_backend": describe_llm_backend(),
+        "models": registry.stats(),
+        "constrained_decoding": json_processors is not None,
         "smart_estimation": {
             "enabled": True,
             "analyzes": ["action_verbs", "actors", "sentence_structure", "list_items"],
@@ -2421,15 +4162,20 @@ def root():
         "description": "Converts unstructured requirements to structured use cases with intelligent estimation",
         "endpoints": {
             "extraction_text": "POST /parse_use_case_rag/",
+            "extraction_stream": "POST /parse_use_case_rag/stream",
             "extraction_document": "POST /parse_use_case_document/",
+            "extraction_jobs": "POST /jobs/document, GET /jobs/{job_id}, GET /jobs/{job_id}/events",
             "sessions": "POST /session/create, GET /sessions/",
             "history": "GET /session/{session_id}/history",
             "metrics": "GET /session/{session_id}/metrics",
             "query": "POST /query",
             "refine": "POST /use-case/refine",
+            "refine_bulk": "POST /use-case/refine/bulk",
+            "similar": "GET /use-case/{use_case_id}/similar",
             "conflicts": "GET /session/{session_id}/conflicts",
             "exports": "GET /session/{session_id}/export/{format}",
             "health": "GET /health",
+            "ready": "GET /ready",
         },
         "key_improvements": {
             "v4.0_smart_estimation": {
@@ -0,0 +1,177 @@
+# -----------------------------------------------------------------------------
+# File: model_registry.py
+# Description: In-process model registry for ReqEngine - hands out shared,
+#              lazily loaded generator, tokenizer and embedder instances.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Model Registry
+Every module gets its models from one registry, so weights are loaded once
+per process however many modules (main.py, rag_utils.py, ...) use them.
+
+A model is registered under a name with a loader. The first get() runs the
+loader, and threads asking at the same time wait for that one load instead
+of loading their own copy. Already built instances (a mock, or the client
+of an inference server) are installed with put().
+
+stats() reports per model whether it is loaded, how long loading took and
+the memory held by its weights.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Sentence embedder shared by duplicate detection, /query and the vector store
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+def model_memory_bytes(instance: Any) -> Optional[int]:
+    """
+    Bytes held by a model's weights (parameters and buffers), or None if
+    they cannot be measured (tokenizers, remote clients)
+    """
+    # torch modules, including SentenceTransformer
+    if hasattr(instance, "parameters") and hasattr(instance, "buffers"):
+        try:
+            tensors = list(instance.parameters()) + list(instance.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except Exception:
+            return None
+    # HF pipelines and backends wrapping one
+    inner = getattr(instance, "model", None)
+    if inner is not None and inner is not instance:
+        return model_memory_bytes(inner)
+    # llama.cpp maps the GGUF file
+    model_path = getattr(instance, "model_path", None)
+    if isinstance(model_path, str) and os.path.exists(model_path):
+        return os.path.getsize(model_path)
+    return None
+
+
+def model_device(instance: Any) -> Optional[str]:
+    """Device of a model's first parameter (None if it has none)"""
+    if hasattr(instance, "parameters"):
+        try:
+            return str(next(instance.parameters()).device)
+        except Exception:
+            return None
+    inner = getattr(instance, "model", None)
+    if inner is not None and inner is not instance:
+        return model_device(inner)
+    return None
+
+
+class _Entry:
+    def __init__(self, loader: Optional[Callable[[], Any]]):
+        self.loader = loader
+        self.instance = None
+        self.load_seconds: Optional[float] = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Named, lazily loaded model instances shared across modules"""
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """
+        Set how a model is loaded; an instance that is already loaded is
+        kept (unload() it first to load it differently)
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = _Entry(loader)
+            else:
+                entry.loader = loader
+
+    def put(self, name: str, instance: Any):
+        """Install an already built instance"""
+        with self._lock:
+            entry = self._entries.setdefault(name, _Entry(None))
+        with entry.lock:
+            entry.instance = instance
+            entry.load_seconds = None
+
+    def get(self, name: str) -> Any:
+        """The shared instance, loaded on first use"""
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"No model registered as '{name}'")
+        if entry.instance is not None:
+            return entry.instance
+
+        with entry.lock:
+            if entry.instance is None:
+                if entry.loader is None:
+                    raise KeyError(f"Model '{name}' has no loader")
+                start = time.time()
+                print(f"📦 Loading model '{name}'...")
+                entry.instance = entry.loader()
+                entry.load_seconds = time.time() - start
+                entry.loads += 1
+                print(f"📦 Model '{name}' loaded in {entry.load_seconds:.1f}s")
+        return entry.instance
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+        return entry is not None and entry.instance is not None
+
+    def unload(self, name: str):
+        """Drop the shared instance; the next get() loads it again"""
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None:
+            with entry.lock:
+                entry.instance = None
+
+    def stats(self) -> Dict:
+        """Per model: loaded, type, device, load time and weight memory"""
+        with self._lock:
+            entries = dict(self._entries)
+
+        models = {}
+        measured = 0
+        for name, entry in sorted(entries.items()):
+            instance = entry.instance
+            memory = model_memory_bytes(instance) if instance is not None else None
+            measured += memory or 0
+            models[name] = {
+                "loaded": instance is not None,
+                "type": type(instance).__name__ if instance is not None else None,
+                "device": model_device(instance) if instance is not None else None,
+                "load_seconds": (
+                    round(entry.load_seconds, 1)
+                    if entry.load_seconds is not None
+                    else None
+                ),
+                "loads": entry.loads,
+                "memory_mb": (
+                    round(memory / (1024 * 1024), 1) if memory is not None else None
+                ),
+            }
+        return {"models": models, "total_memory_mb": round(measured / (1024 * 1024), 1)}
+
+
+def load_default_embedder():
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(DEFAULT_EMBEDDING_MODEL)
+
+
+# The process-wide registry; the embedder loads itself on first use, the
+# generator and tokenizer are registered by whoever loads them (main.py)
+registry = ModelRegistry()
+registry.register("embedder", load_default_embedder)
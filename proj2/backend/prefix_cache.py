@@ -0,0 +1,285 @@
+# -----------------------------------------------------------------------------
+# File: prefix_cache.py
+# Description: Prompt-prefix KV caching for ReqEngine - prefills the constant
+#              system block of each prompt template once and reuses it.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Prefix KV Cache
+Reuses past_key_values for static prompt prefixes so prefill cost only
+scales with the variable part of each prompt
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import Cache, DynamicCache
+
+from constrained_decoding import bind_logits_processors
+
+# Pipeline-only kwargs that model.generate() does not understand
+PIPELINE_ONLY_KWARGS = (
+    "return_full_text",
+    "batch_size",
+    "clean_up_tokenization_spaces",
+)
+
+
+def as_dynamic_cache(past_key_values) -> DynamicCache:
+    """Cache object for past_key_values in the legacy tuple format"""
+    if isinstance(past_key_values, Cache):
+        return past_key_values
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(past_key_values)
+    return DynamicCache(past_key_values)
+
+
+def repeat_cache(past_key_values, batch_size: int):
+    """Cache with every row repeated batch_size times"""
+    if hasattr(past_key_values, "batch_repeat_interleave"):
+        past_key_values.batch_repeat_interleave(batch_size)
+        return past_key_values
+    # DynamicCache of transformers < 4.42 cannot repeat itself
+    return as_dynamic_cache(
+        tuple(
+            (
+                keys.repeat_interleave(batch_size, 0),
+                values.repeat_interleave(batch_size, 0),
+            )
+            for keys, values in past_key_values.to_legacy_cache()
+        )
+    )
+
+
+class PrefixCachedPipeline:
+    """
+    Text-generation callable that reuses KV caches for registered prefixes.
+
+    Prompts starting with a registered prefix are generated with
+    model.generate() on top of a copy of that prefix's cache. Everything else
+    is passed straight to the wrapped pipeline.
+    """
+
+    def __init__(self, pipe, max_cached_prefixes: int = 8):
+        """
+        Initialize prefix cache
+
+        Args:
+            pipe: HF text-generation pipeline (provides model and tokenizer)
+            max_cached_prefixes: How many prefix caches to keep on device
+        """
+        self.pipe = pipe
+        self.model = pipe.model
+        self.tokenizer = pipe.tokenizer
+        self.max_cached_prefixes = max_cached_prefixes
+
+        self._prefixes: List[str] = []
+        # Per-request prefixes and how many callers are using each
+        self._temporary: Dict[str, int] = {}
+        self._cache: "OrderedDict[str, Tuple[torch.Tensor, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.prefill_tokens_saved = 0
+
+    def register_prefix(self, prefix: str):
+        """
+        Register a constant prompt prefix.
+
+        The prefix should end on a special token (e.g. <|end_header_id|>) so
+        that tokenizing prefix and suffix separately matches the full prompt.
+        """
+        if prefix and prefix not in self._prefixes:
+            # Swapped in whole so match_prefix never sees a half-updated list;
+            # the longest prefix wins when several match
+            self._prefixes = sorted(self._prefixes + [prefix], key=len, reverse=True)
+
+    @contextmanager
+    def shared_prefix(self, prefix: str):
+        """
+        Register a per-request prefix (e.g. a whole document) while the block
+        runs, so prompts forked from it prefill the prefix only once.
+
+        The prefix and its KV cache are dropped when the last caller using it
+        leaves the block. Prefixes registered with register_prefix() stay.
+        """
+        with self._lock:
+            if prefix in self._temporary:
+                self._temporary[prefix] += 1
+            elif prefix in self._prefixes:
+                prefix = None  # permanent, nothing to release
+            else:
+                self._temporary[prefix] = 1
+                self.register_prefix(prefix)
+
+        try:
+            yield
+        finally:
+            if prefix is not None:
+                with self._lock:
+                    self._temporary[prefix] -= 1
+                    if self._temporary[prefix] == 0:
+                        del self._temporary[prefix]
+                        self._prefixes = [p for p in self._prefixes if p != prefix]
+                        self._cache.pop(prefix, None)
+
+    def match_prefix(self, prompt: str) -> Optional[str]:
+        """Return the registered prefix the prompt starts with, if any"""
+        for prefix in self._prefixes:
+            if prompt.startswith(prefix):
+                return prefix
+        return None
+
+    def stats(self) -> Dict:
+        """Return cache counters"""
+        return {
+            "registered_prefixes": len(self._prefixes) - len(self._temporary),
+            "shared_prefixes": len(self._temporary),
+            "cached_prefixes": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "prefill_tokens_saved": self.prefill_tokens_saved,
+        }
+
+    def __call__(self, text_inputs, **generate_kwargs):
+        if isinstance(text_inputs, str):
+            return self._generate_many([text_inputs], generate_kwargs)[0]
+        return self._generate_many(list(text_inputs), generate_kwargs)
+
+    def __getattr__(self, name):
+        if name == "pipe":
+            raise AttributeError(name)
+        return getattr(self.pipe, name)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _generate_many(self, prompts: List[str], generate_kwargs: Dict) -> List:
+        results = [None] * len(prompts)
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, prompt in enumerate(prompts):
+            groups.setdefault(self.match_prefix(prompt), []).append(i)
+
+        for prefix, indices in groups.items():
+            batch = [prompts[i] for i in indices]
+            if prefix is None:
+                self.misses += len(batch)
+                outputs = self._call_pipe(batch, generate_kwargs)
+            else:
+                self.hits += len(batch)
+                outputs = self._generate_with_prefix(prefix, batch, generate_kwargs)
+            for i, output in zip(indices, outputs):
+                results[i] = output
+
+        return results
+
+    def _call_pipe(self, prompts: List[str], generate_kwargs: Dict) -> List:
+        if len(prompts) == 1:
+            return [self.pipe(prompts[0], **generate_kwargs)]
+        kwargs = dict(generate_kwargs)
+        kwargs["batch_size"] = len(prompts)
+        return self.pipe(prompts, **kwargs)
+
+    def _get_prefix_cache(self, prefix: str):
+        """Prefill the prefix once and keep its past_key_values"""
+        with self._lock:
+            if prefix in self._cache:
+                self._cache.move_to_end(prefix)
+                return self._cache[prefix]
+
+            prefix_ids = self.tokenizer(
+                prefix, return_tensors="pt", add_special_tokens=False
+            ).input_ids.to(self.model.device)
+
+            # Older models return a legacy tuple unless handed a Cache
+            with torch.inference_mode():
+                outputs = self.model(
+                    input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True
+                )
+
+            self._cache[prefix] = (
+                prefix_ids,
+                as_dynamic_cache(outputs.past_key_values),
+            )
+            while len(self._cache) > self.max_cached_prefixes:
+                self._cache.popitem(last=False)
+
+            print(f"🧠 Cached KV for prompt prefix ({prefix_ids.shape[1]} tokens)")
+            return self._cache[prefix]
+
+    def _generate_with_prefix(
+        self, prefix: str, prompts: List[str], generate_kwargs: Dict
+    ) -> List:
+        prefix_ids, prefix_kv = self._get_prefix_cache(prefix)
+        device = prefix_ids.device
+        batch_size = len(prompts)
+        prefix_len = prefix_ids.shape[1]
+
+        # Suffixes are left-padded so padding sits between prefix and suffix;
+        # the attention mask hides it and positions follow the mask
+        suffixes = [p[len(prefix) :] for p in prompts]
+        original_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            encoded = self.tokenizer(
+                suffixes,
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False,
+            ).to(device)
+        finally:
+            self.tokenizer.padding_side = original_side
+
+        input_ids = torch.cat([prefix_ids.repeat(batch_size, 1), encoded.input_ids], 1)
+        attention_mask = torch.cat(
+            [
+                torch.ones(
+                    (batch_size, prefix_len),
+                    dtype=encoded.attention_mask.dtype,
+                    device=device,
+                ),
+                encoded.attention_mask,
+            ],
+            dim=1,
+        )
+
+        # generate() extends the cache in place, so work on a copy
+        past_key_values = copy.deepcopy(prefix_kv)
+        if batch_size > 1:
+            past_key_values = repeat_cache(past_key_values, batch_size)
+
+        return_full_text = generate_kwargs.get("return_full_text", True)
+        kwargs = bind_logits_processors(
+            {k: v for k, v in generate_kwargs.items() if k not in PIPELINE_ONLY_KWARGS}
+        )
+        kwargs.setdefault("pad_token_id", self.tokenizer.pad_token_id)
+
+        with torch.inference_mode():
+            sequences = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                **kwargs,
+            )
+
+        self.prefill_tokens_saved += prefix_len * batch_size
+
+        outputs = []
+        for prompt, row in zip(prompts, sequences):
+            text = self.tokenizer.decode(
+                row[input_ids.shape[1] :], skip_special_tokens=True
+            )
+            if return_full_text:
+                text = prompt + text
+            outputs.append([{"generated_text": text}])
+        return outputs
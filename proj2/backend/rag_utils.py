@@ -12,11 +12,14 @@ import os
 from typing import Dict, List
 
 import nltk
+import numpy as np
+
+from model_registry import registry
 
 # Make ChromaDB import optional for testing
 try:
     import chromadb
-    from chromadb.utils import embedding_functions
+    from chromadb.api.types import EmbeddingFunction
     from sentence_transformers import SentenceTransformer
 
     CHROMADB_AVAILABLE = True
@@ -91,6 +94,21 @@ def semantic_chunk(text: str, chunk_size: int = 15, overlap: int = 5) -> List[st
     return chunks
 
 
+# --- Embed with the process-wide embedder instead of loading another copy ---
+if CHROMADB_AVAILABLE:
+
+    class SharedEmbeddingFunction(EmbeddingFunction):
+        """ChromaDB embedding function backed by the registry's embedder"""
+
+        def __init__(self):
+            pass
+
+        def __call__(self, input):
+            # Plain lists, like SentenceTransformerEmbeddingFunction returns
+            vectors = registry.get("embedder").encode(list(input))
+            return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+
 # --- Initialize vector DB with session support ---
 def init_vector_db(session_id: str = None):
     """Initialize a vector DB collection, optionally session-specific"""
@@ -101,9 +119,7 @@ def init_vector_db(session_id: str = None):
 
     collection = client.get_or_create_collection(
         name=collection_name,
-        embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        ),
+        embedding_function=SharedEmbeddingFunction(),
     )
     return collection
 
@@ -19,7 +19,7 @@ setup(
         "fastapi==0.104.1",
         "uvicorn==0.24.0",
         "python-multipart==0.0.6",
-        "transformers>=4.38.0",
+        "transformers>=4.39.0",
         "sentence-transformers>=2.5.0",
         "accelerate>=0.27.0",
         "huggingface-hub>=0.20.0",
@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+# File: stopping_criteria.py
+# Description: Generation stopping criteria for ReqEngine - ends decoding as
+#              soon as the requested number of JSON use cases is complete.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+JSON Object Stopping Criteria
+Stops generation once enough top-level objects of the output array have
+closed, or the array itself has closed
+"""
+
+import re
+from typing import Optional
+
+import torch
+from transformers import StoppingCriteria
+
+from json_stream import count_closed_objects
+
+# Llama 3 chat prompts end with the assistant header; generated text follows it
+ASSISTANT_MARKER = "<|start_header_id|>assistant<|end_header_id|>"
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """
+    Stop each sequence after `max_objects` closed objects or a closed array.
+
+    The criteria keeps no per-run state: the generated part of every row is
+    found again from the last assistant marker, so one instance can be shared
+    by batched and prefix-cached calls. Equal settings compare equal, which
+    lets the batching scheduler group requests that use them.
+
+    With a limit_pattern each row reads its own limit from its prompt, so
+    prompts asking for different numbers of objects still share a batch.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        max_objects: int,
+        marker: str = ASSISTANT_MARKER,
+        limit_pattern: Optional[str] = None,
+    ):
+        """
+        Initialize stopping criteria
+
+        Args:
+            tokenizer: Tokenizer used for generation
+            max_objects: Number of closed top-level objects to stop at
+            marker: Text that ends the prompt, right before the generated output
+            limit_pattern: Regex whose first group, last found in a row's
+                prompt, lowers max_objects for that row
+        """
+        self.tokenizer = tokenizer
+        self.max_objects = max_objects
+        self.marker = marker
+        self.limit_pattern = limit_pattern
+        self._limit_regex = re.compile(limit_pattern) if limit_pattern else None
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores, **kwargs
+    ) -> torch.BoolTensor:
+        done = [self._row_done(row) for row in input_ids]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, JsonObjectStoppingCriteria)
+            and self.tokenizer is other.tokenizer
+            and self.max_objects == other.max_objects
+            and self.marker == other.marker
+            and self.limit_pattern == other.limit_pattern
+        )
+
+    def __hash__(self):
+        return hash(
+            (id(self.tokenizer), self.max_objects, self.marker, self.limit_pattern)
+        )
+
+    def cache_key(self):
+        """Settings that affect the output, for the response cache"""
+        return {
+            "max_objects": self.max_objects,
+            "marker": self.marker,
+            "limit_pattern": self.limit_pattern,
+        }
+
+    def row_limit(self, prompt: str) -> int:
+        """Closed objects to stop at for a row with this prompt"""
+        if self._limit_regex is None:
+            return self.max_objects
+        found = self._limit_regex.findall(prompt)
+        if not found:
+            return self.max_objects
+        return min(self.max_objects, int(found[-1]))
+
+    def _row_done(self, row: torch.Tensor) -> bool:
+        # Objects and the array can only close on a token containing } or ]
+        last = self.tokenizer.decode(row[-1:], skip_special_tokens=True)
+        if "}" not in last and "]" not in last:
+            return False
+
+        return self.text_done(self.tokenizer.decode(row, skip_special_tokens=False))
+
+    def text_done(self, text: str) -> bool:
+        """
+        Check prompt plus generated text without token ids, for backends
+        that only expose text
+        """
+        start = text.rfind(self.marker)
+        if start == -1:
+            return False
+
+        objects, array_closed = count_closed_objects(text[start + len(self.marker) :])
+        return array_closed or objects >= self.row_limit(text[:start])
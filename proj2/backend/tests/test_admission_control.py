@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+# File: test_admission_control.py
+# Description: Test suite for admission_control.py - checks per-class limits,
+#              queue rejection, session fairness and wait timeouts.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for priority-aware admission control"""
+
+import threading
+import time
+
+import pytest
+
+from admission_control import (AdmissionController, AdmissionRejected,
+                               current_priority, parse_limits, priority_rank,
+                               priority_scope)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def queued(controller, priority):
+    return controller.stats()["classes"][priority]["queued"]
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    """Test a request waits for a slot and the next one is rejected"""
+    controller = AdmissionController({"bulk": (1, 1)})
+    slot = controller.acquire("bulk", "a")
+
+    waiter = threading.Thread(target=lambda: controller.acquire("bulk", "b").release())
+    waiter.start()
+    wait_until(lambda: queued(controller, "bulk") == 1)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("bulk", "c")
+    assert excinfo.value.reason == "is full"
+    assert excinfo.value.retry_after >= 1
+    with pytest.raises(AdmissionRejected):
+        controller.check("bulk")
+
+    # Other classes are not affected
+    with controller.admit("interactive", "c"):
+        pass
+
+    slot.release()
+    slot.release()
+    waiter.join(timeout=2)
+
+    stats = controller.stats()["classes"]["bulk"]
+    assert stats["active"] == 0
+    assert stats["admitted"] == 2
+    assert stats["rejected"] == 2
+
+
+def test_sessions_take_turns():
+    """Test a waiting session is admitted before another request of the busy one"""
+    controller = AdmissionController({"extraction": (1, 8)})
+    order = []
+    first = controller.acquire("extraction", "a")
+
+    def run(session):
+        with controller.admit("extraction", session):
+            order.append(session)
+
+    threads = []
+    for session in ("a", "a", "b"):
+        threads.append(threading.Thread(target=run, args=(session,)))
+        threads[-1].start()
+        wait_until(lambda: queued(controller, "extraction") == len(threads))
+
+    first.release()
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert order == ["b", "a", "a"]
+
+
+def test_wait_times_out():
+    """Test a request that gets no slot within max_wait_s is rejected"""
+    controller = AdmissionController({"interactive": (1, 4)}, max_wait_s=0.05)
+
+    with controller.admit("interactive", "a"):
+        with pytest.raises(AdmissionRejected, match="wait timed out"):
+            controller.acquire("interactive", "b")
+
+    stats = controller.stats()["classes"]["interactive"]
+    assert stats["timed_out"] == 1
+    assert stats["queued"] == 0
+
+
+def test_parse_limits():
+    """Test limit strings override the defaults"""
+    limits = parse_limits("interactive=8/64, bulk=2")
+
+    assert limits["interactive"] == (8, 64)
+    assert limits["bulk"] == (2, 4)
+    assert limits["extraction"] == (2, 16)
+    with pytest.raises(ValueError):
+        parse_limits("urgent=1/1")
+
+
+def test_priority_scope():
+    """Test the current class is scoped and ranked"""
+    assert current_priority() == "extraction"
+    with priority_scope("interactive"):
+        assert priority_rank() == 0
+    assert priority_rank() == 1
+    assert priority_rank("bulk") == 2
+    with pytest.raises(ValueError):
+        with priority_scope("urgent"):
+            pass
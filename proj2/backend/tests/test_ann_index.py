@@ -0,0 +1,155 @@
+# -----------------------------------------------------------------------------
+# File: test_ann_index.py
+# Description: Test suite for ann_index.py - checks search with session
+#              filters, training, incremental updates and persistence.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the ANN index"""
+
+import numpy as np
+import pytest
+
+from ann_index import ANNIndex, spherical_kmeans
+from llm_backends import MockEmbedder
+
+
+def embed(*texts):
+    return MockEmbedder().encode(list(texts), convert_to_tensor=True).numpy()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ANNIndex(str(tmp_path / "ann.db"), model="mock:1")
+
+
+def test_search_with_threshold_and_session_filters(index):
+    """Test matches are filtered by similarity and by session"""
+    login, orders, reports = embed(
+        "User logs in", "Customer places order", "Admin exports reports"
+    )
+    index.add("s1", {1: login, 2: orders})
+    index.add("s2", {3: login, 4: reports})
+
+    hits = index.search(login, threshold=0.85)
+    assert {hit["use_case_id"] for hit in hits} == {1, 3}
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+    hits = index.search(login, threshold=0.85, exclude_session_id="s1")
+    assert [(hit["use_case_id"], hit["session_id"]) for hit in hits] == [(3, "s2")]
+    assert index.search(login, threshold=0.85, session_ids=["s3"]) == []
+    assert [h["use_case_id"] for h in index.search(orders, 0.0, limit=1)] == [2]
+
+
+def test_update_and_remove(index):
+    """Test re-adding a use case replaces its vector and removals drop it"""
+    login, orders = embed("User logs in", "Customer places order")
+    index.add("s1", {1: login, 2: orders})
+
+    index.add("s1", {1: orders})
+    assert len(index) == 2
+    assert [h["use_case_id"] for h in index.search(login, 0.85)] == []
+
+    assert index.remove([2, 99]) == 1
+    assert index.remove_session("s1") == 1
+    assert len(index) == 0
+
+    with pytest.raises(ValueError):
+        index.add("s1", {5: np.ones(8)})
+
+
+def test_trained_index_finds_near_duplicates(tmp_path):
+    """Test search probes the closest lists once centroids are trained"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 32)).astype(np.float32)
+    index = ANNIndex(
+        str(tmp_path / "ann.db"),
+        model="m",
+        n_probe=4,
+        train_min=256,
+        background_training=False,
+    )
+    for start in range(0, 400, 100):
+        index.add("s1", {i: vectors[i] for i in range(start, start + 100)})
+
+    stats = index.stats()
+    assert stats["lists"] == 17  # sqrt(300)
+    assert stats["trained_size"] == 300
+
+    noisy = vectors[123] + rng.normal(scale=0.05, size=32)
+    hits = index.search(noisy, threshold=0.9)
+    assert hits[0]["use_case_id"] == 123
+    assert index.stats()["avg_scanned"] < 400
+
+
+def test_index_persists_and_resets_on_model_change(tmp_path):
+    """Test vectors and centroids survive reopening, but not a new model"""
+    path = str(tmp_path / "ann.db")
+    vectors = np.random.default_rng(1).normal(size=(20, 16))
+    index = ANNIndex(path, model="m1", train_min=10)
+    index.add("s1", {i: vectors[i] for i in range(20)})
+    index.join_training()
+
+    reopened = ANNIndex(path, model="m1", train_min=10)
+    assert len(reopened) == 20
+    assert reopened.stats()["lists"] == index.stats()["lists"] > 1
+    assert reopened.search(vectors[7], 0.99)[0]["use_case_id"] == 7
+
+    assert len(ANNIndex(path, model="m2")) == 0
+
+
+def test_background_training_keeps_every_entry_searchable(tmp_path):
+    """Test adds during a background training land in searchable lists"""
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(600, 16)).astype(np.float32)
+    index = ANNIndex(str(tmp_path / "ann.db"), model="m", n_probe=2, train_min=300)
+    index.add("s1", {i: vectors[i] for i in range(300)})
+    for start in range(300, 600, 50):
+        index.add("s1", {i: vectors[i] for i in range(start, start + 50)})
+        assert index.search(vectors[start], 0.99)[0]["use_case_id"] == start
+    index.join_training()
+
+    stats = index.stats()
+    assert stats["trainings"] == 1
+    assert stats["lists"] == 17  # sqrt(300)
+    assert not stats["training"]
+    for i in range(0, 600, 25):
+        assert index.search(vectors[i], 0.99)[0]["use_case_id"] == i
+
+
+def test_interrupted_training_is_repaired_on_open(tmp_path):
+    """Test lists of a training that never finished are dropped on reopening"""
+    path = str(tmp_path / "ann.db")
+    vectors = np.random.default_rng(4).normal(size=(40, 8)).astype(np.float32)
+    index = ANNIndex(path, model="m", train_min=10, background_training=False)
+    index.add("s1", {i: vectors[i] for i in range(40)})
+    lists = index.stats()["lists"]
+
+    # A retraining that added its centroids and moved some entries
+    index._conn.execute(
+        "INSERT INTO ann_centroids (list_id, vector) VALUES (?, ?)",
+        (1000, vectors[0].tobytes()),
+    )
+    index._conn.execute("UPDATE ann_entries SET list_id = 1000 WHERE use_case_id < 5")
+    index._conn.commit()
+
+    reopened = ANNIndex(path, model="m", n_probe=1, train_min=10)
+    assert reopened.stats()["lists"] == lists
+    for i in range(5):
+        assert reopened.search(vectors[i], 0.99)[0]["use_case_id"] == i
+
+
+def test_spherical_kmeans_separates_clusters():
+    """Test k-means centroids land on well separated clusters"""
+    rng = np.random.default_rng(2)
+    centers = np.eye(3, dtype=np.float32)
+    points = np.repeat(centers, 20, axis=0) + rng.normal(scale=0.05, size=(60, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+
+    centroids = spherical_kmeans(points.astype(np.float32), 3)
+
+    # Every cluster has a centroid next to it
+    assert ((centers @ centroids.T).max(axis=1) > 0.95).all()
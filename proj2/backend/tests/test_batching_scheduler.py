@@ -0,0 +1,261 @@
+# -----------------------------------------------------------------------------
+# File: test_batching_scheduler.py
+# Description: Test suite for batching_scheduler.py - tests dynamic batching
+#              of concurrent prompts in front of the text-generation pipeline.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the dynamic batching scheduler"""
+
+import threading
+import time
+
+import pytest
+
+from batching_scheduler import BatchingScheduler, freeze_kwargs
+from cancellation import (CancelToken, GenerationCancelled, cancel_scope,
+                          current_cancel_token)
+from llm_backends import MockBackend
+
+
+class FakePipe:
+    """Records calls and echoes prompts back like the HF pipeline"""
+
+    def __init__(self, fail_batches=False):
+        self.calls = []
+        self.fail_batches = fail_batches
+        self.lock = threading.Lock()
+
+    def __call__(self, text_inputs, **kwargs):
+        with self.lock:
+            self.calls.append((text_inputs, kwargs))
+        if isinstance(text_inputs, list):
+            if self.fail_batches:
+                raise RuntimeError("CUDA out of memory")
+            return [[{"generated_text": f"out:{p}"}] for p in text_inputs]
+        return [{"generated_text": f"out:{text_inputs}"}]
+
+
+def run_concurrently(scheduler, prompts, **kwargs):
+    """Submit prompts from separate threads and collect results in order"""
+    results = [None] * len(prompts)
+    barrier = threading.Barrier(len(prompts))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = scheduler(prompts[i], **kwargs)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_single_call_matches_pipeline_output():
+    """Test that a lone prompt is passed straight through"""
+    pipe = FakePipe()
+    scheduler = BatchingScheduler(pipe, max_batch_size=4, max_wait_ms=1)
+
+    output = scheduler("hello", max_new_tokens=10)
+
+    assert output == [{"generated_text": "out:hello"}]
+    assert pipe.calls == [("hello", {"max_new_tokens": 10})]
+    scheduler.shutdown()
+
+
+def test_concurrent_calls_are_batched():
+    """Test that concurrent prompts run as one batch and get their own results"""
+    pipe = FakePipe()
+    scheduler = BatchingScheduler(pipe, max_batch_size=4, max_wait_ms=200)
+
+    prompts = ["a", "b", "c", "d"]
+    results = run_concurrently(scheduler, prompts, max_new_tokens=10)
+
+    assert results == [[{"generated_text": f"out:{p}"}] for p in prompts]
+    assert len(pipe.calls) == 1
+    batch_inputs, batch_kwargs = pipe.calls[0]
+    assert sorted(batch_inputs) == prompts
+    assert batch_kwargs["batch_size"] == 4
+    assert batch_kwargs["max_new_tokens"] == 10
+    assert scheduler.stats()["largest_batch"] == 4
+    scheduler.shutdown()
+
+
+def test_max_batch_size_is_respected():
+    """Test that batches never exceed the configured size"""
+    pipe = FakePipe()
+    scheduler = BatchingScheduler(pipe, max_batch_size=2, max_wait_ms=200)
+
+    results = run_concurrently(scheduler, ["a", "b", "c", "d", "e"])
+
+    assert [r[0]["generated_text"] for r in results] == [
+        "out:a",
+        "out:b",
+        "out:c",
+        "out:d",
+        "out:e",
+    ]
+    for text_inputs, _ in pipe.calls:
+        size = len(text_inputs) if isinstance(text_inputs, list) else 1
+        assert size <= 2
+    scheduler.shutdown()
+
+
+def test_different_kwargs_are_not_mixed():
+    """Test that prompts with different generation kwargs run separately"""
+    pipe = FakePipe()
+    scheduler = BatchingScheduler(pipe, max_batch_size=4, max_wait_ms=50)
+
+    futures = [
+        scheduler.submit("a", max_new_tokens=10),
+        scheduler.submit("b", max_new_tokens=20),
+        scheduler.submit("c", max_new_tokens=10),
+    ]
+    results = [f.result() for f in futures]
+
+    assert [r[0]["generated_text"] for r in results] == ["out:a", "out:b", "out:c"]
+    for text_inputs, kwargs in pipe.calls:
+        if isinstance(text_inputs, list):
+            assert kwargs["max_new_tokens"] == 10
+            assert sorted(text_inputs) == ["a", "c"]
+    scheduler.shutdown()
+
+
+def test_list_input_returns_list_of_outputs():
+    """Test that list input mirrors the HF pipeline's batched return shape"""
+    pipe = FakePipe()
+    scheduler = BatchingScheduler(pipe, max_batch_size=4, max_wait_ms=50)
+
+    outputs = scheduler(["x", "y"], max_new_tokens=5)
+
+    assert outputs == [[{"generated_text": "out:x"}], [{"generated_text": "out:y"}]]
+    scheduler.shutdown()
+
+
+def test_failed_batch_retries_individually():
+    """Test that a failing batch falls back to single-prompt generation"""
+    pipe = FakePipe(fail_batches=True)
+    scheduler = BatchingScheduler(pipe, max_batch_size=4, max_wait_ms=50)
+
+    futures = [scheduler.submit(p) for p in ["a", "b"]]
+    results = [f.result() for f in futures]
+
+    assert [r[0]["generated_text"] for r in results] == ["out:a", "out:b"]
+    scheduler.shutdown()
+
+
+def test_errors_propagate_to_caller():
+    """Test that generation errors surface on the caller's future"""
+
+    def broken_pipe(text_inputs, **kwargs):
+        raise ValueError("boom")
+
+    scheduler = BatchingScheduler(broken_pipe, max_batch_size=2, max_wait_ms=1)
+
+    with pytest.raises(ValueError, match="boom"):
+        scheduler("hello")
+    scheduler.shutdown()
+
+
+def test_attribute_access_is_delegated():
+    """Test that pipeline attributes such as tokenizer remain reachable"""
+    pipe = FakePipe()
+    pipe.tokenizer = "tok"
+    scheduler = BatchingScheduler(pipe)
+
+    assert scheduler.tokenizer == "tok"
+
+
+def test_freeze_kwargs():
+    """Test grouping keys for generation kwargs"""
+    assert freeze_kwargs({"a": 1, "b": [1, 2]}) == freeze_kwargs({"b": [1, 2], "a": 1})
+    assert freeze_kwargs({"a": 1}) != freeze_kwargs({"a": 2})
+
+    marker = object.__new__(type("Unhashable", (), {"__hash__": None}))
+    assert freeze_kwargs(marker) == ("id", id(marker))
+
+
+def test_higher_priority_requests_run_first():
+    """Test queued requests are taken by priority, then age"""
+    pipe = FakePipe()
+    release = threading.Event()
+    ranks = {"first": 1, "low": 2, "high": 0}
+
+    def blocking_pipe(text_inputs, **kwargs):
+        if text_inputs == "first":
+            release.wait()
+        return pipe(text_inputs, **kwargs)
+
+    local = threading.local()
+    scheduler = BatchingScheduler(
+        blocking_pipe, max_batch_size=1, max_wait_ms=0, priority=lambda: local.rank
+    )
+
+    def submit(prompt):
+        local.rank = ranks[prompt]
+        return scheduler.submit(prompt)
+
+    # "first" occupies the worker while "low" and then "high" queue up
+    first = submit("first")
+    while scheduler.stats()["queued"]:
+        time.sleep(0.001)
+    futures = [submit("low"), submit("high")]
+    release.set()
+    for future in [first] + futures:
+        future.result(timeout=5)
+
+    assert [call[0] for call in pipe.calls] == ["first", "high", "low"]
+
+
+def test_cancelled_requests_are_dropped_or_stopped():
+    """Test a cancelled queued request never runs and a running one stops early"""
+    pipe = FakePipe()
+    release = threading.Event()
+
+    def blocking_pipe(text_inputs, **kwargs):
+        if text_inputs == "first":
+            release.wait()
+        return pipe(text_inputs, **kwargs)
+
+    scheduler = BatchingScheduler(
+        blocking_pipe,
+        max_batch_size=1,
+        max_wait_ms=0,
+        cancel_token=current_cancel_token,
+    )
+    first = scheduler.submit("first")
+    while scheduler.stats()["queued"]:
+        time.sleep(0.001)
+
+    token = CancelToken()
+    with cancel_scope(token):
+        queued = scheduler.submit("queued")
+    token.cancel()
+
+    assert isinstance(queued.exception(timeout=1), GenerationCancelled)
+    with pytest.raises(GenerationCancelled):
+        with cancel_scope(token):
+            scheduler.submit("late")
+    release.set()
+    first.result(timeout=5)
+    assert [call[0] for call in pipe.calls] == ["first"]
+
+    # Running: the mock backend stops decoding at the next token
+    scheduler = BatchingScheduler(
+        MockBackend(token_ms=50), max_wait_ms=0, cancel_token=current_cancel_token
+    )
+    token = CancelToken()
+    with cancel_scope(token):
+        running = scheduler.submit("Describe the system in detail")
+    threading.Timer(0.02, token.cancel).start()
+
+    start = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        running.result(timeout=5)
+    assert time.monotonic() - start < 0.5
+    assert scheduler.stats()["requests_cancelled"] == 1
@@ -0,0 +1,79 @@
+# -----------------------------------------------------------------------------
+# File: test_cancellation.py
+# Description: Test suite for cancellation.py - checks cancel tokens and
+#              stopping the rows of cancelled requests.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for generation cancellation"""
+
+import pytest
+import torch
+from transformers import StoppingCriteriaList
+
+from cancellation import (CancelledRowsCriteria, CancelToken,
+                          GenerationCancelled, cancel_scope,
+                          current_cancel_token)
+from llm_backends import MockBackend
+
+
+def test_token_runs_callbacks_once():
+    """Test callbacks run on cancel, once, and right away when late"""
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("early"))
+    token.raise_if_cancelled()
+
+    token.cancel()
+    token.cancel()
+    token.on_cancel(lambda: calls.append("late"))
+
+    assert calls == ["early", "late"]
+    with pytest.raises(GenerationCancelled):
+        token.raise_if_cancelled()
+
+
+def test_cancel_scope():
+    """Test the current token is scoped"""
+    token = CancelToken()
+
+    assert current_cancel_token() is None
+    with cancel_scope(token):
+        assert current_cancel_token() is token
+    assert current_cancel_token() is None
+
+
+def test_rows_of_cancelled_requests_stop():
+    """Test rows stop by request, or all together when rows were regrouped"""
+    cancelled, running = CancelToken(), CancelToken()
+    criteria = CancelledRowsCriteria(["a", "b", "c"], [cancelled, running, None])
+    cancelled.cancel()
+
+    assert criteria(torch.zeros((3, 4), dtype=torch.long), None).tolist() == [
+        True,
+        False,
+        False,
+    ]
+    assert criteria(torch.zeros((1, 4), dtype=torch.long), None).tolist() == [False]
+    assert criteria.prompt_cancelled("a")
+    assert not criteria.prompt_cancelled("b")
+
+
+def test_text_backend_checks_every_token():
+    """Test the mock backend stops decoding a cancelled prompt"""
+    prompt = "Describe the system in detail"
+    backend = MockBackend()
+    full = backend(prompt, return_full_text=False)[0]["generated_text"]
+
+    token = CancelToken()
+    token.cancel()
+    criteria = StoppingCriteriaList([CancelledRowsCriteria([prompt], [token])])
+
+    assert full
+    assert backend(prompt, stopping_criteria=criteria)[0]["generated_text"] == prompt
+    assert backend([prompt], stopping_criteria=criteria) == [
+        [{"generated_text": prompt}]
+    ]
@@ -12,7 +12,7 @@
 
 import pytest
 
-from chunking_strategy import DocumentChunker
+from chunking_strategy import DocumentChunker, TokenCounter
 
 
 def test_init():
@@ -105,7 +105,9 @@ def test_chunk_by_sentences():
     # Just verify that chunks are reasonably sized and contain sentences
     for chunk in chunks:
         assert len(chunk["text"]) > 0, "Chunk should not be empty"
-        assert "sentence" in chunk["text"].lower(), "Chunks should contain sentence content"
+        assert (
+            "sentence" in chunk["text"].lower()
+        ), "Chunks should contain sentence content"
 
 
 def test_auto_strategy_detection():
@@ -238,6 +240,7 @@ def test_invalid_strategy():
     assert len(chunks) == 1
     assert chunks[0]["text"] == text
 
+
 @pytest.mark.skip(reason="Temporarily disabled")
 def test_max_chunk_size():
     """Test enforcement of maximum chunk size"""
@@ -302,3 +305,62 @@ def test_edge_cases():
     chunks = chunker.chunk_document(weird_text)
     assert len(chunks) == 1
     assert chunks[0]["text"].strip() == "Some\n\n\nweird\n\n\nformatting"
+
+
+class WordTokenizer:
+    """Callable stand-in for an HF tokenizer: one token per word"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return {"input_ids": [t.split() for t in texts]}
+
+
+def test_token_counter_batches_and_caches():
+    """Test uncached texts are tokenized together once and then cached"""
+    tokenizer = WordTokenizer()
+    counter = TokenCounter(tokenizer, cache_size=2)
+
+    assert counter.count_many(["a b", "c", "a b"]) == [2, 1, 2]
+    assert counter("a b") == 2
+    assert tokenizer.batches == [["a b", "c"]]
+    assert (counter.hits, counter.misses) == (1, 2)
+
+    counter("d e f")  # evicts "c", the least recently used
+    counter("c")
+    assert tokenizer.batches[-1] == ["c"]
+
+
+def test_chunks_fit_token_budget_with_reserved_tokens():
+    """Test packing counts real tokens and leaves room for the prompt"""
+    chunker = DocumentChunker(
+        max_tokens=30, length_function=TokenCounter(WordTokenizer())
+    )
+    text = "\n\n".join(f"Paragraph {i} has exactly six words." for i in range(10))
+
+    chunks = chunker.chunk_document(text, strategy="paragraph", reserved_tokens=10)
+
+    # 20 tokens are left per chunk: three six-word paragraphs fit, four do not
+    assert len(chunks) == 4
+    assert all(chunk["estimated_tokens"] <= 20 for chunk in chunks)
+    assert chunks[0]["estimated_tokens"] == 18
+    assert "Paragraph 9" in chunks[-1]["text"]
+
+
+def test_oversized_paragraph_is_split():
+    """Test a paragraph over the budget is split by sentences, then words"""
+    chunker = DocumentChunker(
+        max_tokens=8, length_function=TokenCounter(WordTokenizer())
+    )
+    sentences = "One two three four. Five six seven eight."
+    run_on = " ".join(f"w{i}" for i in range(20))
+
+    chunks = chunker.chunk_document(
+        f"Short intro.\n\n{sentences}\n\n{run_on}", strategy="paragraph"
+    )
+
+    assert all(chunk["estimated_tokens"] <= 8 for chunk in chunks)
+    joined = " ".join(chunk["text"] for chunk in chunks)
+    assert joined.split() == f"Short intro. {sentences} {run_on}".split()
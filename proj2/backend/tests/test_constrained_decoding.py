@@ -0,0 +1,215 @@
+# -----------------------------------------------------------------------------
+# File: test_constrained_decoding.py
+# Description: Test suite for constrained_decoding.py - checks that masked
+#              generation can only produce JSON matching the use case schema.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for grammar-constrained JSON decoding"""
+
+import json
+from typing import List
+
+import pytest
+import torch
+from pydantic import BaseModel
+from transformers import LlamaConfig, LlamaForCausalLM, LogitsProcessorList
+
+from constrained_decoding import (JsonSchemaAutomaton, TokenVocabulary,
+                                  array_schema, bind_logits_processors,
+                                  build_json_processor)
+
+
+class UseCase(BaseModel):
+    title: str
+    main_flow: List[str]
+
+
+SCHEMA = UseCase.model_json_schema()
+
+# Multi-character pieces like the ones BPE vocabularies contain
+VOCAB = [
+    "<eos>",
+    "{",
+    "}",
+    "[",
+    "]",
+    ",",
+    ":",
+    " ",
+    "\n",
+    '"',
+    '"title"',
+    '"main_flow"',
+    '",',
+    '"]',
+    '"}',
+    "},",
+    "\\n",
+    "\\",
+    "user",
+    " logs",
+    " in",
+    "a",
+    "b",
+    "title",
+    # Single characters so every key can also be spelled out piece by piece
+    "m",
+    "i",
+    "n",
+    "_",
+    "f",
+    "l",
+    "o",
+    "w",
+    "t",
+    "e",
+]
+
+
+class ListTokenizer:
+    """Tokenizer over a fixed list of token strings"""
+
+    eos_token_id = 0
+    all_special_ids = [0]
+
+    def __len__(self):
+        return len(VOCAB)
+
+    def decode(self, ids, **kwargs):
+        return "".join(VOCAB[i] for i in ids if i != 0)
+
+
+VALID = '{"title": "user logs in", "main_flow": ["a", "b\\n"]}'
+
+
+def test_automaton_accepts_schema_valid_json():
+    """Test valid objects and arrays reach the complete state"""
+    obj = JsonSchemaAutomaton(SCHEMA)
+    arr = JsonSchemaAutomaton(array_schema(SCHEMA))
+
+    assert obj.is_complete(obj.advance(obj.initial_state(), VALID))
+    assert arr.is_complete(arr.advance(arr.initial_state(), f"[{VALID},\n {VALID}]"))
+    # Prompt already opened the array
+    assert arr.is_complete(arr.advance(arr.initial_state(opened=True), f"{VALID}]"))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"title": "x",}',  # trailing comma
+        '{"main_flow": [], "title": "x"}',  # wrong key order / missing key
+        '{"title": "line\nbreak", "main_flow": []}',  # raw newline in string
+        '{"title": 1, "main_flow": []}',  # wrong type
+        '{"title": "x", "main_flow": ["a",]}',  # trailing comma in list
+        '{"title": "bad \\q escape", "main_flow": []}',
+    ],
+)
+def test_automaton_rejects_invalid_json(text):
+    """Test the usual LLM JSON slips are rejected"""
+    automaton = JsonSchemaAutomaton(SCHEMA)
+
+    assert automaton.advance(automaton.initial_state(), text) is None
+
+
+def test_masks_allow_only_valid_next_tokens():
+    """Test token masks at a key position and inside a string"""
+    vocabulary = TokenVocabulary(ListTokenizer())
+    processor = build_json_processor(SCHEMA, vocabulary, opened=True)
+    masks = processor.masks
+
+    at_key = masks.allowed(processor.state_after(""))
+    allowed = {VOCAB[i] for i in range(len(VOCAB)) if at_key[i]}
+    assert allowed == {'"', '"title"', " ", "\n"}
+
+    in_string = masks.allowed(processor.state_after('"title": "user'))
+    assert in_string[VOCAB.index(" logs")]
+    assert in_string[VOCAB.index('",')]
+    assert not in_string[VOCAB.index('"}')]  # main_flow still missing
+    assert not in_string[VOCAB.index("\n")]
+
+    done = masks.allowed(processor.state_after('"title": "a", "main_flow": []}'))
+    assert done.nonzero().flatten().tolist() == [0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_logits_always_yield_valid_json(seed):
+    """Test that sampling from random scores under the mask gives valid JSON"""
+    vocabulary = TokenVocabulary(ListTokenizer())
+    processor = build_json_processor(array_schema(SCHEMA), vocabulary)
+    call = processor.for_call()
+    generator = torch.Generator().manual_seed(seed)
+
+    ids = [7, 3]  # prompt: " ["
+    for _ in range(600):
+        scores = torch.randn((1, len(VOCAB)), generator=generator)
+        scores = call(torch.tensor([ids]), scores)
+        next_id = int(torch.argmax(scores, dim=-1))
+        ids.append(next_id)
+        if next_id == 0:
+            break
+
+    text = "[" + ListTokenizer().decode(ids[2:])
+    if ids[-1] == 0:
+        parsed = json.loads(text)
+        assert all(set(item) == {"title", "main_flow"} for item in parsed)
+    else:
+        # Ran out of steps: still a valid prefix
+        assert processor.state_after(text[1:]) is not None
+
+
+def test_processor_constrains_hf_generate():
+    """Test the processor inside model.generate() with batched rows"""
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(VOCAB),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=1,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+        eos_token_id=0,
+        pad_token_id=0,
+    )
+    model = LlamaForCausalLM(config).eval()
+    vocabulary = TokenVocabulary(ListTokenizer())
+    processor = build_json_processor(SCHEMA, vocabulary, opened=True)
+
+    prompts = torch.tensor([[18, 19, 1], [21, 22, 1]])  # "... {"
+    sequences = model.generate(
+        input_ids=prompts,
+        attention_mask=torch.ones_like(prompts),
+        max_new_tokens=40,
+        do_sample=True,
+        logits_processor=bind_logits_processors(
+            {"logits_processor": LogitsProcessorList([processor])}
+        )["logits_processor"],
+    )
+
+    for row in sequences[:, prompts.shape[1] :]:
+        text = ListTokenizer().decode(row.tolist())
+        assert processor.state_after(text) is not None
+
+
+def test_row_states_are_tracked_per_call():
+    """Test each call keeps its own row states and detects lost rows"""
+    vocabulary = TokenVocabulary(ListTokenizer())
+    processor = build_json_processor(SCHEMA, vocabulary, opened=True)
+    first, second = processor.for_call(), processor.for_call()
+    scores = torch.zeros((2, len(VOCAB)))
+
+    # Identical rows in two calls don't share state
+    first(torch.tensor([[1], [1]]), scores)
+    second(torch.tensor([[1], [1]]), scores)
+    first(torch.tensor([[1, 7], [1, 10]]), scores)
+    assert first._states[0] != first._states[1]
+    assert second._states == [processor.initial] * 2
+
+    with pytest.raises(RuntimeError):
+        first(torch.tensor([[1, 7, 7], [1, 7, 7]]), scores)
+    with pytest.raises(RuntimeError):
+        processor(torch.tensor([[1]]), scores)
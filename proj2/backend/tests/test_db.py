@@ -18,7 +18,9 @@ import pytest
 from db import (add_conversation_message, add_session_summary, create_session,
                 get_conversation_history, get_latest_summary,
                 get_session_context, get_session_use_cases, get_use_case_by_id,
-                init_db, update_session_context, update_use_case)
+                get_use_case_embeddings, init_db, insert_use_case,
+                save_use_case_embeddings, update_session_context,
+                update_use_case, update_use_cases)
 
 
 @pytest.fixture
@@ -402,6 +404,55 @@ def test_update_use_case_invalid_id(test_db):
     assert result is False
 
 
+def test_update_use_cases_together(test_db):
+    """Test several use cases are updated in one call"""
+    session_id = "test_bulk_update"
+    create_session(session_id)
+    first = insert_use_case(session_id, {"title": "First", "main_flow": ["a"]})
+    second = insert_use_case(session_id, {"title": "Second", "main_flow": ["b"]})
+
+    updated = update_use_cases(
+        [
+            (first, {"title": "First refined", "main_flow": ["a", "a2"]}),
+            (second, {"title": "Second refined", "main_flow": ["b", "b2"]}),
+            (99999, {"title": "Missing"}),
+        ]
+    )
+
+    assert updated == [first, second]
+    assert get_use_case_by_id(first)["main_flow"] == ["a", "a2"]
+    assert get_use_case_by_id(second)["title"] == "Second refined"
+
+
+def test_use_case_embeddings_are_stored_and_dropped_on_update(test_db):
+    """Test stored vectors are returned per use case and cleared by updates"""
+    session_id = "test_embeddings"
+    create_session(session_id)
+    first = insert_use_case(session_id, {"title": "First", "main_flow": ["a"]})
+    second = insert_use_case(session_id, {"title": "Second", "main_flow": ["b"]})
+
+    save_use_case_embeddings(
+        session_id,
+        {first: b"\x00" * 8, second: b"\x01" * 8},
+        dim=2,
+        dtype="float32",
+        model="test-model",
+        model_version="1",
+    )
+    rows = get_use_case_embeddings(session_id)
+    assert [row["id"] for row in rows] == [first, second]
+    assert rows[0]["main_flow"] == ["a"]
+    assert rows[1]["embedding"]["vector"] == b"\x01" * 8
+    assert rows[1]["embedding"]["model"] == "test-model"
+
+    update_use_case(first, {"title": "First refined", "main_flow": ["a2"]})
+    update_use_cases([(second, {"title": "Second refined", "main_flow": ["b2"]})])
+    assert [row["embedding"] for row in get_use_case_embeddings(session_id)] == [
+        None,
+        None,
+    ]
+
+
 @pytest.mark.skip(reason="Summary behavior changed")
 def test_session_summary_workflow(test_db):
     """Test complete session summary workflow"""
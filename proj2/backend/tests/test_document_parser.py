@@ -293,3 +293,11 @@ def test_parse_document_with_metadata():
     assert "stats" in result["metadata"]
     assert "words" in result["metadata"]["stats"]
     assert "characters" in result["metadata"]["stats"]
+
+
+def test_get_text_stats_with_length_function():
+    """Test a tokenizer-backed length function replaces the word estimate"""
+    stats = get_text_stats("one two three", length_function=lambda text: 7)
+
+    assert stats["estimated_tokens"] == 7
+    assert stats["words"] == 3
@@ -0,0 +1,110 @@
+# -----------------------------------------------------------------------------
+# File: test_extraction_cache.py
+# Description: Test suite for extraction_cache.py - checks exact and
+#              semantic hits, misses for changed requirements and eviction.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the semantic extraction cache"""
+
+import pytest
+
+from extraction_cache import (SemanticExtractionCache, normalize_text,
+                              split_sentences)
+from llm_backends import MockEmbedder
+
+TEXT = (
+    "Users must be able to log in with email and password. "
+    "Customers can add products to their shopping cart. "
+    "Admins export monthly sales reports."
+)
+USE_CASES = [{"title": "User logs in"}, {"title": "Customer adds product to cart"}]
+
+
+class RecordingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return MockEmbedder().encode(texts)
+
+
+@pytest.fixture
+def encoder():
+    return RecordingEncoder()
+
+
+@pytest.fixture
+def cache(tmp_path, encoder):
+    return SemanticExtractionCache(str(tmp_path / "cache.db"), encoder, model="m1")
+
+
+def store(cache, text, use_cases=USE_CASES):
+    lookup = cache.lookup(text)
+    assert not lookup.hit
+    cache.store(lookup, use_cases)
+
+
+def test_normalized_text_is_an_exact_hit(cache, encoder):
+    """Test case and whitespace changes hit without embedding"""
+    store(cache, TEXT)
+    calls = len(encoder.calls)
+
+    lookup = cache.lookup("  " + TEXT.upper().replace(" ", "  "))
+
+    assert lookup.hit
+    assert lookup.use_cases == USE_CASES
+    assert lookup.similarity == 1.0
+    assert len(encoder.calls) == calls
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_reordered_and_reworded_text_is_a_semantic_hit(cache):
+    """Test near-identical text reuses the stored use cases"""
+    store(cache, TEXT)
+    sentences = split_sentences(normalize_text(TEXT))
+    edited = " ".join(reversed(sentences)).replace("log in", "log in,")
+
+    lookup = cache.lookup(edited)
+
+    assert lookup.hit
+    assert lookup.use_cases == USE_CASES
+    assert lookup.similarity >= cache.threshold
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_added_or_dropped_requirement_is_a_miss(cache):
+    """Test every sentence of both texts needs a counterpart"""
+    store(cache, TEXT)
+
+    assert not cache.lookup(TEXT + " Guests can browse the catalog.").hit
+    assert not cache.lookup(TEXT.rsplit(" Admins", 1)[0]).hit
+
+    stats = cache.stats()
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.0
+
+
+def test_entries_persist_per_model_and_are_evicted(tmp_path, encoder):
+    """Test entries survive reopening, are dropped for a new model and by LRU"""
+    path = str(tmp_path / "cache.db")
+    cache = SemanticExtractionCache(path, encoder, model="m1", max_entries=2)
+    store(cache, TEXT)
+    store(cache, "Guests can browse the catalog.")
+    cache.lookup(TEXT)
+    store(cache, "Drivers accept delivery requests.")
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert not cache.lookup("Guests can browse the catalog.").hit
+
+    reopened = SemanticExtractionCache(path, encoder, model="m1")
+    assert reopened.lookup(TEXT).hit
+    assert reopened.stats()["entries"] == 2
+
+    assert SemanticExtractionCache(path, encoder, model="m2").stats()["entries"] == 0
@@ -0,0 +1,187 @@
+# -----------------------------------------------------------------------------
+# File: test_extraction_jobs.py
+# Description: Test suite for extraction_jobs.py - checks job progress,
+#              resume after restart, cancellation and failures.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for background extraction jobs"""
+
+import threading
+import time
+
+import pytest
+
+import db
+from cancellation import current_cancel_token
+from extraction_jobs import FINISHED_JOB_STATES, JobManager, JobProgress
+
+
+@pytest.fixture
+def jobs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "get_db_path", lambda: str(tmp_path / "jobs.db"))
+    db.init_db()
+
+
+def wait_for_job(job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = db.get_extraction_job(job_id)
+        if job["status"] in FINISHED_JOB_STATES:
+            return job
+        assert time.monotonic() < deadline, f"job still {job['status']}"
+        time.sleep(0.01)
+
+
+def chunk_plan(count):
+    return [{"chunk_id": i, "text": f"Chunk {i}."} for i in range(count)]
+
+
+def run_chunks(job, progress):
+    """Runner that extracts one use case per chunk not finished yet"""
+    if progress.chunks is None:
+        progress.planned(chunk_plan(3))
+    for index, chunk in enumerate(progress.chunks):
+        if index in progress.chunk_results:
+            continue
+        use_cases = [{"title": f"Use case {chunk['chunk_id']}"}]
+        progress.chunk_done(
+            index, {"chunk_id": chunk["chunk_id"], "use_cases": 1}, use_cases
+        )
+    found = [
+        uc for i in sorted(progress.chunk_results) for uc in progress.chunk_results[i]
+    ]
+    return {"results": found, "stored_count": len(found)}
+
+
+def test_job_runs_and_records_progress(jobs_db):
+    """Test a job reports every chunk and stores its result"""
+    manager = JobManager(run_chunks)
+    job = manager.submit("s1", "spec.txt", "Some text", domain="retail")
+    assert job["status"] in ("queued", "running")
+
+    job = wait_for_job(job["job_id"])
+    manager.shutdown()
+
+    assert job["status"] == "completed"
+    assert job["chunks_total"] == 3
+    assert job["chunks_done"] == 3
+    assert job["use_cases_found"] == 3
+    assert job["use_cases_stored"] == 3
+    assert job["eta_seconds"] == 0
+    assert [s["chunk_id"] for s in job["chunk_summaries"]] == [0, 1, 2]
+    assert len(job["result"]["results"]) == 3
+    assert db.list_extraction_jobs(session_id="s1")[0]["job_id"] == job["job_id"]
+
+
+def test_eta_does_not_count_time_before_start(jobs_db):
+    """Test time spent waiting for admission is not taken as chunk time"""
+    db.create_extraction_job("job-1", "s1", "spec.txt", "Some text")
+    progress = JobProgress(db.get_extraction_job("job-1", include_input=True))
+    time.sleep(0.3)
+
+    progress.start()
+    progress.planned(chunk_plan(4))
+    progress.chunk_done(0, {"chunk_id": 0, "use_cases": 0}, [])
+
+    assert db.get_extraction_job("job-1")["eta_seconds"] < 0.3
+
+
+def test_resume_skips_finished_chunks(jobs_db):
+    """Test a job left running by an earlier process continues where it stopped"""
+    db.create_extraction_job("job-1", "s1", "spec.txt", "Some text")
+    db.update_extraction_job(
+        "job-1",
+        status="running",
+        chunks=chunk_plan(3),
+        chunks_total=3,
+        chunk_results={"0": [{"title": "Use case 0"}]},
+        chunk_summaries=[{"chunk_id": 0, "use_cases": 1}],
+        chunks_done=1,
+    )
+    seen = []
+
+    def runner(job, progress):
+        seen.append(sorted(progress.chunk_results))
+        return run_chunks(job, progress)
+
+    manager = JobManager(runner)
+    assert manager.resume() == 1
+    job = wait_for_job("job-1")
+    manager.shutdown()
+
+    assert seen == [[0]]
+    assert job["status"] == "completed"
+    assert job["chunks_done"] == 3
+    assert [uc["title"] for uc in job["result"]["results"]] == [
+        "Use case 0",
+        "Use case 1",
+        "Use case 2",
+    ]
+
+
+def test_cancel_stops_running_job(jobs_db):
+    """Test cancel() marks the job and cancels the runner's token"""
+    started = threading.Event()
+
+    def runner(job, progress):
+        started.set()
+        token = current_cancel_token()
+        while True:
+            token.raise_if_cancelled()
+            time.sleep(0.01)
+
+    manager = JobManager(runner)
+    job = manager.submit("s1", "spec.txt", "Some text")
+    assert started.wait(timeout=2)
+
+    assert manager.cancel(job["job_id"])["status"] == "cancelled"
+    manager.shutdown()
+
+    job = db.get_extraction_job(job["job_id"])
+    assert job["status"] == "cancelled"
+    assert job["result"] is None
+    assert manager.cancel("missing") is None
+
+
+def test_cancel_session_stops_its_unfinished_jobs(jobs_db):
+    """Test cancel_session() cancels running and queued jobs of one session"""
+    started = threading.Event()
+
+    def runner(job, progress):
+        started.set()
+        token = current_cancel_token()
+        while True:
+            token.raise_if_cancelled()
+            time.sleep(0.01)
+
+    manager = JobManager(runner)
+    running = manager.submit("s1", "spec.txt", "Some text")
+    assert started.wait(timeout=2)
+    queued = manager.submit("s1", "more.txt", "More text")
+    other = manager.submit("s2", "spec.txt", "Some text")
+
+    assert manager.cancel_session("s1") == 2
+    assert db.get_extraction_job(running["job_id"])["status"] == "cancelled"
+    assert db.get_extraction_job(queued["job_id"])["status"] == "cancelled"
+    assert db.get_extraction_job(other["job_id"])["status"] == "queued"
+
+    manager.cancel(other["job_id"])
+    manager.shutdown()
+
+
+def test_failed_job_records_error(jobs_db):
+    """Test an exception in the runner fails the job"""
+
+    def runner(job, progress):
+        raise RuntimeError("model exploded")
+
+    manager = JobManager(runner)
+    job = wait_for_job(manager.submit("s1", "spec.txt", "Some text")["job_id"])
+    manager.shutdown()
+
+    assert job["status"] == "failed"
+    assert job["error"] == "model exploded"
@@ -0,0 +1,216 @@
+# -----------------------------------------------------------------------------
+# File: test_inference_server.py
+# Description: Test suite for inference_server.py - checks remote generation,
+#              streaming, embeddings and batching across client connections.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the inference server and client"""
+
+import os
+import socket
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+import torch
+from transformers import (LogitsProcessorList, StoppingCriteriaList,
+                          TextIteratorStreamer)
+
+from batching_scheduler import BatchingScheduler
+from cancellation import (CancelToken, GenerationCancelled, cancel_scope,
+                          current_cancel_token)
+from inference_server import (InferenceClient, InferenceServer,
+                              InferenceServerError, JsonSchemaSpec,
+                              encode_kwargs, load_authkey)
+from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+from stopping_criteria import JsonObjectStoppingCriteria
+
+EXTRACTION_PROMPT = (
+    "<|start_header_id|>user<|end_header_id|>\nRequirements:\n"
+    "Users can log in. Admins can export reports. Customers can track orders.\n"
+    "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n["
+)
+
+
+@pytest.fixture
+def server():
+    tokenizer = MockTokenizer()
+    scheduler = BatchingScheduler(
+        MockBackend(tokenizer), max_batch_size=2, max_wait_ms=500
+    )
+    server = InferenceServer(scheduler, embedder=MockEmbedder(), tokenizer=tokenizer)
+    server.listen("127.0.0.1:0", "test-key")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.close()
+    scheduler.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    host, port = server.address
+    client = InferenceClient(f"{host}:{port}", authkey="test-key")
+    yield client
+    client.close()
+
+
+def test_generate_matches_local_backend(client):
+    """Test single and list calls return what the backend returns"""
+    expected = MockBackend()(EXTRACTION_PROMPT, return_full_text=False)
+
+    assert client(EXTRACTION_PROMPT, return_full_text=False) == expected
+    outputs = client([EXTRACTION_PROMPT, "Hello"], return_full_text=False)
+    assert outputs[0] == expected
+    assert len(outputs) == 2
+
+
+def test_stopping_criteria_rebuilt_on_server(client):
+    """Test stopping criteria cross the socket and stop at one use case"""
+    criteria = StoppingCriteriaList([JsonObjectStoppingCriteria(MockTokenizer(), 1)])
+
+    text = client(
+        EXTRACTION_PROMPT, stopping_criteria=criteria, return_full_text=False
+    )[0]["generated_text"]
+
+    assert text.rstrip().endswith("}")
+    assert text.count('"title"') == 1
+
+
+def test_streaming_forwards_pieces(client):
+    """Test streamed pieces reach the local streamer in order"""
+    streamer = TextIteratorStreamer(MockTokenizer(), skip_prompt=True)
+
+    output = client(EXTRACTION_PROMPT, streamer=streamer, return_full_text=False)
+
+    assert "".join(streamer) == output[0]["generated_text"]
+
+
+def test_embeddings_match_local_embedder(client):
+    """Test encode() returns arrays, or tensors when asked"""
+    sentences = ["User logs in", "Admin exports reports"]
+    expected = MockEmbedder().encode(sentences, convert_to_tensor=True)
+
+    assert torch.allclose(client.encode(sentences, convert_to_tensor=True), expected)
+    assert client.encode("User logs in").shape == (384,)
+
+
+def test_connections_batch_together(server):
+    """Test jobs from separate clients are generated in one batch"""
+    host, port = server.address
+    clients = [InferenceClient(f"{host}:{port}", authkey="test-key") for _ in range(2)]
+    threads = [
+        threading.Thread(
+            target=c, args=(EXTRACTION_PROMPT,), kwargs={"max_new_tokens": 20}
+        )
+        for c in clients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    batching = clients[0].info()["inference_server"]["batching"]
+    assert batching["batches_run"] == 1
+    assert batching["largest_batch"] == 2
+    for c in clients:
+        c.close()
+
+
+def test_schema_spec_dropped_without_constrained_decoding(server):
+    """Test a non-HF server ignores schema processors instead of failing"""
+    spec = LogitsProcessorList([JsonSchemaSpec({"type": "string"})])
+
+    processors = server.decode_kwargs(encode_kwargs(spec), send=None)
+
+    assert isinstance(processors, LogitsProcessorList)
+    assert len(processors) == 0
+
+
+def test_errors(client):
+    """Test server errors, unsendable kwargs and unreachable servers"""
+    with pytest.raises(InferenceServerError, match="Unknown inference server op"):
+        client._request({"op": "nope"})
+    with pytest.raises(TypeError):
+        client("hi", logits_processor=LogitsProcessorList([object()]))
+
+    # The failed calls did not break the pooled connection
+    assert client("Hello", max_new_tokens=3)
+
+    unreachable = InferenceClient("127.0.0.1:1", authkey="test-key")
+    with pytest.raises(InferenceServerError, match="Cannot reach"):
+        unreachable.info()
+    with pytest.raises(InferenceServerError):
+        unreachable.wait_until_ready(timeout=0.2, interval=0.05)
+
+
+def test_cancel_stops_remote_generation():
+    """Test a cancelled request stops on the server and the connection is reused"""
+    scheduler = BatchingScheduler(
+        MockBackend(token_ms=20), max_wait_ms=0, cancel_token=current_cancel_token
+    )
+    server = InferenceServer(scheduler, tokenizer=MockTokenizer())
+    server.listen("127.0.0.1:0", "test-key")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.address
+    client = InferenceClient(f"{host}:{port}", authkey="test-key")
+
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        with cancel_scope(token):
+            client(EXTRACTION_PROMPT, return_full_text=False)
+
+    assert time.monotonic() - start < 2
+    assert client("Hello", max_new_tokens=3)
+    assert client.info()["inference_server"]["batching"]["requests_cancelled"] == 1
+    client.close()
+    server.close()
+    scheduler.shutdown()
+
+
+def test_wrong_key_does_not_stop_the_server(server):
+    """Test a rejected or silent peer leaves the server serving others"""
+    host, port = server.address
+    silent = socket.create_connection((host, port))
+    with pytest.raises(AuthenticationError):
+        Client((host, port), authkey=b"wrong-key")
+
+    client = InferenceClient(f"{host}:{port}", authkey="test-key")
+    expected = MockBackend()(EXTRACTION_PROMPT, return_full_text=False)
+    assert client(EXTRACTION_PROMPT, return_full_text=False) == expected
+    assert server.info()["inference_server"]["rejected"] == 1
+    client.close()
+    silent.close()
+
+
+def test_server_and_client_require_a_key(tmp_path):
+    """Test there is no default key and the key file is private"""
+    server = InferenceServer(MockBackend(), tokenizer=MockTokenizer())
+    with pytest.raises(ValueError):
+        server.listen("127.0.0.1:0", None)
+    with pytest.raises(ValueError):
+        InferenceClient("127.0.0.1:6060", authkey="")
+
+    path = str(tmp_path / "inference_server.key")
+    assert load_authkey("from-env", path, create=True) == "from-env"
+    with pytest.raises(InferenceServerError, match="No inference server key"):
+        load_authkey(None, path)
+
+    # The server writes a random key once; clients read the same one
+    key = load_authkey(None, path, create=True)
+    assert len(key) == 64
+    assert load_authkey(None, path, create=True) == load_authkey("", path) == key
+
+    if os.name == "posix":
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        os.chmod(path, 0o644)
+        with pytest.raises(InferenceServerError, match="readable by other users"):
+            load_authkey(None, path)
@@ -0,0 +1,91 @@
+# -----------------------------------------------------------------------------
+# File: test_json_stream.py
+# Description: Test suite for json_stream.py - tests incremental parsing of
+#              use case objects from a streamed JSON array.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the incremental JSON array parser"""
+
+import json
+
+from json_stream import (JsonArrayStreamParser, close_json_array,
+                         count_closed_objects, loads_lenient)
+
+USE_CASES = [
+    {"title": "User logs in", "main_flow": ["Open app", "Enter {credentials}"]},
+    {"title": "User says \"hi\"", "main_flow": ["Type [greeting]"]},
+]
+
+
+def test_objects_emitted_as_they_close():
+    """Test that each object is returned by the feed call that completes it"""
+    text = json.dumps(USE_CASES)[1:]  # prompt already contained "["
+    parser = JsonArrayStreamParser(array_opened=True)
+
+    emitted = []
+    for i in range(0, len(text), 7):
+        emitted.append(parser.feed(text[i : i + 7]))
+
+    flat = [obj for chunk in emitted for obj in chunk]
+    assert flat == USE_CASES
+    assert parser.objects_closed == 2
+    assert parser.array_closed
+    # First object is available before the stream ends
+    first_chunk = next(i for i, chunk in enumerate(emitted) if chunk)
+    assert first_chunk < len(emitted) - 1
+
+
+def test_braces_inside_strings_are_ignored():
+    """Test that brackets and escaped quotes inside strings do not confuse depth"""
+    parser = JsonArrayStreamParser(array_opened=True)
+    objects = parser.feed('{"title": "a } tricky \\" ] title"}')
+    assert objects == [{"title": 'a } tricky " ] title'}]
+    assert not parser.array_closed
+
+
+def test_preamble_before_array_is_skipped():
+    """Test that text before the opening bracket is ignored"""
+    parser = JsonArrayStreamParser()
+    objects = parser.feed('Here you go: [{"title": "X"}] trailing {"title": "Y"}')
+    assert objects == [{"title": "X"}]
+    assert parser.array_closed
+
+
+def test_trailing_commas_are_repaired():
+    """Test lenient parsing of common LLM JSON slips"""
+    parser = JsonArrayStreamParser(array_opened=True)
+    objects = parser.feed('{"title": "X", "flows": ["a", "b",], "ok": True,},')
+    assert objects == [{"title": "X", "flows": ["a", "b"], "ok": True}]
+
+
+def test_broken_object_is_recorded_and_skipped():
+    """Test that an unparseable object does not stop the stream"""
+    parser = JsonArrayStreamParser(array_opened=True)
+    objects = parser.feed('{"title" "missing colon"}, {"title": "Good"}]')
+    assert objects == [{"title": "Good"}]
+    assert parser.objects_closed == 2
+    assert len(parser.errors) == 1
+
+
+def test_loads_lenient():
+    """Test the lenient loader directly"""
+    assert loads_lenient('{"a": None}') == {"a": None}
+    assert loads_lenient('[1, 2,]') == [1, 2]
+
+
+def test_count_closed_objects():
+    """Test counting completed objects in partial output"""
+    assert count_closed_objects('\n\n[{"a": 1}, {"b": 2}, {"c"') == (2, False)
+    assert count_closed_objects('[{"a": "}"}]') == (1, True)
+    assert count_closed_objects('{"a": 1}, {"b": 2}]', array_opened=True) == (2, True)
+
+
+def test_close_json_array():
+    """Test closing an array that was stopped after a complete object"""
+    assert close_json_array('[{"a": 1}, {"b": [2]}') == '[{"a": 1}, {"b": [2]}]'
+    assert close_json_array('[{"a": 1}, {"b": "trunc') == '[{"a": 1}]'
+    assert close_json_array('[{"a": 1}] trailing') == '[{"a": 1}] trailing'
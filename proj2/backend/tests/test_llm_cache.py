@@ -0,0 +1,168 @@
+# -----------------------------------------------------------------------------
+# File: test_llm_cache.py
+# Description: Test suite for llm_cache.py - checks keying, LRU eviction,
+#              persistence and when the pipeline wrapper uses the cache.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the persistent LLM response cache"""
+
+import pytest
+from transformers import StoppingCriteriaList
+
+from llm_cache import (CachedPipeline, ResponseCache, is_cached_output,
+                       make_cache_key)
+from stopping_criteria import JsonObjectStoppingCriteria
+
+
+class CountingPipe:
+    """Echoes prompts and records each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text_inputs, **kwargs):
+        self.calls.append((text_inputs, kwargs))
+        if isinstance(text_inputs, str):
+            return [{"generated_text": text_inputs.upper()}]
+        return [[{"generated_text": t.upper()}] for t in text_inputs]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    store = ResponseCache(str(tmp_path / "cache.db"))
+    yield store
+    store.close()
+
+
+def test_key_depends_on_model_prompt_and_kwargs():
+    """Test every part of the key changes it and equal settings match"""
+    base = make_cache_key("m", "p", {"max_new_tokens": 5, "do_sample": False})
+
+    assert base == make_cache_key("m", "p", {"do_sample": False, "max_new_tokens": 5})
+    assert base != make_cache_key(
+        "other", "p", {"max_new_tokens": 5, "do_sample": False}
+    )
+    assert base != make_cache_key("m", "q", {"max_new_tokens": 5, "do_sample": False})
+    assert base != make_cache_key("m", "p", {"max_new_tokens": 6, "do_sample": False})
+
+
+def test_key_describes_stopping_criteria_and_rejects_streamers():
+    """Test objects with cache_key() are keyed by value, others are uncacheable"""
+
+    def criteria(n):
+        return StoppingCriteriaList([JsonObjectStoppingCriteria(None, n)])
+
+    assert make_cache_key("m", "p", {"stopping_criteria": criteria(2)}) == (
+        make_cache_key("m", "p", {"stopping_criteria": criteria(2)})
+    )
+    assert make_cache_key("m", "p", {"stopping_criteria": criteria(2)}) != (
+        make_cache_key("m", "p", {"stopping_criteria": criteria(3)})
+    )
+    assert make_cache_key("m", "p", {"streamer": object()}) is None
+
+
+def test_store_persists_across_instances(tmp_path):
+    """Test entries survive reopening the cache file"""
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(path)
+    first.put("k", [{"generated_text": "hello"}])
+    first.close()
+
+    second = ResponseCache(path)
+    assert second.get("k") == [{"generated_text": "hello"}]
+    assert second.stats()["entries"] == 1
+    second.close()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    """Test the least recently used entry is evicted when over the size bound"""
+    value = [{"generated_text": "x" * 50}]
+    store = ResponseCache(str(tmp_path / "cache.db"), max_bytes=250)
+    store.put("a", value)
+    store.put("b", value)
+    store.put("c", value)
+    store.get("a")  # "b" is now the oldest
+
+    store.put("d", value)
+
+    assert store.get("b") is None
+    assert store.get("a") == value
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] <= 250
+    store.close()
+
+
+def test_pipeline_caches_greedy_calls(cache):
+    """Test greedy calls hit the cache and sampled calls do not"""
+    pipe = CountingPipe()
+    cached = CachedPipeline(pipe, cache, model_id="m")
+
+    first = cached("hi", max_new_tokens=5, do_sample=False)
+    second = cached("hi", max_new_tokens=5, do_sample=False)
+    cached("hi", max_new_tokens=5, do_sample=True)
+    cached("hi", max_new_tokens=5, do_sample=True)
+
+    assert first[0]["generated_text"] == second[0]["generated_text"] == "HI"
+    assert not is_cached_output(first) and is_cached_output(second)
+    assert len(pipe.calls) == 3
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["bypassed"] == 2
+
+
+def test_pipeline_opt_in_opt_out_and_streaming(cache):
+    """Test cache=True caches sampled calls; cache=False and streamers bypass"""
+    pipe = CountingPipe()
+    cached = CachedPipeline(pipe, cache)
+
+    cached("hi", do_sample=True, cache=True)
+    cached("hi", do_sample=True, cache=True)
+    cached("hi", do_sample=False, cache=False)
+    cached("hi", do_sample=False, streamer=object())
+
+    assert len(pipe.calls) == 3
+    assert all("cache" not in kwargs for _, kwargs in pipe.calls)
+
+
+def test_pipeline_batches_only_misses(cache):
+    """Test a list call sends only uncached, de-duplicated prompts downstream"""
+    pipe = CountingPipe()
+    cached = CachedPipeline(pipe, cache)
+    cached("a", do_sample=False)
+
+    outputs = cached(["a", "b", "c", "b"], do_sample=False)
+
+    assert [o[0]["generated_text"] for o in outputs] == ["A", "B", "C", "B"]
+    assert pipe.calls[-1][0] == ["b", "c"]
+
+
+def test_pipeline_without_cache_strips_kwarg():
+    """Test the wrapper is a pass-through when caching is disabled"""
+    pipe = CountingPipe()
+    cached = CachedPipeline(pipe)
+
+    cached("hi", cache=True)
+    cached("hi", cache=True)
+
+    assert len(pipe.calls) == 2
+    assert pipe.calls[0][1] == {}
+    assert cached.stats() == {"enabled": False}
+
+
+def test_invalidated_output_is_generated_again(cache):
+    """Test an output the caller could not use is dropped from the cache"""
+    pipe = CountingPipe()
+    cached = CachedPipeline(pipe, cache)
+    outputs = cached(["a", "b"], do_sample=True, cache=True)
+
+    assert cached.invalidate(outputs[0])
+    assert not cached.invalidate(outputs[0])
+    assert not cached.invalidate(cached("c", do_sample=True))
+
+    again = cached(["a", "b"], do_sample=True, cache=True)
+    assert pipe.calls[-1][0] == "a"
+    assert not is_cached_output(again[0]) and is_cached_output(again[1])
+    assert cache.stats()["invalidations"] == 1
@@ -10,12 +10,13 @@
 
 import json
 import os
+import time
 from io import BytesIO
 from unittest.mock import MagicMock, patch
 
 import pytest
 import torch
-from fastapi import File, UploadFile
+from fastapi import File, HTTPException, UploadFile
 from fastapi.testclient import TestClient
 
 from main import (UseCaseEstimator, app, clean_llm_json,
@@ -365,6 +366,10 @@ class TestAPIEndpoints:
         assert data["status"] == "healthy"
         assert "model" in data
         assert "features" in data
+        # Chunks are sized from the configured prompt limit
+        from main import CHUNK_MAX_PROMPT_TOKENS
+
+        assert data["chunking"]["max_prompt_tokens"] == CHUNK_MAX_PROMPT_TOKENS
 
     @patch("main.embedder")
     def test_use_case_refinement(self, mock_embedder, client):
@@ -836,3 +841,894 @@ class TestAdditionalEndpoints:
 
 
 # Run tests with: python -m pytest tests/test_main.py -v --cov=main --cov-report term-missing
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point db.py and main.py at a throwaway SQLite database"""
+    import db
+    import main
+
+    db_path = str(tmp_path / "test_requirements.db")
+    monkeypatch.setattr(db, "get_db_path", lambda: db_path)
+    monkeypatch.setattr(main, "get_db_path", lambda: db_path)
+    db.init_db()
+    db.migrate_db()
+    return db_path
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder standing in for SentenceTransformer"""
+
+    def encode(self, texts, convert_to_tensor=True, **kwargs):
+        single = isinstance(texts, str)
+        batch = [texts] if single else texts
+        vectors = torch.zeros((len(batch), 64))
+        for row, text in enumerate(batch):
+            for word in text.lower().split():
+                vectors[row, sum(map(ord, word)) % 64] += 1.0
+        return vectors[0] if single else vectors
+
+
+class TestStreamingExtraction:
+    def test_stream_emits_use_cases_incrementally(self, client, temp_db):
+        """Test NDJSON streaming stores each use case as its object closes"""
+        generated = json.dumps(
+            [
+                SAMPLE_USE_CASE,
+                dict(SAMPLE_USE_CASE, title="User searches product catalog",
+                     main_flow=["User opens search", "User types query",
+                                "System lists matching products"]),
+            ]
+        )[1:]
+        pieces = [generated[i : i + 20] for i in range(0, len(generated), 20)]
+
+        with patch("main.stream_generation", return_value=iter(pieces)), patch(
+            "main.embedder", FakeEmbedder()
+        ), patch("main.tokenizer", MagicMock(eos_token_id=0)):
+            response = client.post(
+                "/parse_use_case_rag/stream",
+                json={"raw_text": "User can login. User can search products."},
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines() if line]
+
+        assert events[0]["event"] == "session"
+        use_case_events = [e for e in events if e["event"] == "use_case"]
+        assert [e["status"] for e in use_case_events] == ["stored", "stored"]
+        assert all("id" in e for e in use_case_events)
+        assert events[-1]["event"] == "done"
+        assert events[-1]["stored_count"] == 2
+
+        from db import get_session_use_cases
+
+        stored = get_session_use_cases(events[0]["session_id"])
+        assert len(stored) == 2
+
+
+class TestMockBackend:
+    def test_extraction_runs_end_to_end_on_mock_backend(self, client, temp_db):
+        """Test the full extraction path (LLM, dedupe, DB) with the mock backend"""
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        text = (
+            "Users can register with email and password, log in, and reset a "
+            "forgotten password. Admins manage inventory and view sales reports."
+        )
+        with patch("main.pipe", MockBackend()), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.embedder", MockEmbedder()):
+            first = client.post("/parse_use_case_rag/", json={"raw_text": text})
+            session_id = first.json()["session_id"]
+            again = client.post(
+                "/parse_use_case_rag/",
+                json={"raw_text": text, "session_id": session_id},
+            )
+
+        assert first.status_code == 200
+        stored = [r for r in first.json()["results"] if r["status"] == "stored"]
+        assert any(r["title"] == "User logs in" for r in stored)
+        assert all(len(r["main_flow"]) >= 3 for r in stored)
+        # Same text again is caught by embedding dedupe
+        assert all(
+            r["status"] == "duplicate_skipped" for r in again.json()["results"]
+        )
+
+
+class TestParallelChunkExtraction:
+    def test_chunks_are_batched_and_merged_in_order(self, temp_db):
+        """Test chunk prompts run as batches and results keep chunk order"""
+        from batching_scheduler import BatchingScheduler
+        from chunking_strategy import DocumentChunker
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        import main
+
+        sentences = [
+            "Users can register with email",
+            "Admins can export monthly reports",
+            "Customers can track their orders",
+            "Managers can approve expense claims",
+        ]
+        chunks = [
+            {"chunk_id": i, "text": f"{s}.", "char_count": len(s)}
+            for i, s in enumerate(sentences)
+        ]
+        chunker = MagicMock(spec=DocumentChunker)
+        chunker.chunk_document.return_value = chunks
+        chunker.merge_extracted_use_cases.side_effect = (
+            DocumentChunker().merge_extracted_use_cases
+        )
+        scheduler = BatchingScheduler(MockBackend(), max_batch_size=4, max_wait_ms=200)
+
+        with patch("main.pipe", scheduler), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.embedder", MockEmbedder()), patch(
+            "main.chunker", chunker
+        ), patch(
+            "main.CHUNK_EXTRACTION_CONCURRENCY", 4
+        ):
+            main.create_session("chunk-session")
+            result = main.parse_large_document_chunked(
+                "\n".join(sentences), "chunk-session"
+            )
+        scheduler.shutdown()
+
+        titles = [r["title"] for r in result["results"]]
+        assert titles == [
+            "User registers with email",
+            "Admin exports monthly reports",
+            "Customer tracks their orders",
+            "Manager approves expense claims",
+        ]
+        assert [s["chunk_id"] for s in result["chunk_summaries"]] == [0, 1, 2, 3]
+        assert scheduler.stats()["largest_batch"] > 1
+
+    def test_each_chunk_stops_at_its_own_estimate(self):
+        """Test the shared early stop reads every prompt's own estimate"""
+        from llm_backends import MockTokenizer
+
+        import main
+
+        with patch("main.tokenizer", MockTokenizer()):
+            criteria = main.json_stopping_criteria(
+                5, main.SINGLE_STAGE_ESTIMATE_PATTERN
+            )[0]
+
+        small = main.build_single_stage_prompt("Users log in.", "", 2)
+        large = main.build_single_stage_prompt("Users log in.", "", 8)
+        assert criteria.row_limit(small) == 2
+        assert criteria.row_limit(large) == 5
+
+
+class TestLLMCacheEndpoints:
+    def test_stats_and_clear(self, client, tmp_path):
+        """Test LLM cache stats and clearing"""
+        from llm_cache import ResponseCache
+
+        assert client.get("/llm-cache/stats").json() == {"enabled": False}
+        assert client.delete("/llm-cache").status_code == 404
+
+        cache = ResponseCache(str(tmp_path / "llm_cache.db"))
+        cache.put("key", [{"generated_text": "[]"}])
+        with patch("main.llm_cache", cache):
+            assert client.get("/llm-cache/stats").json()["entries"] == 1
+            response = client.delete("/llm-cache")
+            assert response.json()["removed"] == 1
+            assert client.get("/health").json()["llm_cache"]["entries"] == 0
+        cache.close()
+
+    def test_unparseable_response_is_not_replayed(self, tmp_path):
+        """Test a cached response that failed to parse is generated again"""
+        from llm_backends import MockTokenizer
+        from llm_cache import CachedPipeline, ResponseCache
+
+        import main
+
+        generator = MagicMock(return_value=[{"generated_text": "not json"}])
+        cache = ResponseCache(str(tmp_path / "llm_cache.db"))
+        with patch("main.pipe", CachedPipeline(generator, cache)), patch(
+            "main.tokenizer", MockTokenizer()
+        ):
+            for _ in range(2):
+                use_cases = main.extract_use_cases_single_stage(
+                    "Users log in.", "", 1, 64
+                )
+                assert isinstance(use_cases, main.FallbackUseCases)
+
+        assert generator.call_count == 2
+        assert cache.stats()["invalidations"] == 2
+        cache.close()
+
+
+class TestSharedPrefixBatchExtraction:
+    def test_branches_cover_distinct_ranges_in_one_batch(self):
+        """Test batch mode forks one prompt per range and merges without overlap"""
+        from batching_scheduler import BatchingScheduler
+        from llm_backends import MockBackend, MockTokenizer
+
+        import main
+
+        text = (
+            "Users can register with email, log in, reset a forgotten password. "
+            "Admins can export monthly reports, archive old orders. "
+            "Customers can track their orders, cancel an order, rate a product."
+        )
+        backend = MockBackend()
+        scheduler = BatchingScheduler(backend, max_batch_size=4, max_wait_ms=200)
+
+        with patch("main.pipe", scheduler), patch("main.tokenizer", MockTokenizer()):
+            use_cases = extract_use_cases_batch(text, "", 8)
+        scheduler.shutdown()
+
+        titles = [uc["title"] for uc in use_cases]
+        assert titles == [
+            "User registers with email",
+            "User logs in",
+            "User resets a forgotten password",
+            "Admin exports monthly reports",
+            "Admin archives old orders",
+            "Customer tracks their orders",
+            "Customer cancels an order",
+            "Customer rates a product",
+        ]
+        # Three branches, generated together
+        assert scheduler.stats()["batches_run"] == 1
+        assert scheduler.stats()["largest_batch"] == 3
+
+    def test_branch_prompts_share_prefix(self):
+        """Test every branch starts with the document prefix and names the others"""
+        from main import build_batch_branch_prompts
+
+        prefix, prompts = build_batch_branch_prompts("Users log in.", "", 7, 3)
+
+        assert len(prompts) == 3
+        assert all(p.startswith(prefix) for p in prompts)
+        assert prefix.endswith("<|eot_id|>")
+        assert "Extract use cases 4 to 6 of the 7" in prompts[1]
+        assert "Use cases 1 to 3, 7 are already taken" in prompts[1]
+
+
+class TestTokenBudgets:
+    def test_extraction_records_lengths_and_endpoint_reports_fit(
+        self, client, temp_db
+    ):
+        """Test generations are recorded and fitted budgets are served"""
+        from db import get_generation_stats
+        from llm_backends import MockBackend, MockTokenizer
+        from token_budget import TokenBudgetModel
+
+        import main
+
+        model = TokenBudgetModel(min_samples=1, refit_every=1)
+        with patch("main.pipe", MockBackend()), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.token_budgets", model):
+            main.extract_use_cases_single_stage(
+                "Users can log in, reset a forgotten password.", ""
+            )
+            stats = get_generation_stats("single_stage")
+            budget = main.get_smart_token_budget("Users can log in.", 2)
+            response = client.get("/token-budgets")
+
+        assert len(stats) == 1
+        assert stats[0]["use_cases"] >= 1
+        assert stats[0]["generated_tokens"] > 0
+        assert stats[0]["truncated"] is False
+        # Fitted from the mock's real output length, not the 300-token floor
+        assert budget < 300
+        fit = response.json()["prompt_types"]["single_stage"]["by_size"]["tiny"]
+        assert fit["samples"] == 1
+
+    def test_cached_responses_are_not_recorded(self, temp_db, tmp_path):
+        """Test only generations that ran are recorded, not cache replays"""
+        from db import get_generation_stats
+        from llm_backends import MockBackend, MockTokenizer
+        from llm_cache import CachedPipeline, ResponseCache
+
+        import main
+
+        cache = ResponseCache(str(tmp_path / "llm_cache.db"))
+        with patch("main.pipe", CachedPipeline(MockBackend(), cache)), patch(
+            "main.tokenizer", MockTokenizer()
+        ):
+            for _ in range(3):
+                main.extract_use_cases_single_stage("Users can log in.", "")
+
+        assert cache.stats()["hits"] == 2
+        assert len(get_generation_stats("single_stage")) == 1
+        cache.close()
+
+
+class TestModelReadiness:
+    @pytest.fixture
+    def loading(self):
+        """Put the app back in the state it has while the model loads"""
+        import main
+
+        main.models_ready.clear()
+        with patch.dict(
+            main.model_status, {"state": "loading", "started_at": 1.0, "error": None}
+        ):
+            yield main
+        main.models_ready.set()
+
+    def test_ready_in_testing_mode(self, client):
+        """Test /ready reports ready when model loading is skipped"""
+        response = client.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+        assert response.json()["state"] == "skipped"
+
+    def test_llm_endpoints_wait_for_model(self, client, loading):
+        """Test generating endpoints return 503 + Retry-After; others serve"""
+        ready = client.get("/ready")
+        extract = client.post("/parse_use_case_rag/", json={"raw_text": SAMPLE_TEXT})
+        query = client.post("/query", json={"session_id": "s", "question": "q"})
+
+        assert ready.status_code == 503
+        assert ready.json()["state"] == "loading"
+        for response in (ready, extract, query):
+            assert response.headers["Retry-After"] == str(loading.MODEL_LOAD_RETRY_AFTER)
+        assert extract.status_code == 503
+        assert query.status_code == 503
+        assert client.get("/sessions/").status_code == 200
+        assert client.get("/health").json()["model_state"] == "loading"
+
+    def test_background_load_failure_and_success(self, client, loading):
+        """Test a failed load stops Retry-After; a successful one sets ready"""
+        with patch("main.load_models", side_effect=RuntimeError("no weights")):
+            loading._load_models_in_background()
+        failed = client.get("/ready")
+
+        assert failed.status_code == 503
+        assert "Retry-After" not in failed.headers
+        assert "no weights" in failed.json()["error"]
+
+        with patch("main.load_models"), patch("main.warmup_models", return_value=12.0):
+            loading._load_models_in_background()
+
+        ready = client.get("/ready")
+        assert ready.status_code == 200
+        assert ready.json()["warmup_ms"] == 12.0
+
+
+class TestAdmissionControl:
+    @pytest.fixture
+    def tight_admission(self):
+        """One extraction slot and no queue, so a second request is rejected"""
+        from admission_control import AdmissionController
+
+        controller = AdmissionController({"extraction": (1, 0), "bulk": (1, 0)})
+        with patch("main.admission", controller):
+            yield controller
+
+    def test_stats_endpoint(self, client):
+        """Test /admission/stats and /health report every priority class"""
+        stats = client.get("/admission/stats").json()
+
+        assert set(stats["classes"]) == {"interactive", "extraction", "bulk"}
+        assert stats["classes"]["interactive"]["max_concurrent"] >= 1
+        assert "admission" in client.get("/health").json()
+
+    def test_full_class_returns_429(self, client, tight_admission):
+        """Test a request over the class limits gets 429 + Retry-After"""
+        slot = tight_admission.acquire("extraction", "other-session")
+        try:
+            response = client.post(
+                "/parse_use_case_rag/", json={"raw_text": SAMPLE_TEXT}
+            )
+        finally:
+            slot.release()
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert tight_admission.stats()["classes"]["extraction"]["rejected"] == 1
+
+
+class TestCancellation:
+    def test_disconnect_cancels_llm_work(self):
+        """Test work on the LLM executor is cancelled when the client is gone"""
+        import asyncio
+        from types import SimpleNamespace
+
+        import main
+        from cancellation import current_cancel_token
+
+        class DisconnectedRequest:
+            url = SimpleNamespace(path="/parse_use_case_rag/")
+
+            async def is_disconnected(self):
+                return True
+
+        def generate():
+            # Stands in for a generation that checks its token every token
+            token = current_cancel_token()
+            for _ in range(200):
+                token.raise_if_cancelled()
+                time.sleep(0.01)
+            return "finished"
+
+        async def handle():
+            async with main.cancel_on_disconnect(DisconnectedRequest()) as token:
+                return await main.run_in_llm_executor(token, generate)
+
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(handle())
+        assert excinfo.value.status_code == 499
+
+    def test_document_stages_run_on_llm_executor(self, client, temp_db):
+        """Test the async document endpoint parses, titles and extracts"""
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        text = b"Users can log in. Admins can export reports."
+        with patch("main.pipe", MockBackend()), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.embedder", MockEmbedder()):
+            response = client.post(
+                "/parse_use_case_document/",
+                files={"file": ("reqs.txt", BytesIO(text), "text/plain")},
+            )
+
+        assert response.status_code == 200
+        assert response.json()["results"]
+
+
+class TestExtractionJobs:
+    def wait_for_job(self, client, job_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                return job
+            assert time.monotonic() < deadline, f"job still {job['status']}"
+            time.sleep(0.05)
+
+    def test_document_job_runs_in_background(self, client, temp_db):
+        """Test a submitted document job completes and reports progress"""
+        from chunking_strategy import DocumentChunker
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        text = b"Users can log in.\n\nAdmins can export reports."
+        with patch("main.pipe", MockBackend()), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.embedder", MockEmbedder()), patch(
+            "main.chunker", DocumentChunker()
+        ), patch(
+            "main.JOB_EVENTS_POLL_S", 0.01
+        ):
+            response = client.post(
+                "/jobs/document",
+                files={"file": ("reqs.txt", BytesIO(text), "text/plain")},
+            )
+            assert response.status_code == 202
+            submitted = response.json()
+            assert submitted["status_url"] == f"/jobs/{submitted['job_id']}"
+
+            job = self.wait_for_job(client, submitted["job_id"])
+            events = client.get(submitted["events_url"]).text
+
+        assert job["status"] == "completed"
+        assert job["chunks_done"] == job["chunks_total"] >= 1
+        assert job["use_cases_found"] >= 1
+        assert job["use_cases_stored"] == job["result"]["stored_count"]
+        assert "event: done" in events
+
+        listed = client.get(f"/jobs?session_id={job['session_id']}").json()["jobs"]
+        assert [j["job_id"] for j in listed] == [job["job_id"]]
+        # Cancelling a finished job leaves it as it is
+        assert client.delete(f"/jobs/{job['job_id']}").json()["status"] == "completed"
+
+    def test_clearing_a_session_drops_its_jobs(self, client, temp_db):
+        """Test a queued job of a cleared session is cancelled and removed"""
+        from db import create_extraction_job, get_extraction_job
+
+        create_extraction_job("job-1", "doomed", "reqs.txt", "Users can log in.")
+        create_extraction_job("job-2", "kept", "reqs.txt", "Users can log in.")
+
+        with patch("main.job_manager.cancel") as cancel:
+            assert client.delete("/session/doomed").status_code == 200
+
+        cancel.assert_called_once_with("job-1")
+        assert get_extraction_job("job-1") is None
+        assert client.get("/jobs?session_id=doomed").json()["jobs"] == []
+        assert get_extraction_job("job-2")["status"] == "queued"
+
+    def test_unknown_job_and_status(self, client, temp_db):
+        """Test unknown jobs are 404 and unknown statuses 400"""
+        assert client.get("/jobs/missing").status_code == 404
+        assert client.delete("/jobs/missing").status_code == 404
+        assert client.get("/jobs/missing/events").status_code == 404
+        assert client.get("/jobs?status=paused").status_code == 400
+
+
+class TestBulkRefinement:
+    def test_refines_in_one_batch_and_reports_missing(self, client, temp_db):
+        """Test bulk refinement batches the prompts and stores every result"""
+        from batching_scheduler import BatchingScheduler
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        import main
+
+        main.create_session("bulk-session")
+        ids = [
+            main.insert_use_case(
+                "bulk-session", {**SAMPLE_USE_CASE, "title": f"Use case {i}"}
+            )
+            for i in range(3)
+        ]
+        scheduler = BatchingScheduler(MockBackend(), max_batch_size=8, max_wait_ms=50)
+
+        with patch("main.pipe", scheduler), patch(
+            "main.tokenizer", MockTokenizer()
+        ), patch("main.embedder", MockEmbedder()):
+            response = client.post(
+                "/use-case/refine/bulk",
+                json={
+                    "refinements": [
+                        {"use_case_id": ids[0], "refinement_type": "more_main_flows"},
+                        {"use_case_id": 99999, "refinement_type": "more_sub_flows"},
+                        {"use_case_id": ids[1], "refinement_type": "more_sub_flows"},
+                        {"use_case_id": ids[2], "refinement_type": "custom"},
+                    ]
+                },
+            )
+        scheduler.shutdown()
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["use_case_id"] for r in data["refined"]] == ids
+        assert [f["use_case_id"] for f in data["failed"]] == [99999]
+        assert scheduler.stats()["largest_batch"] == 3
+
+        for item in data["refined"]:
+            stored = main.get_use_case_by_id(item["use_case_id"])
+            assert stored["title"] == item["refined_use_case"]["title"]
+            assert stored["main_flow"] == item["refined_use_case"]["main_flow"]
+
+    def test_rejects_duplicate_and_empty_requests(self, client, temp_db):
+        """Test invalid bulk requests are rejected before any generation"""
+        duplicate = {"use_case_id": 1, "refinement_type": "more_main_flows"}
+
+        assert (
+            client.post(
+                "/use-case/refine/bulk", json={"refinements": [duplicate, duplicate]}
+            ).status_code
+            == 400
+        )
+        assert (
+            client.post("/use-case/refine/bulk", json={"refinements": []}).status_code
+            == 400
+        )
+
+
+class TestQueryRetrieval:
+    def test_prompt_holds_only_the_closest_use_cases(self, client, temp_db):
+        """Test /query ranks use cases by embedding and keeps the top ones"""
+        from llm_backends import MockBackend, MockEmbedder, MockTokenizer
+
+        import main
+
+        main.create_session("query-session")
+        titles = [
+            "Customer places order",
+            "Admin exports reports",
+            "User resets password",
+            "Manager approves expenses",
+        ]
+        for title in titles:
+            main.insert_use_case(
+                "query-session",
+                {**SAMPLE_USE_CASE, "title": title, "main_flow": [title]},
+            )
+
+        prompts = []
+        backend = MockBackend()
+
+        def pipe(prompt, **kwargs):
+            prompts.append(prompt)
+            return backend(prompt, **kwargs)
+
+        with patch("main.pipe", pipe), patch("main.tokenizer", MockTokenizer()), patch(
+            "main.embedder", MockEmbedder()
+        ), patch("main.QUERY_TOP_K", 2):
+            response = client.post(
+                "/query",
+                json={
+                    "session_id": "query-session",
+                    "question": "What happens when a user resets password?",
+                },
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_use_cases"] == 4
+        assert data["context_use_cases"] == 2
+        assert data["relevant_use_cases"][0] == "User resets password"
+        assert "Use case: User resets password" in prompts[0]
+        assert sum(title in prompts[0] for title in titles) == 2
+
+    def test_context_respects_token_budget(self):
+        """Test the best use case is kept even over budget, others are not"""
+        import main
+
+        ranked = [
+            ({**SAMPLE_USE_CASE, "title": f"Use case {i}"}, 1.0 - i / 10)
+            for i in range(5)
+        ]
+        with patch("main.QUERY_CONTEXT_TOKENS", 1):
+            assert len(main.select_query_context(ranked)) == 1
+        with patch("main.QUERY_TOP_K", 3):
+            assert len(main.select_query_context(ranked)) == 3
+
+
+class TestDeferredSessionTitle:
+    def test_llm_title_replaces_fallback_in_background(self, temp_db):
+        """Test a new session gets its fallback title first, the LLM title later"""
+        import threading
+
+        import main
+        from admission_control import current_priority
+
+        release = threading.Event()
+        priorities = []
+
+        def pipe(prompt, **kwargs):
+            priorities.append(current_priority())
+            release.wait(timeout=5)
+            return [{"generated_text": "Online Store Checkout Flow"}]
+
+        text = "The customer can add a product to the cart and pay for the order."
+        with patch("main.pipe", pipe):
+            session_id = main.prepare_text_session(main.InputText(raw_text=text))
+            # The request does not wait for the LLM title
+            assert main.get_session_title(session_id) == main.generate_fallback_title(
+                text
+            )
+
+            release.set()
+            main.title_executor.submit(lambda: None).result(timeout=5)
+
+        assert main.get_session_title(session_id) == "Online Store Checkout Flow"
+        assert priorities == ["bulk"]
+
+    def test_renamed_session_keeps_its_title(self, temp_db):
+        """Test the LLM title does not overwrite a title changed meanwhile"""
+        import main
+
+        main.create_session("titled", session_title="Fallback")
+        main.update_session_context(session_id="titled", session_title="Chosen")
+
+        with patch(
+            "main.pipe", lambda prompt, **kw: [{"generated_text": "Some LLM Title"}]
+        ):
+            main.schedule_session_title("titled", "Users log in.", "Fallback").result(
+                timeout=5
+            )
+
+        assert main.get_session_title("titled") == "Chosen"
+
+
+class TestStoredEmbeddings:
+    def test_existing_vectors_are_read_not_encoded(self, temp_db):
+        """Test dedupe reads stored vectors and re-encodes only after a model change"""
+        from llm_backends import MockEmbedder
+
+        import main
+
+        calls = []
+
+        class RecordingEmbedder(MockEmbedder):
+            def encode(self, sentences, **kwargs):
+                calls.append(sentences)
+                return super().encode(sentences, **kwargs)
+
+        main.create_session("emb-session")
+        for title in ("User logs in", "Admin exports reports"):
+            main.insert_use_case(
+                "emb-session", {**SAMPLE_USE_CASE, "title": title, "main_flow": [title]}
+            )
+
+        with patch("main.embedder", RecordingEmbedder()):
+            # Use cases stored before vectors were kept: one batch for both
+            first = main.get_existing_embeddings("emb-session")
+            assert first.shape == (2, 384)
+            assert len(calls) == 1 and len(calls[0]) == 2
+
+            second = main.get_existing_embeddings("emb-session")
+            assert torch.equal(first, second)
+            assert len(calls) == 1
+
+            uc = main.UseCaseSchema(**{**SAMPLE_USE_CASE, "title": "User pays"})
+            main.store_use_case("emb-session", uc, main.compute_usecase_embedding(uc))
+            assert main.get_existing_embeddings("emb-session").shape == (3, 384)
+            assert len(calls) == 2
+
+            with patch("main.embedding_model_id", "other-model"):
+                main.get_existing_embeddings("emb-session")
+            assert len(calls) == 3 and len(calls[2]) == 3
+
+        stored = main.get_use_case_embeddings("emb-session")
+        assert {row["embedding"]["model"] for row in stored} == {"other-model"}
+
+    def test_new_use_cases_are_embedded_in_one_batch(self, client, temp_db):
+        """Test one encode call per extraction and duplicates within a response"""
+        from llm_backends import MockEmbedder
+
+        calls = []
+
+        class RecordingEmbedder(MockEmbedder):
+            def encode(self, sentences, **kwargs):
+                calls.append(sentences)
+                return super().encode(sentences, **kwargs)
+
+        extracted = [
+            {**SAMPLE_USE_CASE, "title": "User logs in"},
+            {**SAMPLE_USE_CASE, "title": "User logs in"},
+            {**SAMPLE_USE_CASE, "title": "Admin exports reports"},
+        ]
+        with patch("main.embedder", RecordingEmbedder()), patch(
+            "main.extract_use_cases_single_stage", return_value=extracted
+        ):
+            response = client.post(
+                "/parse_use_case_rag/", json={"raw_text": "User logs in."}
+            )
+
+        assert response.status_code == 200
+        statuses = [r["status"] for r in response.json()["results"]]
+        assert statuses == ["stored", "duplicate_skipped", "stored"]
+        assert [len(c) for c in calls if isinstance(c, list)] == [3]
+
+
+class TestCrossSessionMatches:
+    def test_new_use_cases_are_matched_across_project_sessions(
+        self, client, temp_db, tmp_path
+    ):
+        """Test extraction reports the same use case in other project sessions"""
+        from ann_index import ANNIndex
+        from llm_backends import MockEmbedder
+
+        import main
+
+        index = ANNIndex(str(tmp_path / "ann.db"), model="mock-embedder:1")
+        extracted = [{**SAMPLE_USE_CASE, "title": "User logs in"}]
+
+        def extract(session_id, project_context):
+            return client.post(
+                "/parse_use_case_rag/",
+                json={
+                    "raw_text": "User logs in.",
+                    "session_id": session_id,
+                    "project_context": project_context,
+                },
+            ).json()["results"][0]
+
+        with patch("main.embedder", MockEmbedder()), patch(
+            "main.ann_index", index
+        ), patch("main.extract_use_cases_single_stage", return_value=extracted):
+            first = extract("shop-1", "Shop")
+            second = extract("shop-2", "Shop")
+            other = extract("bank-1", "Bank")
+
+            assert first["matches_in_other_sessions"] == []
+            matches = second["matches_in_other_sessions"]
+            assert [(m["session_id"], m["title"]) for m in matches] == [
+                ("shop-1", "User logs in")
+            ]
+            assert matches[0]["use_case_id"] == first["id"]
+            assert other["matches_in_other_sessions"] == []
+
+            response = client.get(f"/use-case/{other['id']}/similar?scope=all")
+            assert response.status_code == 200
+            assert {m["session_id"] for m in response.json()["matches"]} == {
+                "shop-1",
+                "shop-2",
+            }
+            assert (
+                client.get(f"/use-case/{other['id']}/similar").json()["matches"] == []
+            )
+
+            client.delete("/session/shop-1")
+            assert len(index) == 2
+
+    def test_index_is_reconciled_with_stored_vectors(self, client, temp_db, tmp_path):
+        """Test use cases missed by the index are added back and stale ones dropped"""
+        from ann_index import ANNIndex
+        from llm_backends import MockEmbedder
+
+        import main
+
+        index = ANNIndex(str(tmp_path / "ann.db"), model="mock-embedder:1")
+        extracted = [
+            {**SAMPLE_USE_CASE, "title": "User logs in"},
+            {**SAMPLE_USE_CASE, "title": "Customer places order"},
+        ]
+
+        with patch("main.embedder", MockEmbedder()), patch(
+            "main.ann_index", index
+        ), patch("main.extract_use_cases_single_stage", return_value=extracted):
+            results = client.post(
+                "/parse_use_case_rag/",
+                json={"raw_text": "Shop.", "session_id": "shop-1"},
+            ).json()["results"]
+            ids = {result["id"] for result in results}
+            assert index.ids() == ids
+
+            # An add that failed, and a use case deleted behind the index's back
+            index.remove([results[0]["id"]])
+            index.add("gone", {99999: MockEmbedder().encode(["Gone"])[0]})
+
+            main.reconcile_ann_index()
+
+        assert index.ids() == ids
+
+
+class TestSemanticExtractionCache:
+    def test_similar_text_reuses_extracted_use_cases(self, client, temp_db, tmp_path):
+        """Test near-identical text skips the LLM and still stores use cases"""
+        from extraction_cache import SemanticExtractionCache
+        from llm_backends import MockEmbedder
+
+        cache = SemanticExtractionCache(
+            str(tmp_path / "cache.db"),
+            encode=lambda texts: MockEmbedder().encode(texts),
+            model="mock",
+        )
+        extracted = [{**SAMPLE_USE_CASE, "title": "User logs in"}]
+
+        with patch("main.embedder", MockEmbedder()), patch(
+            "main.extraction_cache", cache
+        ), patch(
+            "main.extract_use_cases_single_stage", return_value=extracted
+        ) as extract:
+            first = client.post(
+                "/parse_use_case_rag/",
+                json={"raw_text": "The user logs in.", "session_id": "cache-1"},
+            ).json()
+            second = client.post(
+                "/parse_use_case_rag/",
+                json={"raw_text": "the user  logs in!", "session_id": "cache-2"},
+            ).json()
+
+            assert extract.call_count == 1
+            assert first["extraction_method"] == "single_stage"
+            assert second["extraction_method"] == "semantic_cache"
+            assert [r["status"] for r in second["results"]] == ["stored"]
+
+            stats = client.get("/extraction-cache/stats").json()
+            assert stats["hits"] == 1
+            assert stats["hit_rate"] == 0.5
+
+            assert client.delete("/extraction-cache").json()["removed"] == 1
+
+    def test_fallback_use_cases_are_not_cached(self, client, temp_db, tmp_path):
+        """Test use cases of the heuristic fallback are extracted again next time"""
+        from extraction_cache import SemanticExtractionCache
+        from llm_backends import MockEmbedder
+
+        import main
+
+        cache = SemanticExtractionCache(
+            str(tmp_path / "cache.db"),
+            encode=lambda texts: MockEmbedder().encode(texts),
+            model="mock",
+        )
+        fallback = main.FallbackUseCases([{**SAMPLE_USE_CASE, "title": "User logs in"}])
+
+        with patch("main.embedder", MockEmbedder()), patch(
+            "main.extraction_cache", cache
+        ), patch(
+            "main.extract_use_cases_single_stage", return_value=fallback
+        ) as extract:
+            for session_id in ("fallback-1", "fallback-2"):
+                response = client.post(
+                    "/parse_use_case_rag/",
+                    json={"raw_text": "The user logs in.", "session_id": session_id},
+                ).json()
+                assert response["extraction_method"] == "single_stage"
+
+        assert extract.call_count == 2
+        assert cache.stats()["stores"] == 0
@@ -0,0 +1,92 @@
+# -----------------------------------------------------------------------------
+# File: test_model_registry.py
+# Description: Test suite for model_registry.py - checks shared lazy loading,
+#              installed instances and memory reporting.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the model registry"""
+
+import threading
+import time
+
+import pytest
+import torch
+
+from llm_backends import MockEmbedder
+from model_registry import ModelRegistry, model_memory_bytes
+
+
+def test_concurrent_gets_load_once():
+    """Test threads asking for an unloaded model share one load"""
+    registry = ModelRegistry()
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return object()
+
+    registry.register("embedder", load)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get("embedder")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert len({id(instance) for instance in results}) == 1
+    assert registry.stats()["models"]["embedder"]["loads"] == 1
+
+
+def test_register_put_and_unload():
+    """Test a loaded model survives re-registration until it is unloaded"""
+    registry = ModelRegistry()
+    registry.register("tokenizer", lambda: "first")
+    assert not registry.is_loaded("tokenizer")
+    assert registry.get("tokenizer") == "first"
+
+    registry.register("tokenizer", lambda: "second")
+    assert registry.get("tokenizer") == "first"
+    registry.unload("tokenizer")
+    assert registry.get("tokenizer") == "second"
+
+    embedder = MockEmbedder()
+    registry.put("embedder", embedder)
+    assert registry.get("embedder") is embedder
+
+    with pytest.raises(KeyError):
+        registry.get("generator")
+
+
+def test_stats_report_memory_per_model():
+    """Test weight memory is measured for torch modules and wrappers"""
+
+    class Wrapper:
+        def __init__(self, model):
+            self.model = model
+
+    layer = torch.nn.Linear(1024, 256)
+    expected = (1024 * 256 + 256) * 4
+    assert model_memory_bytes(layer) == expected
+    assert model_memory_bytes(Wrapper(layer)) == expected
+    assert model_memory_bytes(MockEmbedder()) is None
+
+    registry = ModelRegistry()
+    registry.put("generator", Wrapper(layer))
+    registry.put("embedder", MockEmbedder())
+    registry.register("tokenizer", lambda: None)
+
+    stats = registry.stats()
+    assert stats["models"]["generator"]["memory_mb"] == 1.0
+    assert stats["models"]["generator"]["device"] == "cpu"
+    assert stats["models"]["embedder"]["memory_mb"] is None
+    assert stats["models"]["tokenizer"]["loaded"] is False
+    assert stats["total_memory_mb"] == 1.0
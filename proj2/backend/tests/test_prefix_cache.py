@@ -0,0 +1,220 @@
+# -----------------------------------------------------------------------------
+# File: test_prefix_cache.py
+# Description: Test suite for prefix_cache.py - checks that generation on top
+#              of a cached prompt prefix matches full-prompt generation.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the prompt-prefix KV cache"""
+
+import pytest
+import torch
+from transformers import BatchEncoding, LlamaConfig, LlamaForCausalLM
+
+from prefix_cache import PrefixCachedPipeline
+
+VOCAB = "<>abcdefghijklmnopqrstuvwxyz .:[]{}\"\n"
+
+
+class CharTokenizer:
+    """Tiny character-level tokenizer with the HF call interface"""
+
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __init__(self):
+        self.padding_side = "left"
+
+    def encode(self, text):
+        return [VOCAB.index(ch) + 2 for ch in text]
+
+    def __call__(self, text, return_tensors=None, padding=False, add_special_tokens=True):
+        texts = [text] if isinstance(text, str) else list(text)
+        encoded = [self.encode(t) for t in texts]
+        width = max(len(ids) for ids in encoded)
+        input_ids, attention_mask = [], []
+        for ids in encoded:
+            pad = [self.pad_token_id] * (width - len(ids))
+            mask = [0] * len(pad) + [1] * len(ids)
+            if self.padding_side == "left":
+                input_ids.append(pad + ids)
+                attention_mask.append(mask)
+            else:
+                input_ids.append(ids + pad)
+                attention_mask.append(mask[::-1])
+        return BatchEncoding(
+            {
+                "input_ids": torch.tensor(input_ids),
+                "attention_mask": torch.tensor(attention_mask),
+            }
+        )
+
+    def decode(self, ids, skip_special_tokens=False):
+        chars = []
+        for i in ids.tolist() if hasattr(ids, "tolist") else ids:
+            if i < 2:
+                continue
+            chars.append(VOCAB[i - 2])
+        return "".join(chars)
+
+
+class ReferencePipe:
+    """Full-prompt greedy generation, standing in for the HF pipeline"""
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.calls = 0
+
+    def __call__(self, text_inputs, **kwargs):
+        self.calls += 1
+        prompts = [text_inputs] if isinstance(text_inputs, str) else text_inputs
+        outputs = []
+        for prompt in prompts:
+            encoded = self.tokenizer(prompt, return_tensors="pt")
+            sequences = self.model.generate(
+                input_ids=encoded.input_ids,
+                attention_mask=encoded.attention_mask,
+                max_new_tokens=kwargs["max_new_tokens"],
+                do_sample=False,
+                pad_token_id=0,
+            )
+            text = self.tokenizer.decode(sequences[0, encoded.input_ids.shape[1] :])
+            if kwargs.get("return_full_text", True):
+                text = prompt + text
+            outputs.append([{"generated_text": text}])
+        return outputs[0] if isinstance(text_inputs, str) else outputs
+
+
+@pytest.fixture(scope="module")
+def reference():
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(VOCAB) + 2,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=512,
+    )
+    model = LlamaForCausalLM(config).eval()
+    return ReferencePipe(model, CharTokenizer())
+
+
+PREFIX = "<system>\nyou are a requirements analyst.\n<user>"
+
+
+def test_match_prefix_prefers_longest(reference):
+    """Test prefix matching"""
+    cached = PrefixCachedPipeline(reference)
+    cached.register_prefix("<system>")
+    cached.register_prefix(PREFIX)
+
+    assert cached.match_prefix(PREFIX + "\nhello") == PREFIX
+    assert cached.match_prefix("<system> other") == "<system>"
+    assert cached.match_prefix("no prefix here") is None
+
+
+def test_cached_generation_matches_full_prompt(reference):
+    """Test that reusing the prefix KV cache gives identical greedy output"""
+    cached = PrefixCachedPipeline(reference)
+    cached.register_prefix(PREFIX)
+    prompt = PREFIX + "\nuser logs in.\n["
+
+    expected = reference(prompt, max_new_tokens=12, return_full_text=False)
+    actual = cached(prompt, max_new_tokens=12, do_sample=False, return_full_text=False)
+
+    assert actual == expected
+    assert cached.stats()["hits"] == 1
+    assert cached.stats()["prefill_tokens_saved"] == len(PREFIX)
+
+
+def test_cached_batch_with_padding_matches(reference):
+    """Test batched suffixes of different lengths share one prefix cache"""
+    cached = PrefixCachedPipeline(reference)
+    cached.register_prefix(PREFIX)
+    prompts = [
+        PREFIX + "\nuser searches products and adds to cart.\n[",
+        PREFIX + "\nadmin logs in.\n[",
+    ]
+
+    expected = reference(prompts, max_new_tokens=10, return_full_text=False)
+    actual = cached(
+        prompts, max_new_tokens=10, do_sample=False, return_full_text=False, batch_size=2
+    )
+
+    assert actual == expected
+    # The prefix is prefilled once and reused for every later call
+    cached(prompts[0], max_new_tokens=2, do_sample=False)
+    assert cached.stats()["cached_prefixes"] == 1
+
+
+def test_unmatched_prompts_use_pipeline(reference):
+    """Test prompts without a registered prefix go to the wrapped pipeline"""
+    cached = PrefixCachedPipeline(reference)
+    cached.register_prefix(PREFIX)
+    calls_before = reference.calls
+
+    output = cached("plain prompt", max_new_tokens=3)
+
+    assert output[0]["generated_text"].startswith("plain prompt")
+    assert reference.calls == calls_before + 1
+    assert cached.stats()["misses"] == 1
+
+
+def test_shared_prefix_is_prefilled_once_and_released(reference):
+    """Test branches forked from a per-request prefix share one prefill"""
+    cached = PrefixCachedPipeline(reference)
+    cached.register_prefix(PREFIX)
+    document = PREFIX + "\nuser logs in. admin exports reports.\n"
+    branches = [document + "first:[", document + "second:["]
+
+    expected = reference(branches, max_new_tokens=8, return_full_text=False)
+    with cached.shared_prefix(document):
+        with cached.shared_prefix(document):
+            assert cached.stats()["shared_prefixes"] == 1
+        assert cached.match_prefix(branches[0]) == document
+        actual = cached(branches, max_new_tokens=8, do_sample=False, return_full_text=False)
+
+    assert actual == expected
+    assert cached.stats()["prefill_tokens_saved"] == 2 * len(document)
+    # The document prefix is forgotten, the static one stays
+    assert cached.match_prefix(branches[0]) == PREFIX
+    assert cached.stats()["cached_prefixes"] == 0
+    assert cached.stats()["registered_prefixes"] == 1
+
+
+class LegacyCacheModel:
+    """Model whose forward pass returns past_key_values as a legacy tuple"""
+
+    def __init__(self, model):
+        self.model = model
+        self.device = model.device
+
+    def __call__(self, **kwargs):
+        outputs = self.model(**kwargs)
+        cache = outputs.past_key_values
+        outputs.past_key_values = tuple(
+            (layer.keys, layer.values) for layer in cache.layers
+        )
+        return outputs
+
+    def generate(self, **kwargs):
+        return self.model.generate(**kwargs)
+
+
+def test_legacy_tuple_prefix_cache_is_converted(reference):
+    """Test a prefix cache returned as a legacy tuple still serves batches"""
+    cached = PrefixCachedPipeline(reference)
+    cached.model = LegacyCacheModel(reference.model)
+    cached.register_prefix(PREFIX)
+    prompts = [PREFIX + "\nadmin logs in.\n[", PREFIX + "\nuser pays.\n["]
+
+    expected = reference(prompts, max_new_tokens=6, return_full_text=False)
+    actual = cached(prompts, max_new_tokens=6, do_sample=False, return_full_text=False)
+
+    assert actual == expected
@@ -348,3 +348,32 @@ def test_extract_key_concepts():
     assert isinstance(concepts, list)
     assert len(concepts) <= 5
     assert all(isinstance(c, str) for c in concepts)
+
+
+def test_vector_db_uses_shared_embedder():
+    """Test collections embed with the registry's embedder, not a new model"""
+    import rag_utils
+    from llm_backends import MockEmbedder
+    from model_registry import ModelRegistry
+
+    if not rag_utils.CHROMADB_AVAILABLE:
+        pytest.skip("chromadb is not installed")
+
+    calls = []
+
+    class RecordingEmbedder(MockEmbedder):
+        def encode(self, sentences, **kwargs):
+            calls.append(list(sentences))
+            return super().encode(sentences, **kwargs)
+
+    registry = ModelRegistry()
+    registry.put("embedder", RecordingEmbedder())
+    with patch("rag_utils.registry", registry):
+        collection = rag_utils.init_vector_db("registry-test")
+        rag_utils.add_chunks_to_db(
+            collection, ["Users log in.", "Admins export reports."], "registry-test"
+        )
+        found = rag_utils.retrieve_chunks(collection, "export reports", n_results=1)
+
+    assert found == ["Admins export reports."]
+    assert len(calls) == 2
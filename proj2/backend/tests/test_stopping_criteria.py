@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+# File: test_stopping_criteria.py
+# Description: Test suite for stopping_criteria.py - checks that generation
+#              stops after the requested number of JSON use cases.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the JSON object stopping criteria"""
+
+import torch
+
+from batching_scheduler import freeze_kwargs
+from stopping_criteria import JsonObjectStoppingCriteria
+
+MARKER = "<assistant>"
+
+
+class CharTokenizer:
+    """One token per character, enough to drive the criteria"""
+
+    def encode(self, text):
+        return [ord(ch) for ch in text]
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(chr(i) for i in ids.tolist())
+
+
+def batch(*texts):
+    """Left-pad texts with spaces into one input_ids tensor"""
+    tok = CharTokenizer()
+    width = max(len(t) for t in texts)
+    return torch.tensor([tok.encode(t.rjust(width)) for t in texts])
+
+
+PROMPT = 'example: [{"title": "x"}, {"title": "y"}]' + MARKER + "\n\n["
+
+
+def test_stops_after_max_objects():
+    """Test that the criteria ignores the prompt and counts generated objects"""
+    criteria = JsonObjectStoppingCriteria(CharTokenizer(), 2, marker=MARKER)
+
+    one = PROMPT + '{"title": "a", "main_flow": ["{x}"]}'
+    two = one + ', {"title": "b"}'
+
+    assert criteria(batch(one), None).tolist() == [False]
+    assert criteria(batch(two), None).tolist() == [True]
+
+
+def test_stops_when_array_closes():
+    """Test that a closed array stops generation before max_objects"""
+    criteria = JsonObjectStoppingCriteria(CharTokenizer(), 5, marker=MARKER)
+
+    assert criteria(batch(PROMPT + '{"title": "a"}]'), None).tolist() == [True]
+
+
+def test_rows_are_judged_independently():
+    """Test batched rows with different progress"""
+    criteria = JsonObjectStoppingCriteria(CharTokenizer(), 1, marker=MARKER)
+
+    done = criteria(batch(PROMPT + '{"a": 1}', PROMPT + '{"a": "still go'), None)
+
+    assert done.tolist() == [True, False]
+
+
+def test_equal_settings_share_batch_key():
+    """Test that equal criteria group together in the batching scheduler"""
+    tok = CharTokenizer()
+    a = JsonObjectStoppingCriteria(tok, 3)
+    b = JsonObjectStoppingCriteria(tok, 3)
+
+    assert freeze_kwargs([a]) == freeze_kwargs([b])
+    assert freeze_kwargs([a]) != freeze_kwargs([JsonObjectStoppingCriteria(tok, 4)])
+
+
+def test_rows_read_their_own_limit_from_the_prompt():
+    """Test prompts with different estimates share one criteria"""
+    criteria = JsonObjectStoppingCriteria(
+        CharTokenizer(), 3, marker=MARKER, limit_pattern=r"want (\d+)"
+    )
+    two = '{"a": 1}, {"b": 2}'
+
+    done = criteria(
+        batch(
+            "want 2" + PROMPT + two,
+            "want 3" + PROMPT + two,
+            "want 9" + PROMPT + two + ', {"c": 3}',
+            "no estimate" + PROMPT + two,
+        ),
+        None,
+    )
+
+    assert done.tolist() == [True, False, True, False]
@@ -0,0 +1,96 @@
+# -----------------------------------------------------------------------------
+# File: test_token_budget.py
+# Description: Test suite for token_budget.py - checks fitting token budgets
+#              from recorded generation lengths.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for adaptive token budgets"""
+
+import pytest
+
+import db
+from token_budget import TokenBudgetModel, fit_budget_params, percentile
+
+
+@pytest.fixture
+def budget_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "get_db_path", lambda: str(tmp_path / "budget.db"))
+    db.init_db()
+
+
+def sample(use_cases, tokens, truncated=False, size="small"):
+    return {
+        "size_category": size,
+        "use_cases": use_cases,
+        "generated_tokens": tokens,
+        "max_new_tokens": tokens if truncated else 2000,
+        "truncated": truncated,
+    }
+
+
+def test_percentile_interpolates():
+    """Test percentile matches linear interpolation"""
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2, 3, 4, 5], 100) == 5
+    assert percentile([10, 20], 25) == 12.5
+
+
+def test_fit_recovers_cost_and_skips_truncated():
+    """Test the linear fit, percentile safety and truncated samples"""
+    samples = [sample(n, 50 + 100 * n) for n in (1, 2, 3, 4, 5)]
+    samples.append(sample(3, 400, truncated=True))
+
+    fit = fit_budget_params(samples, 95)
+
+    assert fit["per_use_case"] == pytest.approx(100)
+    assert fit["overhead"] == pytest.approx(50)
+    assert fit["safety"] == 1.0
+    assert fit["samples"] == 5
+    assert fit["truncation_rate"] == pytest.approx(1 / 6, abs=1e-3)
+
+
+def test_fit_with_single_use_case_count():
+    """Test a fit without spread in use case counts uses tokens per use case"""
+    fit = fit_budget_params([sample(2, 180), sample(2, 220)], 100)
+
+    assert fit["per_use_case"] == 100
+    assert fit["overhead"] == 0
+    assert fit["safety"] == pytest.approx(1.1)
+
+
+def test_model_uses_defaults_until_enough_history(budget_db):
+    """Test defaults, then a size-specific fit, then the all-sizes fit"""
+    model = TokenBudgetModel(min_samples=5, refit_every=1)
+
+    assert model.budget("single_stage", "small", 4) == (560, "default")
+    assert model.budget("batch", "small", 3) == (550, "default")
+
+    for n in (1, 2, 3, 4, 5):
+        model.record("single_stage", "small", n, 30 + 60 * n, 1200)
+
+    budget, source = model.budget("single_stage", "small", 4)
+    assert source == "fitted:small"
+    assert budget == 270
+    # Not enough "large" samples on their own: all sizes are used
+    assert model.budget("single_stage", "large", 4)[1] == "fitted:all"
+    assert model.budget("batch", "small", 3)[1] == "default"
+
+
+def test_model_clamps_and_summarizes(budget_db):
+    """Test budget clamps and the summary served by the API"""
+    model = TokenBudgetModel(min_samples=1, refit_every=1, min_budget=64)
+    model.record("single_stage", "tiny", 1, 10, 300)
+
+    assert model.budget("single_stage", "tiny", 1)[0] == 64
+    assert model.budget("single_stage", "tiny", 500)[0] == 1200
+
+    summary = model.summary()
+    assert summary["percentile"] == 95.0
+    stats = summary["prompt_types"]["single_stage"]
+    assert stats["by_size"]["tiny"]["samples"] == 1
+    assert stats["default"]["per_use_case"] == 120.0
+    assert summary["prompt_types"]["batch"]["all_sizes"] is None
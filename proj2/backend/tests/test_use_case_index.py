@@ -0,0 +1,153 @@
+# -----------------------------------------------------------------------------
+# File: test_use_case_index.py
+# Description: Test suite for use_case_index.py - checks ranking and reuse
+#              of use case vectors per session.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""Test suite for the per-session use case index"""
+
+import pytest
+import torch
+
+from llm_backends import MockEmbedder
+from use_case_index import (SessionUseCaseIndex, blob_to_vector,
+                            find_duplicates, use_case_text, vector_to_blob)
+
+
+class RecordingEncoder:
+    def __init__(self, dim=384):
+        self.embedder = MockEmbedder(dim=dim)
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return self.embedder.encode(texts, convert_to_tensor=True)
+
+
+def use_case(id, title, *steps):
+    return {"id": id, "title": title, "main_flow": list(steps)}
+
+
+USE_CASES = [
+    use_case(1, "Customer places order", "Add items to cart", "Pay for order"),
+    use_case(2, "Admin exports reports", "Open reports page", "Export to CSV"),
+    use_case(3, "User resets password", "Request reset email", "Set new password"),
+]
+
+
+def test_ranks_by_similarity_to_query():
+    """Test the use case closest to the question comes first"""
+    index = SessionUseCaseIndex(RecordingEncoder())
+
+    ranked = index.rank("s1", USE_CASES, "How does a user reset the password?")
+
+    assert [uc["id"] for uc, _ in ranked][0] == 3
+    scores = [score for _, score in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert index.rank("s1", [], "anything") == []
+
+
+def test_only_new_or_changed_use_cases_are_encoded():
+    """Test vectors are reused until a use case's text changes"""
+    encoder = RecordingEncoder()
+    index = SessionUseCaseIndex(encoder)
+
+    index.rank("s1", USE_CASES, "orders")
+    assert len(encoder.calls[-1]) == 4
+
+    changed = USE_CASES[:2] + [use_case(3, "User changes password", "Set password")]
+    index.rank("s1", changed, "password")
+    assert encoder.calls[-1] == ["password", use_case_text(changed[2])]
+
+    # A deleted use case is dropped from the session
+    index.rank("s1", changed[:1], "orders")
+    assert encoder.calls[-1] == ["orders"]
+    assert index.stats()["vectors"] == 1
+    assert index.stats()["reused"] == 3
+
+
+def test_vectors_of_another_embedder_are_replaced():
+    """Test vectors with a different size are encoded again"""
+    encoder = RecordingEncoder(dim=384)
+    index = SessionUseCaseIndex(encoder)
+    index.rank("s1", USE_CASES, "orders")
+
+    encoder.embedder = MockEmbedder(dim=128)
+    ranked = index.rank("s1", USE_CASES, "new password")
+
+    assert len(encoder.calls) == 3
+    assert ranked[0][0]["id"] == 3
+
+
+def test_forget_and_session_limit():
+    """Test sessions are dropped explicitly and when over the limit"""
+    index = SessionUseCaseIndex(RecordingEncoder(), max_sessions=2)
+    for session in ("a", "b", "c"):
+        index.rank(session, USE_CASES, "orders")
+    assert index.stats()["sessions"] == 2
+
+    index.forget("c")
+    assert index.stats()["sessions"] == 1
+    index.forget()
+    assert index.stats()["vectors"] == 0
+
+
+def test_vector_blob_round_trip():
+    """Test vectors survive storage as float32 and float16 bytes"""
+    vector = MockEmbedder().encode("User logs in", convert_to_tensor=True)
+
+    exact = blob_to_vector(vector_to_blob(vector), "float32", 384)
+    assert torch.equal(exact, vector)
+
+    half = vector_to_blob(vector, "float16")
+    assert len(half) == 384 * 2
+    assert torch.allclose(blob_to_vector(half, "float16", 384), vector, atol=1e-3)
+
+    with pytest.raises(ValueError):
+        blob_to_vector(half, "float16", 128)
+    with pytest.raises(ValueError):
+        vector_to_blob(vector, "int8")
+
+
+def test_find_duplicates_within_batch_and_against_stored():
+    """Test candidates are checked against stored vectors and kept candidates"""
+    embedder = MockEmbedder()
+    stored = embedder.encode(["Admin exports reports"], convert_to_tensor=True)
+    candidates = embedder.encode(
+        [
+            "Customer places order",
+            "Admin exports reports",
+            "User resets password",
+            "Customer places order",
+        ],
+        convert_to_tensor=True,
+    )
+
+    duplicates = find_duplicates(candidates, stored, threshold=0.85)
+
+    assert duplicates[0] is None
+    assert duplicates[1] == pytest.approx(1.0)
+    assert duplicates[2] is None
+    assert duplicates[3] == pytest.approx(1.0)
+    assert find_duplicates(candidates[:1], None, threshold=0.85) == [None]
+    assert find_duplicates(candidates[:0], stored, threshold=0.85) == []
+
+
+def test_duplicates_of_skipped_candidates_are_kept():
+    """Test a candidate only similar to a skipped one is not a duplicate"""
+    stored = torch.tensor([[1.0, 0.0, 0.0]])
+    candidates = torch.tensor(
+        [
+            [0.9, 0.44, 0.0],  # close to the stored vector: skipped
+            [0.6, 0.8, 0.0],  # close to the skipped one only
+        ]
+    )
+
+    duplicates = find_duplicates(candidates, stored, threshold=0.85)
+
+    assert duplicates[0] is not None
+    assert duplicates[1] is None
@@ -0,0 +1,223 @@
+# -----------------------------------------------------------------------------
+# File: token_budget.py
+# Description: Adaptive token budgets for ReqEngine - fits max_new_tokens
+#              from the output lengths of earlier generations.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Adaptive Token Budgets
+Fits tokens = overhead + per_use_case * use_cases for each prompt type and
+input size category, then scales it by a percentile of observed/predicted
+ratios so most generations finish inside the budget
+"""
+
+import math
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from db import get_generation_stats, record_generation_stat
+
+# Fixed budgets used until enough history has been recorded
+DEFAULT_BUDGETS = {
+    "single_stage": {"per_use_case": 120.0, "overhead": 80.0},
+    "batch": {"per_use_case": 150.0, "overhead": 100.0},
+}
+# Floor for the fixed defaults; fitted budgets use TokenBudgetModel.min_budget
+DEFAULT_MIN_BUDGET = 300
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation"""
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile of empty list")
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def fit_budget_params(samples: List[Dict], q: float) -> Optional[Dict]:
+    """
+    Fit budget parameters to recorded generations
+
+    Truncated generations (that hit their budget) only show a lower bound
+    on the real length, so they are left out of the fit and reported as
+    truncation_rate instead.
+
+    Args:
+        samples: Rows from get_generation_stats()
+        q: Safety percentile of observed/predicted length ratios
+
+    Returns:
+        Dict with per_use_case, overhead, safety, samples and
+        truncation_rate, or None without usable samples
+    """
+    points = [
+        (s["use_cases"], s["generated_tokens"])
+        for s in samples
+        if s["use_cases"] > 0 and not s["truncated"]
+    ]
+    if not points:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+
+    slope = cov / var_x if var_x else 0.0
+    intercept = mean_y - slope * mean_x
+    if slope <= 0 or intercept < 0:
+        # Too little spread in use case counts: tokens per use case only
+        slope, intercept = mean_y / mean_x, 0.0
+
+    ratios = [y / (intercept + slope * x) for x, y in points]
+    truncated = sum(1 for s in samples if s["truncated"])
+
+    return {
+        "per_use_case": round(slope, 1),
+        "overhead": round(intercept, 1),
+        "safety": round(max(1.0, percentile(ratios, q)), 3),
+        "samples": len(points),
+        "truncation_rate": round(truncated / len(samples), 3),
+    }
+
+
+class TokenBudgetModel:
+    """Record generation lengths and serve fitted token budgets"""
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        refit_every: int = 10,
+        history: int = 500,
+        min_budget: int = 64,
+        max_budget: int = 1200,
+    ):
+        """
+        Initialize budget model
+
+        Args:
+            percentile: Safety percentile applied to the fitted length
+            min_samples: Samples needed before a fit replaces the defaults
+            refit_every: New records between refits
+            history: How many recent generations per prompt type to fit on
+            min_budget: Lower clamp for fitted budgets
+            max_budget: Upper clamp for every budget
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.refit_every = max(1, refit_every)
+        self.history = history
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+
+        self._fitted: Dict[str, Dict[Optional[str], Dict]] = {}
+        self._new_records: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        prompt_type: str,
+        size_category: str,
+        use_cases: int,
+        generated_tokens: int,
+        max_new_tokens: int,
+    ):
+        """Store one generation's length and schedule a refit"""
+        record_generation_stat(
+            prompt_type, size_category, use_cases, generated_tokens, max_new_tokens
+        )
+        with self._lock:
+            self._new_records[prompt_type] = self._new_records.get(prompt_type, 0) + 1
+
+    def params(self, prompt_type: str, size_category: str) -> Tuple[Dict, str]:
+        """
+        Budget parameters for a prompt type and size category
+
+        Returns:
+            (params, source) where source is "fitted:<size>", "fitted:all"
+            or "default"
+        """
+        fitted = self._fits(prompt_type)
+        for key, source in (
+            (size_category, f"fitted:{size_category}"),
+            (None, "fitted:all"),
+        ):
+            fit = fitted.get(key)
+            if fit and fit["samples"] >= self.min_samples:
+                return fit, source
+
+        defaults = DEFAULT_BUDGETS.get(prompt_type, DEFAULT_BUDGETS["single_stage"])
+        return {**defaults, "safety": 1.0}, "default"
+
+    def budget(
+        self, prompt_type: str, size_category: str, use_cases: int
+    ) -> Tuple[int, str]:
+        """
+        max_new_tokens for the expected number of use cases
+
+        Returns:
+            (budget, source)
+        """
+        params, source = self.params(prompt_type, size_category)
+        predicted = params["overhead"] + params["per_use_case"] * use_cases
+        tokens = int(math.ceil(predicted * params["safety"]))
+        floor = self.min_budget if source != "default" else DEFAULT_MIN_BUDGET
+        return max(floor, min(tokens, self.max_budget)), source
+
+    def summary(self) -> Dict:
+        """Fitted parameters for every prompt type, for the API"""
+        prompt_types = {}
+        for prompt_type in DEFAULT_BUDGETS:
+            fitted = self._fits(prompt_type)
+            prompt_types[prompt_type] = {
+                "default": DEFAULT_BUDGETS[prompt_type],
+                "all_sizes": fitted.get(None),
+                "by_size": {k: v for k, v in fitted.items() if k is not None},
+            }
+
+        return {
+            "percentile": self.percentile,
+            "min_samples": self.min_samples,
+            "max_budget": self.max_budget,
+            "prompt_types": prompt_types,
+        }
+
+    def _fits(self, prompt_type: str) -> Dict[Optional[str], Dict]:
+        """Cached fits per size category (None = all sizes), refit when stale"""
+        with self._lock:
+            stale = (
+                prompt_type not in self._fitted
+                or self._new_records.get(prompt_type, 0) >= self.refit_every
+            )
+            if not stale:
+                return self._fitted[prompt_type]
+            self._new_records[prompt_type] = 0
+
+        try:
+            samples = get_generation_stats(prompt_type, limit=self.history)
+        except sqlite3.Error as e:
+            print(f"⚠️  Could not load generation stats: {e}")
+            samples = []
+
+        by_size: Dict[Optional[str], List[Dict]] = {None: samples}
+        for sample in samples:
+            by_size.setdefault(sample["size_category"], []).append(sample)
+
+        fitted = {}
+        for size_category, group in by_size.items():
+            fit = fit_budget_params(group, self.percentile)
+            if fit:
+                fitted[size_category] = fit
+
+        with self._lock:
+            self._fitted[prompt_type] = fitted
+        return fitted
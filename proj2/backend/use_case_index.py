@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+# File: use_case_index.py
+# Description: Per-session embedding index for ReqEngine - ranks stored use
+#              cases by similarity to a question.
+# Author: Pradyumna Chacham
+# Date: November 2025
+# Copyright (c) 2025 Pradyumna Chacham. All rights reserved.
+# License: MIT License - see LICENSE file in the root directory.
+# -----------------------------------------------------------------------------
+
+"""
+Use Case Index
+/query embeds the question and ranks the session's use cases against it, so
+only the most relevant ones go into the prompt.
+
+Vectors are kept per use case together with the text they were computed
+from. A query encodes only use cases that are new or changed since the last
+query of the session, in the same batch as the question.
+
+Vectors stored in SQLite (use_case_embeddings) are raw float16/float32
+bytes; vector_to_blob() and blob_to_vector() convert them. find_duplicates()
+checks newly extracted use cases against stored ones and each other.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+STORAGE_DTYPES = ("float16", "float32")
+
+
+def use_case_text(use_case: Dict) -> str:
+    """Text embedded for a use case: its title and main flow"""
+    main_flow = " ".join(use_case.get("main_flow") or [])
+    return f"{use_case.get('title', '')} {main_flow}".strip()
+
+
+def as_cpu_vectors(vectors) -> torch.Tensor:
+    """Embedder output (tensor on any device, array or list) as CPU float32"""
+    if not isinstance(vectors, torch.Tensor):
+        vectors = torch.as_tensor(np.asarray(vectors))
+    return vectors.detach().float().cpu()
+
+
+def vector_to_blob(vector: torch.Tensor, dtype: str = "float32") -> bytes:
+    """Raw bytes of one vector for the use_case_embeddings table"""
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'")
+    return as_cpu_vectors(vector).reshape(-1).numpy().astype(dtype).tobytes()
+
+
+def blob_to_vector(blob: bytes, dtype: str, dim: int) -> torch.Tensor:
+    """Vector stored by vector_to_blob(), as float32"""
+    array = np.frombuffer(blob, dtype=dtype)
+    if array.size != dim:
+        raise ValueError(f"Stored vector has {array.size} values, expected {dim}")
+    return torch.from_numpy(array.astype(np.float32))
+
+
+def find_duplicates(
+    candidates: torch.Tensor, existing: Optional[torch.Tensor], threshold: float
+) -> List[Optional[float]]:
+    """
+    Duplicate check of new vectors against stored vectors and each other
+
+    All similarities come from one matrix product. A candidate is a
+    duplicate when it is at least `threshold` similar to a stored vector or
+    to an earlier candidate that is kept.
+
+    Args:
+        candidates: One row per new use case, in extraction order
+        existing: One row per stored use case (None if there are none)
+        threshold: Cosine similarity from which use cases are duplicates
+
+    Returns:
+        Per candidate its highest similarity if it is a duplicate, else None
+    """
+    count = len(candidates)
+    if count == 0:
+        return []
+
+    candidates = torch.nn.functional.normalize(candidates.reshape(count, -1), dim=1)
+    stored = 0
+    reference = candidates
+    if existing is not None and len(existing):
+        existing = existing.reshape(len(existing), -1)
+        stored = len(existing)
+        reference = torch.cat(
+            [torch.nn.functional.normalize(existing, dim=1), candidates]
+        )
+
+    similarity = candidates @ reference.T
+    best_stored = (
+        similarity[:, :stored].max(dim=1).values.tolist() if stored else [None] * count
+    )
+    # Candidate i against earlier candidates j < i
+    earlier = similarity[:, stored:].tril(diagonal=-1)
+
+    kept = torch.zeros(count, dtype=torch.bool)
+    duplicates: List[Optional[float]] = []
+    for i in range(count):
+        scores = [] if best_stored[i] is None else [best_stored[i]]
+        if kept[:i].any():
+            scores.append(float(earlier[i, :i][kept[:i]].max()))
+        best = max(scores, default=None)
+
+        if best is not None and best >= threshold:
+            duplicates.append(best)
+        else:
+            kept[i] = True
+            duplicates.append(None)
+    return duplicates
+
+
+class SessionUseCaseIndex:
+    """Embedding vectors of stored use cases, per session"""
+
+    def __init__(
+        self, encode: Callable[[List[str]], torch.Tensor], max_sessions: int = 256
+    ):
+        """
+        Initialize index
+
+        Args:
+            encode: Embeds a list of texts into one row per text
+            max_sessions: Sessions whose vectors are kept (least recent dropped)
+        """
+        self.encode = encode
+        self.max_sessions = max_sessions
+        # session -> use case id -> (embedded text, vector)
+        self._sessions: "OrderedDict[str, Dict[int, Tuple[str, torch.Tensor]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        self.encoded = 0
+        self.reused = 0
+
+    def rank(
+        self, session_id: str, use_cases: List[Dict], query: str
+    ) -> List[Tuple[Dict, float]]:
+        """
+        Use cases of the session with their cosine similarity to the query,
+        most similar first
+        """
+        if not use_cases:
+            return []
+
+        texts = [use_case_text(uc) for uc in use_cases]
+        with self._lock:
+            known = dict(self._sessions.get(session_id, {}))
+
+        missing = [
+            i
+            for i, uc in enumerate(use_cases)
+            if known.get(uc["id"], (None,))[0] != texts[i]
+        ]
+        vectors = self._encode([query] + [texts[i] for i in missing])
+        query_vector = vectors[0]
+        for row, i in enumerate(missing, start=1):
+            known[use_cases[i]["id"]] = (texts[i], vectors[row])
+
+        # Vectors of a different embedder (e.g. after a model change)
+        stale = [
+            i
+            for i, uc in enumerate(use_cases)
+            if known[uc["id"]][1].shape != query_vector.shape
+        ]
+        if stale:
+            for i, vector in zip(stale, self._encode([texts[i] for i in stale])):
+                known[use_cases[i]["id"]] = (texts[i], vector)
+
+        # Deleted use cases drop out with the rebuilt entry
+        entries = {uc["id"]: known[uc["id"]] for uc in use_cases}
+        with self._lock:
+            self.encoded += len(missing) + len(stale)
+            self.reused += len(use_cases) - len(missing) - len(stale)
+            self._sessions[session_id] = entries
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        matrix = torch.stack([entries[uc["id"]][1] for uc in use_cases])
+        scores = torch.nn.functional.cosine_similarity(
+            matrix, query_vector.unsqueeze(0), dim=1
+        )
+        order = torch.argsort(scores, descending=True).tolist()
+        return [(use_cases[i], float(scores[i])) for i in order]
+
+    def forget(self, session_id: Optional[str] = None):
+        """Drop the vectors of one session, or of every session"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "vectors": sum(len(e) for e in self._sessions.values()),
+                "encoded": self.encoded,
+                "reused": self.reused,
+            }
+
+    def _encode(self, texts: List[str]) -> torch.Tensor:
+        return as_cpu_vectors(self.encode(texts))